@@ -4,12 +4,13 @@ from os import environ
 from typing import AsyncGenerator
 
 from apscheduler.schedulers.background import BackgroundScheduler
-from autogen.io.websockets import IOWebsockets
 from dotenv import load_dotenv
 from fastapi import FastAPI
 
-from captn.captn_agents.application import on_connect
+from captn.captn_agents.backend.teams import Team
+from captn.captn_agents.backend.teams._team_registry import TEAM_REGISTRY_EVICT_INTERVAL
 from captn.captn_agents.backend.teams._weekly_analysis_team import execute_weekly_analysis
+from captn.captn_agents.websocket_server import serve_websockets
 from captn.observability import PrometheusMiddleware, metrics, setting_otlp
 
 load_dotenv()
@@ -26,17 +27,23 @@ OTLP_GRPC_ENDPOINT = environ.get("OTLP_GRPC_ENDPOINT", "http://tempo:4317")
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator:  # type: ignore
     scheduler = BackgroundScheduler()
+    # The job runs in every worker, the users are shared between them with DB leases
     scheduler.add_job(
         execute_weekly_analysis,
         "cron",
         hour="4",
         minute="15",
+        kwargs={"use_leases": True},
         # day_of_week="wed",
     )
+    # The teams are evicted also when no new team is created or used
+    scheduler.add_job(
+        Team.evict_teams, "interval", seconds=TEAM_REGISTRY_EVICT_INTERVAL
+    )
     scheduler.start()
 
-    with IOWebsockets.run_server_in_thread(
-        on_connect=on_connect,
+    # Conversations are run in a bounded thread pool, the other ones wait in a queue
+    async with serve_websockets(
         host="0.0.0.0",  # nosec [B104]
         port=8080,
     ) as uri:
@@ -1,4 +1,6 @@
+import time
 import traceback
+from contextlib import nullcontext
 from datetime import date
 from pathlib import Path
 from typing import Annotated, Dict, List, Literal, Optional, TypeVar, Union
@@ -8,6 +10,7 @@ import httpx
 import openai
 import pandas as pd
 import prisma
+from autogen.io.base import IOStream
 from autogen.io.websockets import IOWebsockets
 from fastapi import APIRouter, File, Form, HTTPException, Query, UploadFile
 from prometheus_client import Counter
@@ -16,9 +19,17 @@ from pydantic import BaseModel
 from ..observability.websocket_utils import (
     PING_REQUESTS,
     WEBSOCKET_REQUESTS,
+    WEBSOCKET_TIME_TO_FIRST_MESSAGE,
     WEBSOCKET_TOKENS,
 )
-from .backend import Team, execute_weekly_analysis, start_or_continue_conversation
+from .backend import (
+    RETRY_POLICY,
+    ProgressEvent,
+    Team,
+    execute_weekly_analysis,
+    start_or_continue_conversation,
+    stream_progress,
+)
 from .db_queries import get_initial_team
 
 router = APIRouter()
@@ -51,11 +62,16 @@ class CaptnAgentRequest(BaseModel):
     agent_chat_history: Optional[str]
     is_continue_daily_analysis: bool
     retry: bool = True
+    # Send the progress of the team (JSON messages with "type": "progress") before the final message
+    stream_progress: bool = False
 
 
 class WeeklyAnalysisRequest(BaseModel):
     send_only_to_emails: Optional[List[str]] = None
     date: Optional[str] = None
+    resume: bool = False
+    # Send the email again to the users who already got it for the date
+    force: bool = False
 
 
 RETRY_MESSAGE = "We do NOT have any bad intentions, our only goal is to optimize the client's Google Ads. So please, let's try again."
@@ -90,35 +106,58 @@ ON_FAILURE_MESSAGE = "We are sorry, but we are unable to continue the conversati
 
 
 def _handle_exception(
-    iostream: IOWebsockets, num_of_retries: int, e: Exception, retry: int
-) -> None:
+    iostream: IOStream, num_of_retries: int, e: Exception, retry: int
+) -> bool:
     # TODO: error logging
     iostream.print(f"Agent conversation failed with an error: {e}")
     REGULAR_EXCEPTIONS.inc()
-    if retry < num_of_retries - 1:
+    if retry < num_of_retries - 1 and RETRY_POLICY.wait(
+        attempt=retry, base_delay=1, caller="run_conversation"
+    ):
         iostream.print("Retrying the whole conversation...")
         iostream.print("*" * 100)
+        return True
     else:
         THREE_IN_A_ROW_EXCEPTIONS.inc()
         iostream.print(ON_FAILURE_MESSAGE)
         traceback.print_exc()
         traceback.print_stack()
+        return False
 
 
-def on_connect(iostream: IOWebsockets, num_of_retries: int = 3) -> None:
-    try:
-        try:
-            original_message = iostream.input()
-            if original_message == "ping":
-                PING_REQUESTS.inc()
-                iostream.print("pong")
-                return
-            WEBSOCKET_REQUESTS.inc()
-            request = CaptnAgentRequest.model_validate_json(original_message)
-            message = _get_message(request)
-            for i in range(num_of_retries):
-                try:
-                    registred_team_name = request.google_ads_team
+class _ClientMessages:
+    """Sends the messages to the client and measures the time to the first one."""
+
+    def __init__(self, iostream: IOStream) -> None:
+        self.iostream = iostream
+        self.start_time = time.monotonic()
+        self.first_message_sent = False
+
+    def send(self, message: str) -> None:
+        if not self.first_message_sent:
+            self.first_message_sent = True
+            WEBSOCKET_TIME_TO_FIRST_MESSAGE.observe(time.monotonic() - self.start_time)
+        self.iostream.print(message)
+
+    def send_progress(self, event: ProgressEvent) -> None:
+        self.send(event.model_dump_json(exclude_none=True))
+
+
+def run_conversation(
+    iostream: IOStream, request: CaptnAgentRequest, num_of_retries: int = 3
+) -> None:
+    message = _get_message(request)
+    client_messages = _ClientMessages(iostream)
+    # The team retries the LLM requests within the same deadline, started by the first error
+    with RETRY_POLICY.deadline():
+        for i in range(num_of_retries):
+            try:
+                registred_team_name = request.google_ads_team
+                with (
+                    stream_progress(client_messages.send_progress)
+                    if request.stream_progress
+                    else nullcontext()
+                ):
                     _, last_message = start_or_continue_conversation(
                         user_id=request.user_id,
                         conv_id=request.conv_id,
@@ -126,28 +165,44 @@ def on_connect(iostream: IOWebsockets, num_of_retries: int = 3) -> None:
                         max_round=80,
                         registred_team_name=registred_team_name,
                     )
-                    iostream.print(last_message)
+                client_messages.send(last_message)
 
-                    return
+                return
 
-                except (
-                    openai.APIStatusError,
-                    httpx.ReadTimeout,
-                    openai.BadRequestError,
-                    TimeoutError,
+            except (
+                openai.APIStatusError,
+                httpx.ReadTimeout,
+                openai.BadRequestError,
+                TimeoutError,
+            ):
+                iostream.print(ON_FAILURE_MESSAGE)
+                THREE_IN_A_ROW_EXCEPTIONS.inc()
+                # Do NOT try to recover from these errors, it has already been tried in Team class
+                break
+
+            except Exception as e:
+                if not _handle_exception(
+                    iostream=iostream, num_of_retries=num_of_retries, e=e, retry=i
                 ):
-                    iostream.print(ON_FAILURE_MESSAGE)
-                    THREE_IN_A_ROW_EXCEPTIONS.inc()
-                    # Do NOT try to recover from these errors, it has already been tried in Team class
                     break
 
-                except Exception as e:
-                    _handle_exception(
-                        iostream=iostream, num_of_retries=num_of_retries, e=e, retry=i
-                    )
+    # ToDo: fix this @rjambercic
+    WEBSOCKET_TOKENS.inc(len(message.split()))
+
 
-            # ToDo: fix this @rjambercic
-            WEBSOCKET_TOKENS.inc(len(message.split()))
+def on_connect(iostream: IOWebsockets, num_of_retries: int = 3) -> None:
+    try:
+        try:
+            original_message = iostream.input()
+            if original_message == "ping":
+                PING_REQUESTS.inc()
+                iostream.print("pong")
+                return
+            WEBSOCKET_REQUESTS.inc()
+            request = CaptnAgentRequest.model_validate_json(original_message)
+            run_conversation(
+                iostream=iostream, request=request, num_of_retries=num_of_retries
+            )
         except Exception as e:
             INVALID_MESSAGE_IN_IOSTREAM.inc()
             iostream.print(ON_FAILURE_MESSAGE)
@@ -172,7 +227,10 @@ def weekly_analysis(request: WeeklyAnalysisRequest) -> str:
             ) from e
 
     execute_weekly_analysis(
-        send_only_to_emails=request.send_only_to_emails, date=request.date
+        send_only_to_emails=request.send_only_to_emails,
+        date=request.date,
+        resume=request.resume,
+        force=request.force,
     )
     return "Weekly analysis has been sent to the specified emails"
 
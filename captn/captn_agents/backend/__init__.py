@@ -1,10 +1,21 @@
 from .end_to_end import start_or_continue_conversation
-from .teams import REACT_APP_API_URL, BriefCreationTeam, Team, execute_weekly_analysis
+from .retry_policy import RETRY_POLICY
+from .teams import (
+    REACT_APP_API_URL,
+    BriefCreationTeam,
+    ProgressEvent,
+    Team,
+    execute_weekly_analysis,
+    stream_progress,
+)
 
 __all__ = (
     "BriefCreationTeam",
     "execute_weekly_analysis",
+    "ProgressEvent",
     "start_or_continue_conversation",
+    "stream_progress",
     "Team",
     "REACT_APP_API_URL",
+    "RETRY_POLICY",
 )
@@ -412,5 +412,48 @@ def run_tests(
                 df.to_csv(_file_path, index=True)
 
 
+@app.command()
+def benchmark_weekly_report_email(
+    customers: int = typer.Option(
+        50,
+        help="Number of customers in the synthetic weekly report",
+    ),
+    repeat: int = typer.Option(
+        20,
+        help="Number of times the email is rendered",
+    ),
+) -> None:
+    from .weekly_report_email import (
+        benchmark_weekly_report_email as _benchmark_weekly_report_email,
+    )
+
+    result = _benchmark_weekly_report_email(customers=customers, repeat=repeat)
+    print(tabulate([result], headers="keys", tablefmt="simple"))
+
+
+@app.command()
+def benchmark_team_construction(
+    repeat: int = typer.Option(
+        5,
+        help="Number of times each team is constructed",
+    ),
+    team_names: str = typer.Option(
+        "",
+        help="Comma separated registered names of the teams to construct, all teams if not set",
+    ),
+) -> None:
+    from .team_construction import (
+        benchmark_team_construction as _benchmark_team_construction,
+    )
+
+    results = _benchmark_team_construction(
+        repeat=repeat,
+        team_names=[name.strip() for name in team_names.split(",")]
+        if team_names
+        else None,
+    )
+    print(tabulate(results, headers="keys", tablefmt="simple"))
+
+
 if __name__ == "__main__":
     app()
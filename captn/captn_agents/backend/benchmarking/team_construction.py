@@ -0,0 +1,51 @@
+import time
+from typing import Any, Dict, List, Optional
+
+from ..teams import Team
+
+
+def benchmark_team_construction(
+    repeat: int = 5, team_names: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """Measure the construction of every registered team (or only of the 'team_names').
+
+    The first construction of a team also generates the tool schemas shared by the following
+    ones, so it is reported separately. The teams which cannot be constructed (e.g. without the
+    network) are reported with the error.
+    """
+    results: List[Dict[str, Any]] = []
+    for name, cls in Team._team_registry.items():
+        if team_names is not None and name not in team_names:
+            continue
+
+        execution_times: List[float] = []
+        error = None
+        for i in range(repeat + 1):
+            start = time.perf_counter()
+            try:
+                # the registered teams define their own roles
+                cls(user_id=1, conv_id=i, task="Benchmark the team construction")  # type: ignore[call-arg]
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                break
+            finally:
+                Team._teams.clear()
+            execution_times.append(time.perf_counter() - start)
+
+        if error is not None:
+            results.append({"team": name, "error": error})
+            continue
+
+        first, rest = execution_times[0], execution_times[1:] or execution_times
+        results.append(
+            {
+                "team": name,
+                "repeat": repeat,
+                "first": first,
+                "min": min(rest),
+                "mean": sum(rest) / len(rest),
+                "max": max(rest),
+            }
+        )
+
+    return results
@@ -0,0 +1,102 @@
+import random
+import time
+import unittest.mock
+from typing import Any, Dict, Optional
+
+import httpx
+
+from ..teams import _weekly_analysis_team
+from ..teams._weekly_analysis_team import construct_weekly_report_email_from_template
+from ..tools._url_health_checker import URLHealthChecker
+
+METRICS_FIELDS = ["impressions", "clicks", "interactions", "conversions", "cost_micros"]
+
+
+def _create_metrics(rng: random.Random) -> Dict[str, Optional[float]]:
+    metrics: Dict[str, Optional[float]] = {
+        field: rng.randint(0, 10000) for field in METRICS_FIELDS
+    }
+    for field in METRICS_FIELDS:
+        metrics[f"{field}_increase"] = rng.choice(
+            [None, 0.0, round(rng.uniform(-100, 100), 2)]
+        )
+    return metrics
+
+
+def create_synthetic_weekly_report(
+    customers: int = 50,
+    campaigns_per_customer: int = 10,
+    ads_per_campaign: int = 5,
+    seed: int = 42,
+) -> Dict[str, Any]:
+    """Create a weekly report with the same structure as the one returned by the Google Ads API."""
+    rng = random.Random(seed)  # nosec: [B311]
+    weekly_customer_reports = []
+    for customer_id in range(1000000000, 1000000000 + customers):
+        campaigns = {}
+        for campaign_id in range(campaigns_per_customer):
+            ad_group_ads = {
+                str(ad_id): {
+                    "id": str(ad_id),
+                    "metrics": {},
+                    # Some URLs are shared between the ads, like in the real accounts
+                    "final_urls": [f"https://example-{customer_id}.com/{ad_id % 3}"],
+                }
+                for ad_id in range(ads_per_campaign)
+            }
+            campaigns[str(campaign_id)] = {
+                "id": str(campaign_id),
+                "name": f"Campaign {campaign_id}",
+                "metrics": _create_metrics(rng),
+                "ad_groups": {
+                    "1": {
+                        "id": "1",
+                        "name": "Ad group",
+                        "metrics": {},
+                        "keywords": {},
+                        "ad_group_ads": ad_group_ads,
+                    }
+                },
+            }
+        weekly_customer_reports.append(
+            {
+                "customer_id": str(customer_id),
+                "currency": "EUR",
+                "campaigns": campaigns,
+            }
+        )
+
+    return {"weekly_customer_reports": weekly_customer_reports}
+
+
+def benchmark_weekly_report_email(
+    customers: int = 50, repeat: int = 20, date: str = "2024-02-05"
+) -> Dict[str, float]:
+    """Measure the rendering of the weekly report email.
+
+    The final URLs are checked with a mocked transport, so only the rendering is measured.
+    """
+    weekly_report = create_synthetic_weekly_report(customers=customers)
+    checker = URLHealthChecker(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200))
+    )
+
+    with unittest.mock.patch.object(
+        _weekly_analysis_team, "FINAL_URLS_HEALTH_CHECKER", checker
+    ):
+        # The first run checks the final URLs, the following ones use the cached status codes
+        construct_weekly_report_email_from_template(weekly_report, date=date)
+
+        execution_times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            construct_weekly_report_email_from_template(weekly_report, date=date)
+            execution_times.append(time.perf_counter() - start)
+
+    return {
+        "customers": customers,
+        "repeat": repeat,
+        "min": min(execution_times),
+        "mean": sum(execution_times) / len(execution_times),
+        "max": max(execution_times),
+    }
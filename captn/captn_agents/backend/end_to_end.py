@@ -25,7 +25,7 @@ def _get_team(
     working_dir.mkdir(parents=True, exist_ok=True)
 
     team = None
-    team = Team.get_team(user_id=user_id, conv_id=conv_id)
+    team = Team.get_or_load_team(user_id=user_id, conv_id=conv_id)
     if team is not None:
         return team, False
     else:
@@ -55,28 +55,37 @@ def start_or_continue_conversation(
     temperature: float = 0.2,
     registred_team_name: str = "initial_team",
 ) -> Tuple[str, str]:
-    team, create_new_conv = _get_team(
-        user_id=user_id,
-        conv_id=conv_id,
-        root_dir=root_dir,
-        task=task,
-        max_round=max_round,
-        seed=seed,
-        temperature=temperature,
-        registred_team_name=registred_team_name,
-    )
+    # The requests of the conversation are handled one by one, each one continues the state
+    # saved by the previous one. The team is not evicted from the memory meanwhile.
+    with (
+        Team.conversation_lock(user_id=user_id, conv_id=conv_id),
+        Team._teams.in_use(Team.construct_team_name(user_id, conv_id)),
+    ):
+        team, create_new_conv = _get_team(
+            user_id=user_id,
+            conv_id=conv_id,
+            root_dir=root_dir,
+            task=task,
+            max_round=max_round,
+            seed=seed,
+            temperature=temperature,
+            registred_team_name=registred_team_name,
+        )
 
-    team_name = team.name
+        team_name = team.name
 
-    if create_new_conv and team:
-        team.initiate_chat()
+        if create_new_conv and team:
+            team.initiate_chat()
 
-        last_message = team.get_last_message(add_prefix=False)
+            last_message = team.get_last_message(add_prefix=False)
 
-        return team_name, last_message
+        else:
+            last_message = continue_conversation(team, message=task)
 
-    else:
-        return team_name, continue_conversation(team, message=task)
+        # Other workers can continue the conversation if the state store is configured
+        Team.save_team_state(user_id=user_id, conv_id=conv_id)
+
+    return team_name, last_message
 
 
 def continue_conversation(team: Team, message: str) -> str:
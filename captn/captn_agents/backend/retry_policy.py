@@ -0,0 +1,124 @@
+import math
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from os import environ
+from typing import Callable, Iterator, Optional
+
+import httpx
+import openai
+from prometheus_client import Counter
+
+__all__ = (
+    "RETRY_POLICY",
+    "RetryPolicy",
+    "is_permanent_error",
+    "is_transient_error",
+)
+
+# All the retries of one request (the team, the conversation and the web surfer) must
+# finish within the deadline, started by the first retryable error of the request
+RETRY_DEADLINE_SECONDS = float(environ.get("RETRY_DEADLINE_SECONDS", 10 * 60))
+RETRY_MAX_DELAY_SECONDS = float(environ.get("RETRY_MAX_DELAY_SECONDS", 30))
+
+RETRY_DEADLINE_EXCEEDED = Counter(
+    "retry_deadline_exceeded_total",
+    "Total count of retries given up because the deadline of the request was exceeded",
+    ["caller"],
+)
+
+TRANSIENT_ERRORS = (
+    openai.APIStatusError,
+    httpx.ReadTimeout,
+    httpx.RemoteProtocolError,
+    TimeoutError,
+)
+PERMANENT_ERRORS = (
+    openai.AuthenticationError,
+    openai.PermissionDeniedError,
+    openai.NotFoundError,
+)
+
+
+def is_permanent_error(e: BaseException) -> bool:
+    """Errors which will happen again no matter how many times the request is retried."""
+    if isinstance(e, PERMANENT_ERRORS):
+        return True
+    return isinstance(e, openai.BadRequestError) and e.code == "context_length_exceeded"
+
+
+def is_transient_error(e: BaseException) -> bool:
+    """Errors of the LLM API which might not happen if the request is retried."""
+    return isinstance(e, TRANSIENT_ERRORS) and not is_permanent_error(e)
+
+
+class _RetryScope:
+    def __init__(self) -> None:
+        # Started by the first retry, so the work before the first error doesn't use the budget
+        self.deadline: Optional[float] = None
+
+
+_scope: ContextVar[Optional[_RetryScope]] = ContextVar("retry_scope", default=None)
+
+
+class RetryPolicy:
+    """Jittered exponential backoff limited by the deadline of the request.
+
+    The scope of the deadline is set with 'deadline' and the deadline is started by the first
+    retry in it. It is shared by all the retries in the scope, so nested retry loops can't
+    multiply the time the request takes.
+    """
+
+    def __init__(
+        self,
+        timeout: float = RETRY_DEADLINE_SECONDS,
+        max_delay: float = RETRY_MAX_DELAY_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.timeout = timeout
+        self.max_delay = max_delay
+        self._clock = clock
+        self._sleep = sleep
+
+    @contextmanager
+    def deadline(self) -> Iterator[None]:
+        """Set the scope of the deadline, the nested scopes share the deadline of the outer one."""
+        if _scope.get() is not None:
+            yield
+            return
+        token = _scope.set(_RetryScope())
+        try:
+            yield
+        finally:
+            _scope.reset(token)
+
+    def remaining(self) -> float:
+        scope = _scope.get()
+        if scope is None:
+            return math.inf
+        if scope.deadline is None:
+            return self.timeout
+        return scope.deadline - self._clock()
+
+    def backoff(self, attempt: int, base_delay: float) -> float:
+        return random.uniform(0, min(self.max_delay, base_delay * 2**attempt))  # nosec: [B311]
+
+    def wait(self, attempt: int, base_delay: float, caller: str) -> bool:
+        """Sleep before the next attempt, returns False if the deadline would be exceeded."""
+        scope = _scope.get()
+        if scope is not None and scope.deadline is None:
+            scope.deadline = self._clock() + self.timeout
+        delay = self.backoff(attempt, base_delay)
+        if delay >= self.remaining():
+            RETRY_DEADLINE_EXCEEDED.labels(caller=caller).inc()
+            print(
+                f"Retries of '{caller}' stopped, the deadline of the request is exceeded"
+            )
+            return False
+        self._sleep(delay)
+        return True
+
+
+RETRY_POLICY = RetryPolicy()
@@ -5,6 +5,7 @@ from ._gbb_initial_team import GBBInitialTeam
 from ._gbb_page_feed_team import GBBPageFeedTeam
 from ._google_ads_team import GoogleAdsTeam
 from ._team import Team
+from ._team_progress import ProgressEvent, stream_progress
 from ._weather_team import WeatherTeam
 from ._weekly_analysis_team import (
     REACT_APP_API_URL,
@@ -21,7 +22,9 @@ __all__ = (
     "WeeklyAnalysisTeam",
     "WeatherTeam",
     "GoogleAdsTeam",
+    "ProgressEvent",
     "REACT_APP_API_URL",
     "Team",
     "execute_weekly_analysis",
+    "stream_progress",
 )
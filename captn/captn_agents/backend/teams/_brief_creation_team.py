@@ -32,6 +32,11 @@ Never introduce yourself when writing messages. E.g. do not write 'As an account
     ]
 
     _functions: Optional[List[Dict[str, Any]]] = []
+    # The two members take turns, the tool responses go back to the caller
+    _speaker_transitions: Dict[str, List[str]] = {
+        "Digitial_marketing_strategist": ["Account_manager"],
+        "Account_manager": ["Digitial_marketing_strategist"],
+    }
     _use_only_team_names: Set[str] = {"default_team", "campaign_creation_team"}
 
     def __init__(
@@ -99,6 +99,11 @@ Keep your messages clear and concise. Never work on mujltiple resources at the s
 """,
         },
     ]
+    # The two members take turns, the tool responses go back to the caller
+    _speaker_transitions: Dict[str, List[str]] = {
+        "Copywriter": ["Account_manager"],
+        "Account_manager": ["Copywriter"],
+    }
 
     _retry_messages = [
         "NOTE: When generating JSON for the function, do NOT use ANY whitespace characters (spaces, tabs, newlines) in the JSON string.\n\nPlease continue.",
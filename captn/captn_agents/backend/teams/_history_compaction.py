@@ -0,0 +1,158 @@
+from os import environ
+from typing import Any, Dict, List, Optional, Tuple
+
+import autogen
+from autogen.agentchat.contrib.capabilities.transform_messages import (
+    TransformMessages,
+)
+from prometheus_client import Counter
+
+from ._token_counter import MessageTokenCounter, current_team_name, get_token_counter
+
+__all__ = ("HistoryCompaction",)
+
+# Above this number of tokens the old messages are compacted before the history is sent to the LLM
+HISTORY_COMPACTION_MAX_TOKENS = int(environ.get("HISTORY_COMPACTION_MAX_TOKENS", 16000))
+# The last messages are always sent verbatim
+HISTORY_COMPACTION_KEEP_LAST_MESSAGES = int(
+    environ.get("HISTORY_COMPACTION_KEEP_LAST_MESSAGES", 8)
+)
+
+COMPACTED_TOKENS = Counter(
+    "llm_request_compacted_tokens_total",
+    "Total count of tokens removed from the requests to the LLM by compacting the history",
+    ["team"],
+)
+
+# The client approves exactly what was proposed, so these tool calls are never compacted
+PROTECTED_TOOLS = ("ask_client_for_permission", "reply_to_client")
+
+
+class HistoryCompaction:
+    """Compacts the old messages of the history sent to the LLM once it is too long.
+
+    The oldest messages are compacted first, only the beginning and the end of their content
+    are kept (e.g. the columns and the 'result_id' of a query result). The first message (the
+    task), the last messages and the calls of the protected tools are sent verbatim. The
+    messages of the group chat are not changed, only the copy which is sent to the LLM.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = HISTORY_COMPACTION_MAX_TOKENS,
+        keep_last_messages: int = HISTORY_COMPACTION_KEEP_LAST_MESSAGES,
+        min_message_tokens: int = 500,
+        head_chars: int = 400,
+        tail_chars: int = 200,
+        protected_tools: Tuple[str, ...] = PROTECTED_TOOLS,
+        token_counter: Optional[MessageTokenCounter] = None,
+    ) -> None:
+        self.max_tokens = max_tokens
+        self.keep_last_messages = keep_last_messages
+        self.min_message_tokens = min_message_tokens
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self.protected_tools = protected_tools
+        self.token_counter = (
+            token_counter
+            if token_counter is not None
+            else get_token_counter("gpt-4-1106-preview")
+        )
+
+    def register(self, agents: List[autogen.ConversableAgent]) -> None:
+        for agent in agents:
+            agent.register_hook(
+                "process_all_messages_before_reply", self.apply_transform
+            )
+
+    def speaker_selection_transforms(self) -> TransformMessages:
+        """The transforms of the messages sent to the LLM by the speaker selection of the group chat."""
+        return TransformMessages(transforms=[self], verbose=False)
+
+    @staticmethod
+    def _tool_names(messages: List[Dict[str, Any]]) -> Dict[str, str]:
+        return {
+            tool_call["id"]: tool_call["function"]["name"]
+            for message in messages
+            for tool_call in message.get("tool_calls") or []
+        }
+
+    def _is_protected(
+        self, message: Dict[str, Any], tool_names: Dict[str, str]
+    ) -> bool:
+        tools = [
+            tool_call["function"]["name"]
+            for tool_call in message.get("tool_calls") or []
+        ]
+        tools += [
+            tool_names.get(tool_response.get("tool_call_id", ""), "")
+            for tool_response in message.get("tool_responses") or []
+        ]
+        if "tool_call_id" in message:
+            tools.append(tool_names.get(message["tool_call_id"], ""))
+        return any(tool in self.protected_tools for tool in tools)
+
+    def _compact_content(self, content: Any) -> Optional[str]:
+        if not isinstance(content, str) or len(content) <= (
+            self.head_chars + self.tail_chars
+        ):
+            return None
+        tokens = self.token_counter.count_message({"content": content})
+        if tokens < self.min_message_tokens:
+            return None
+        head = content[: self.head_chars]
+        tail = content[-self.tail_chars :] if self.tail_chars > 0 else ""
+        return f"{head}\n[... {tokens} tokens of this message were removed from the history to save tokens ...]\n{tail}"
+
+    def _compact_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        compacted = dict(message)
+        content = self._compact_content(message.get("content"))
+        if content is not None:
+            compacted["content"] = content
+        # The content of the tool responses is sent instead of the content of the message
+        if message.get("tool_responses"):
+            compacted["tool_responses"] = []
+            for tool_response in message["tool_responses"]:
+                content = self._compact_content(tool_response.get("content"))
+                compacted["tool_responses"].append(
+                    tool_response
+                    if content is None
+                    else {**tool_response, "content": content}
+                )
+        return compacted if compacted != message else message
+
+    def apply_transform(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        tokens = self.token_counter.count(messages)
+        if tokens <= self.max_tokens:
+            return messages
+
+        tool_names = self._tool_names(messages)
+        compacted = list(messages)
+        removed_tokens = 0
+        for i in range(1, len(messages) - self.keep_last_messages):
+            if tokens - removed_tokens <= self.max_tokens:
+                break
+            if self._is_protected(messages[i], tool_names):
+                continue
+            compacted[i] = self._compact_message(messages[i])
+            removed_tokens += self.token_counter.count_message(
+                messages[i]
+            ) - self.token_counter.count_message(compacted[i])
+
+        if removed_tokens > 0:
+            COMPACTED_TOKENS.labels(team=current_team_name.get()).inc(removed_tokens)
+        return compacted
+
+    def get_logs(
+        self,
+        pre_transform_messages: List[Dict[str, Any]],
+        post_transform_messages: List[Dict[str, Any]],
+    ) -> Tuple[str, bool]:
+        pre_tokens = self.token_counter.count(pre_transform_messages)
+        post_tokens = self.token_counter.count(post_transform_messages)
+        if post_tokens < pre_tokens:
+            return (
+                f"Compacted the history from {pre_tokens} to {post_tokens} tokens.",
+                True,
+            )
+        return "The history was not compacted.", False
@@ -0,0 +1,236 @@
+import pickle  # nosec: [B403]
+import sqlite3
+import threading
+import time
+from os import environ
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Callable, Optional, Tuple, Type
+
+import diskcache
+from prometheus_client import Counter
+
+from google_ads.cache import TTLCache
+
+from ._token_counter import current_team_name
+
+__all__ = (
+    "LLMCache",
+    "InMemoryLLMCache",
+    "DiskLLMCache",
+    "SQLiteLLMCache",
+    "create_llm_cache",
+)
+
+# The cache of the LLM responses of the teams in LLM_CACHE_TEAMS:
+# "" (disabled), "memory", "disk" or "sqlite"
+LLM_CACHE = environ.get("LLM_CACHE", "")
+LLM_CACHE_PATH = environ.get("LLM_CACHE_PATH", "./llm_cache")
+LLM_CACHE_MAX_ENTRIES = int(environ.get("LLM_CACHE_MAX_ENTRIES", 10_000))
+LLM_CACHE_TTL_SECONDS = float(environ.get("LLM_CACHE_TTL_SECONDS", 24 * 60 * 60))
+# Registered names of the teams which use the cache, e.g. "brief_creation_team,default_team"
+LLM_CACHE_TEAMS = tuple(
+    name.strip()
+    for name in environ.get("LLM_CACHE_TEAMS", "").split(",")
+    if name.strip()
+)
+
+LLM_CACHE_REQUESTS = Counter(
+    "llm_cache_requests_total",
+    "Total count of the LLM requests looked up in the cache by team and result (hit or miss)",
+    ["team", "result"],
+)
+LLM_CACHE_SAVED_TOKENS = Counter(
+    "llm_cache_saved_tokens_total",
+    "Total count of tokens of the LLM responses returned from the cache by team",
+    ["team"],
+)
+LLM_CACHE_SAVED_COST = Counter(
+    "llm_cache_saved_cost_total",
+    "Total cost in USD of the LLM responses returned from the cache by team",
+    ["team"],
+)
+LLM_CACHE_EVICTIONS = Counter(
+    "llm_cache_evictions_total",
+    "Total count of LLM responses removed from the cache by reason (size or ttl)",
+    ["reason"],
+)
+
+
+class LLMCache:
+    """Cache of the LLM responses, used by autogen instead of 'autogen.cache.Cache'.
+
+    At most 'max_entries' responses are kept and the responses older than 'ttl' seconds are
+    never returned. The cache is shared by the teams, so it stays open when autogen exits
+    its context after every request.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        ttl: float = LLM_CACHE_TTL_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+
+    def _load(self, key: str) -> Optional[Tuple[float, Any]]:
+        """Returns the time when the response was stored and the response."""
+        raise NotImplementedError()
+
+    def _store(self, key: str, created_at: float, value: Any) -> int:
+        """Stores the response and removes the responses above 'max_entries', returns the number of removed responses."""
+        raise NotImplementedError()
+
+    def _delete(self, key: str) -> None:
+        raise NotImplementedError()
+
+    def get(self, key: str, default: Optional[Any] = None) -> Optional[Any]:
+        team = current_team_name.get()
+        entry = self._load(key)
+        if entry is not None and self._clock() - entry[0] > self.ttl:
+            self._delete(key)
+            LLM_CACHE_EVICTIONS.labels(reason="ttl").inc()
+            entry = None
+        if entry is None:
+            LLM_CACHE_REQUESTS.labels(team=team, result="miss").inc()
+            return default
+
+        value = entry[1]
+        LLM_CACHE_REQUESTS.labels(team=team, result="hit").inc()
+        usage = getattr(value, "usage", None)
+        if usage is not None:
+            LLM_CACHE_SAVED_TOKENS.labels(team=team).inc(usage.total_tokens)
+        cost = getattr(value, "cost", None)
+        if isinstance(cost, (int, float)):
+            LLM_CACHE_SAVED_COST.labels(team=team).inc(cost)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        evicted = self._store(key, self._clock(), value)
+        if evicted > 0:
+            LLM_CACHE_EVICTIONS.labels(reason="size").inc(evicted)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "LLMCache":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+class InMemoryLLMCache(LLMCache):
+    """Keeps the responses in the memory of the worker, the least recently used are evicted first."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        # The expiration is checked by 'get' so the expired responses are counted
+        self._entries: TTLCache[str, Tuple[float, Any]] = TTLCache(
+            maxsize=self.max_entries, clock=self._clock
+        )
+
+    def _load(self, key: str) -> Optional[Tuple[float, Any]]:
+        return self._entries.get(key)
+
+    def _store(self, key: str, created_at: float, value: Any) -> int:
+        return len(self._entries.set(key, (created_at, value)))
+
+    def _delete(self, key: str) -> None:
+        self._entries.pop(key)
+
+
+class DiskLLMCache(LLMCache):
+    """Keeps the responses in a 'diskcache' directory (the same as 'autogen.cache.Cache.disk').
+
+    The directory can be shared by the workers on the same node, the oldest responses are
+    evicted first.
+    """
+
+    def __init__(self, directory: Path, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._cache = diskcache.Cache(str(directory))
+
+    def _load(self, key: str) -> Optional[Tuple[float, Any]]:
+        return self._cache.get(key)  # type: ignore[no-any-return]
+
+    def _store(self, key: str, created_at: float, value: Any) -> int:
+        # diskcache removes the expired responses itself
+        self._cache.set(key, (created_at, value), expire=self.ttl)
+        evicted = 0
+        while len(self._cache) > self.max_entries:
+            try:
+                oldest, _ = self._cache.peekitem(last=False)
+            except KeyError:
+                break
+            self._cache.delete(oldest)
+            evicted += 1
+        return evicted
+
+    def _delete(self, key: str) -> None:
+        self._cache.delete(key)
+
+
+class SQLiteLLMCache(LLMCache):
+    """Keeps the responses in an SQLite database, the least recently used are evicted first."""
+
+    def __init__(self, path: Path, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(key TEXT PRIMARY KEY, created_at REAL, last_used REAL, value BLOB)"
+            )
+
+    def _load(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT created_at, value FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                "UPDATE llm_cache SET last_used = ? WHERE key = ?", (self._clock(), key)
+            )
+        return row[0], pickle.loads(row[1])  # nosec: [B301]
+
+    def _store(self, key: str, created_at: float, value: Any) -> int:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)",
+                (key, created_at, created_at, pickle.dumps(value)),
+            )
+            cursor = self._connection.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            return cursor.rowcount
+
+    def _delete(self, key: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+
+
+def create_llm_cache(
+    name: str = LLM_CACHE, path: str = LLM_CACHE_PATH
+) -> Optional[LLMCache]:
+    if not name:
+        return None
+    if name == "memory":
+        return InMemoryLLMCache()
+    if name == "disk":
+        return DiskLLMCache(Path(path))
+    if name == "sqlite":
+        return SQLiteLLMCache(Path(path) / "llm_cache.sqlite")
+    raise ValueError(f"Unknown LLM cache: '{name}'")
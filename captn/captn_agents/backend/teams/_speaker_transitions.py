@@ -0,0 +1,118 @@
+from typing import Any, Dict, List, Optional, Union
+
+import autogen
+from autogen.agentchat import Agent
+from prometheus_client import Counter
+
+from ._token_counter import current_team_name
+
+__all__ = ("SpeakerTransitions",)
+
+SPEAKER_SELECTIONS = Counter(
+    "groupchat_speaker_selections_total",
+    "Total count of the next speaker selections in the group chats by team and method (rule or llm)",
+    ["team", "method"],
+)
+
+
+class SpeakerTransitions:
+    """Selects the next speaker of the group chat by rules, the LLM is asked only if the rules leave more than one choice.
+
+    The rules, in order:
+    - a message with tool calls is followed by the member which executes the tools (user_proxy),
+    - the tool responses are followed by the member which called the tools,
+    - the speaker is followed by the only member allowed by the 'transitions' of the team.
+
+    'transitions' maps the name of a member to the names of the members which may speak after
+    it. By default, every member may speak after every other one and the members which are not
+    user proxies may also speak twice in a row.
+    """
+
+    def __init__(self, transitions: Optional[Dict[str, List[str]]] = None) -> None:
+        self.transitions = transitions if transitions is not None else {}
+
+    @staticmethod
+    def _agent_name(name: str) -> str:
+        # The same as the names of the members created by the team
+        return name.lower().replace(" ", "_")
+
+    def allowed_transitions(
+        self, agents: List[autogen.ConversableAgent]
+    ) -> Dict[Agent, List[Agent]]:
+        """The graph of the allowed transitions between the members, used by the LLM selection too."""
+        agents_by_name = {agent.name: agent for agent in agents}
+        graph: Dict[Agent, List[Agent]] = {}
+        for agent in agents:
+            graph[agent] = [
+                other
+                for other in agents
+                if other is not agent or not isinstance(agent, autogen.UserProxyAgent)
+            ]
+
+        for name, next_names in self.transitions.items():
+            for n in [name, *next_names]:
+                if self._agent_name(n) not in agents_by_name:
+                    raise ValueError(
+                        f"Unknown member '{n}' in the speaker transitions, the members are: {list(agents_by_name)}"
+                    )
+            graph[agents_by_name[self._agent_name(name)]] = [
+                agents_by_name[self._agent_name(n)] for n in next_names
+            ]
+
+        return graph
+
+    @staticmethod
+    def _tool_executor(
+        message: Dict[str, Any], groupchat: autogen.GroupChat
+    ) -> Optional[Agent]:
+        tools = [
+            tool_call["function"]["name"]
+            for tool_call in message.get("tool_calls") or []
+            if tool_call.get("type") == "function"
+        ]
+        if not tools:
+            return None
+        executors = [
+            agent for agent in groupchat.agents if agent.can_execute_function(tools)
+        ]
+        return executors[0] if len(executors) == 1 else None
+
+    @staticmethod
+    def _tool_caller(
+        message: Dict[str, Any], groupchat: autogen.GroupChat
+    ) -> Optional[Agent]:
+        tool_call_ids = {
+            tool_response.get("tool_call_id")
+            for tool_response in message.get("tool_responses") or []
+        }
+        if not tool_call_ids:
+            return None
+        for previous in reversed(groupchat.messages[:-1]):
+            if any(
+                tool_call["id"] in tool_call_ids
+                for tool_call in previous.get("tool_calls") or []
+            ):
+                return groupchat.agent_by_name(previous.get("name", ""))
+        return None
+
+    def select_speaker(
+        self, last_speaker: Agent, groupchat: autogen.GroupChat
+    ) -> Union[Agent, str]:
+        """Used as 'speaker_selection_method' of the group chat, "auto" lets the LLM select the speaker."""
+        speaker: Optional[Agent] = None
+        if groupchat.messages:
+            message = groupchat.messages[-1]
+            speaker = self._tool_executor(message, groupchat) or self._tool_caller(
+                message, groupchat
+            )
+        if speaker is None:
+            allowed = groupchat.allowed_speaker_transitions_dict.get(last_speaker, [])
+            if len(allowed) == 1:
+                speaker = allowed[0]
+
+        team = current_team_name.get()
+        if speaker is None:
+            SPEAKER_SELECTIONS.labels(team=team, method="llm").inc()
+            return "auto"
+        SPEAKER_SELECTIONS.labels(team=team, method="rule").inc()
+        return speaker
@@ -1,8 +1,18 @@
 import datetime
 import json
-import time
 import traceback
-from typing import Any, Callable, Dict, List, Optional, Tuple, Type, TypeVar
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
 import autogen
 import httpx
@@ -11,10 +21,37 @@ from fastcore.basics import patch
 from prometheus_client import Counter
 
 from ..config import Config
+from ..retry_policy import RETRY_POLICY, is_permanent_error, is_transient_error
 from ..toolboxes import Toolbox
+from ._history_compaction import HistoryCompaction
+from ._llm_cache import LLM_CACHE_TEAMS, LLMCache, create_llm_cache
+from ._speaker_transitions import SpeakerTransitions
+from ._team_progress import ProgressHooks, stream_reply_tokens
+from ._team_registry import (
+    RESTORED_TEAMS_TOTAL,
+    TEAM_HIBERNATION_DIR,
+    TEAM_HIBERNATION_TTL,
+    TeamRegistry,
+)
+from ._team_state_store import (
+    FileTeamStateStore,
+    TeamStateStore,
+    create_team_state_store,
+    dump_context,
+    restore_context,
+)
+from ._token_counter import (
+    count_token,
+    current_team_name,
+    get_token_counter,
+    observe_request_tokens,
+)
 
 _completions_create_original = autogen.oai.client.OpenAIClient.create
 
+# The streamed responses count the prompt tokens of the whole conversation again
+autogen.oai.client.count_token = count_token
+
 
 # WORKAROUND for consistent 500 error code when using openai functions
 @patch  # type: ignore
@@ -31,12 +68,10 @@ def create(
             # print(f"Removing name parameter from the following message:\n{message}")
             message.pop("name")
 
-    tokens_per_request = autogen.token_count_utils.count_token(
-        params["messages"], model="gpt-4-1106-preview"
-    )
-    print(f"Tokens per request: {tokens_per_request}")
+    observe_request_tokens(params["messages"], model=params["model"])
 
-    return _completions_create_original(self, params=params)
+    with stream_reply_tokens():
+        return _completions_create_original(self, params=params)
 
 
 T = TypeVar("T")
@@ -54,13 +89,28 @@ BAD_REQUEST_ERRORS = Counter(
 class Team:
     _team_name_counter: int = 0
     _functions: Optional[List[Dict[str, Any]]] = None
+    # The names of the members which may speak after a member, see SpeakerTransitions
+    _speaker_transitions: Dict[str, List[str]] = {}
 
-    _teams: Dict[str, "Team"] = {}
+    _teams: TeamRegistry = TeamRegistry()
 
     _team_registry: Dict[str, Type["Team"]] = {}
 
     _inverse_team_registry: Dict[Type["Team"], str] = {}
 
+    # If set, the conversations are stored after every request so any worker can continue them
+    state_store: Optional[TeamStateStore] = create_team_state_store()
+    # Teams evicted from the memory are stored here if there is no state store
+    hibernation_store: FileTeamStateStore = FileTeamStateStore(
+        Path(TEAM_HIBERNATION_DIR)
+    )
+    # The LLM responses of the teams in 'llm_cache_teams' are cached
+    llm_cache: Optional[LLMCache] = create_llm_cache()
+    llm_cache_teams: Tuple[str, ...] = LLM_CACHE_TEAMS
+    # The version of the stored state and whether the current state is stored
+    state_version: int
+    state_saved: bool
+
     _retry_messages = [
         "NOTE: When generating JSON for the function, do NOT use ANY whitespace characters (spaces, tabs, newlines) in the JSON string.\n\nPlease continue.",
         "Please continue.",
@@ -119,14 +169,197 @@ class Team:
         return Team._teams[team_name] if team_name in Team._teams else None
 
     @staticmethod
-    def pop_team(user_id: int, conv_id: int) -> Optional["Team"]:
+    def pop_team(
+        user_id: int, conv_id: int, delete_state: bool = True
+    ) -> Optional["Team"]:
+        """Remove the team of the finished conversation (or of the replaced team).
+
+        The stored state is deleted too, unless 'delete_state' is False (the team is only
+        replaced by its stored state).
+        """
         team_name = Team.construct_team_name(user_id, conv_id)
+        if delete_state:
+            try:
+                if Team.state_store is not None:
+                    Team.state_store.delete(team_name)
+                Team.hibernation_store.delete(team_name)
+            except Exception as e:
+                print(f"Failed to delete the state of the team '{team_name}': {e}")
         try:
             return Team._teams.pop(team_name)
         except KeyError:
             return None
             # raise ValueError(f"Unknown team name: '{team_name}'") from e
 
+    @staticmethod
+    def get_or_load_team(user_id: int, conv_id: int) -> Optional["Team"]:
+        """Get the team from this worker or load it from the state store.
+
+        The team of this worker is used only if no other worker continued the conversation
+        since, otherwise the team is recreated from the stored state.
+        """
+        team = Team.get_team(user_id=user_id, conv_id=conv_id)
+        team_name = Team.construct_team_name(user_id, conv_id)
+        if Team.state_store is None:
+            return team if team is not None else Team._wake_up_team(team_name)
+
+        try:
+            state = Team.state_store.load(team_name)
+        except Exception as e:
+            print(f"Failed to load the state of the team '{team_name}': {e}")
+            return team
+
+        if state is None or (
+            team is not None and team.state_version == state["version"]
+        ):
+            return team
+
+        Team.pop_team(user_id=user_id, conv_id=conv_id, delete_state=False)
+        RESTORED_TEAMS_TOTAL.inc()
+        return Team.from_state(state)
+
+    @staticmethod
+    def _wake_up_team(team_name: str) -> Optional["Team"]:
+        try:
+            state = Team.hibernation_store.load(team_name)
+        except Exception as e:
+            print(f"Failed to load the hibernated team '{team_name}': {e}")
+            return None
+        if state is None:
+            return None
+
+        team = Team.from_state(state)
+        RESTORED_TEAMS_TOTAL.inc()
+        Team.hibernation_store.delete(team_name)
+        return team
+
+    def hibernate(self) -> bool:
+        """Store the team so it can be removed from the memory.
+
+        Returns False if the team can't be recreated later and must stay in the memory.
+        """
+        if type(self) not in Team._inverse_team_registry:
+            return False
+        try:
+            if Team.state_store is not None:
+                # The state is stored after every request, unless the save failed
+                # (a newer state stored by another worker is used too)
+                if not self.state_saved:
+                    self._save_state()
+            else:
+                Team.hibernation_store.save(self.name, self.get_state())
+        except Exception as e:
+            print(f"Failed to hibernate the team '{self.name}': {e}")
+            return False
+        return True
+
+    @staticmethod
+    def evict_teams() -> None:
+        """Evict the idle teams and delete the hibernated teams of the abandoned conversations, run periodically."""
+        Team._teams.evict()
+        try:
+            deleted = Team.hibernation_store.delete_expired(TEAM_HIBERNATION_TTL)
+        except Exception as e:
+            print(f"Failed to delete the expired hibernated teams: {e}")
+            return
+        if deleted:
+            print(f"Deleted {len(deleted)} expired hibernated teams")
+
+    @staticmethod
+    def conversation_lock(user_id: int, conv_id: int) -> ContextManager[None]:
+        """Only one request of the conversation is handled at a time, by any worker (see 'TeamStateStore.lock')."""
+        team_name = Team.construct_team_name(user_id, conv_id)
+        # Without the state store the conversations are continued only by this worker
+        store = (
+            Team.state_store if Team.state_store is not None else Team.hibernation_store
+        )
+        return store.lock(team_name)
+
+    def _save_state(self) -> bool:
+        """Store the state, returns False if another worker stored a newer version."""
+        if Team.state_store is None:
+            return False
+        state = self.get_state()
+        state["version"] = self.state_version + 1
+        if not Team.state_store.save(
+            self.name, state, expected_version=self.state_version
+        ):
+            return False
+        self.state_version = state["version"]
+        self.state_saved = True
+        return True
+
+    @staticmethod
+    def save_team_state(user_id: int, conv_id: int) -> None:
+        """Store the current team of the conversation (it might have delegated the task to a new team)."""
+        team = Team.get_team(user_id=user_id, conv_id=conv_id)
+        if Team.state_store is None or team is None:
+            return
+        if type(team) not in Team._inverse_team_registry:
+            # Only the registered teams can be recreated by other workers
+            return
+
+        try:
+            if team._save_state():
+                return
+        except Exception as e:
+            print(f"Failed to save the state of the team '{team.name}': {e}")
+            return
+
+        # Another worker continued the conversation, its state is kept and used from now on
+        print(f"The team '{team.name}' was changed by another worker, reloading it")
+        Team.pop_team(user_id=user_id, conv_id=conv_id, delete_state=False)
+        Team.get_or_load_team(user_id=user_id, conv_id=conv_id)
+
+    def get_state(self) -> Dict[str, Any]:
+        context = self.toolbox.get_context() if self.toolbox is not None else None
+        return {
+            "user_id": self.user_id,
+            "conv_id": self.conv_id,
+            "version": self.state_version,
+            "registred_team_name": type(self).get_registred_team_name(),
+            "task": self.task,
+            "work_dir": self.work_dir,
+            "max_round": self.max_round,
+            "seed": self.seed,
+            "temperature": self.temperature,
+            "initial_message": self.initial_message,
+            "retry_from_scratch_counter": self.retry_from_scratch_counter,
+            "recommended_modifications_and_answer_list": self.recommended_modifications_and_answer_list,
+            "messages": self.get_messages(),
+            "context": dump_context(context) if context is not None else None,
+        }
+
+    @staticmethod
+    def from_state(state: Dict[str, Any]) -> "Team":
+        team_class = Team.get_class_by_registred_team_name(state["registred_team_name"])
+        team = team_class(  # type: ignore
+            user_id=state["user_id"],
+            conv_id=state["conv_id"],
+            task=state["task"],
+            work_dir=state["work_dir"],
+            max_round=state["max_round"],
+            seed=state["seed"],
+            temperature=state["temperature"],
+        )
+        team.state_version = state["version"]
+        team.state_saved = True
+        team.initial_message = state["initial_message"]
+        team.initiate_chat_kwargs = {}
+        team.retry_from_scratch_counter = state["retry_from_scratch_counter"]
+        # The list is shared with the toolbox context, so it is updated in place
+        team.recommended_modifications_and_answer_list[:] = [
+            (modification_and_answer[0], modification_and_answer[1])
+            for modification_and_answer in state[
+                "recommended_modifications_and_answer_list"
+            ]
+        ]
+        context = team.toolbox.get_context() if team.toolbox is not None else None
+        if context is not None and state["context"] is not None:
+            restore_context(context, state["context"])
+        team._restore_messages(state["messages"])
+        return team
+
     @staticmethod
     def get_user_conv_team_name(name_prefix: str, user_id: int, conv_id: int) -> str:
         name = f"{name_prefix}_{str(user_id)}_{str(conv_id)}"
@@ -172,6 +405,9 @@ class Team:
         self.name = Team.construct_team_name(user_id=user_id, conv_id=conv_id)
         self.user_proxy: Optional[autogen.UserProxyAgent] = None
         self.retry_from_scratch_counter = 0
+        self.state_version = 0
+        # False while the conversation has changes which are not in the state store
+        self.state_saved = False
         self.toolbox: Toolbox
         Team._store_team(user_id=user_id, conv_id=conv_id, team=self)
 
@@ -208,30 +444,68 @@ class Team:
                 message,
             )
 
+    @staticmethod
+    def _get_model(llm_config: Dict[str, Any]) -> str:
+        # The config of the first model is used, the same as in autogen.OpenAIWrapper
+        config = (llm_config.get("config_list") or [llm_config])[0]
+        return config.get("model") or ""
+
+    @classmethod
+    def _get_llm_cache(cls) -> Optional[LLMCache]:
+        if Team.llm_cache is None or cls not in Team._inverse_team_registry:
+            return None
+        if Team._inverse_team_registry[cls] not in Team.llm_cache_teams:
+            return None
+        return Team.llm_cache
+
     def _create_groupchat_and_manager(self) -> None:
         manager_llm_config = self.llm_config.copy()  # type: ignore
         # GroupChatManager is not allowed to make function/tool calls (from version 0.2.2).
         manager_llm_config.pop("functions", None)
         manager_llm_config.pop("tools", None)
 
-        # list of all members except user_proxy (he is not an LLM)
+        # The next speaker is selected by the transitions of the team, the LLM selects it only
+        # if there is more than one choice (by default, every member except user_proxy can repeat)
         # TODO: Try benchmarking allow_repeat_speaker=False - maybe the TimeOuts will be less
-        allow_repeat_speaker = [
-            member
-            for member in self.members
-            if not isinstance(member, autogen.UserProxyAgent)
-        ]
+        speaker_transitions = SpeakerTransitions(self._speaker_transitions)
+        # Every LLM request resends the whole history, the old messages are compacted
+        history_compaction = HistoryCompaction(
+            token_counter=get_token_counter(self._get_model(manager_llm_config))
+        )
         self.groupchat = autogen.GroupChat(
             agents=self.members,
             messages=[],
             max_round=self.max_round,
-            allow_repeat_speaker=allow_repeat_speaker,
+            allowed_or_disallowed_speaker_transitions=speaker_transitions.allowed_transitions(
+                self.members
+            ),
+            speaker_transitions_type="allowed",
+            speaker_selection_method=speaker_transitions.select_speaker,
+            select_speaker_transform_messages=history_compaction.speaker_selection_transforms(),
         )
         self.manager = autogen.GroupChatManager(
             groupchat=self.groupchat,
             llm_config=manager_llm_config,
             is_termination_msg=self._is_termination_msg,
         )
+        # The members use the cache of the manager while the group chat is running
+        self.manager.client_cache = self._get_llm_cache()
+        ProgressHooks().register(self.members)
+        history_compaction.register(self.members)
+
+    def _restore_messages(self, messages: List[Dict[str, Any]]) -> None:
+        # The same as in GroupChatManager.run_chat: the message of the speaker is sent to the
+        # manager and the manager sends it to all the other members
+        for message in messages:
+            speaker = (
+                self.groupchat.agent_by_name(message.get("name", "")) or self.manager
+            )
+            for agent in self.groupchat.agents:
+                if agent is speaker:
+                    agent.send(message, self.manager, request_reply=False, silent=True)
+                else:
+                    self.manager.send(message, agent, request_reply=False, silent=True)
+            self.groupchat.append(message, speaker)
 
     def _create_members(self) -> None:
         self.members = [
@@ -387,8 +661,14 @@ You operate within the following constraints:
             else:
                 message = self._retry_messages[i]
 
+            if not RETRY_POLICY.wait(attempt=i, base_delay=delay, caller="retry_func"):
+                if exception is None:
+                    exception = TimeoutError(
+                        f"The deadline of the team '{self.name}' is exceeded"
+                    )
+                break
+
             try:
-                time.sleep(delay**i)
                 self.manager.send(
                     recipient=self.manager,
                     message=message,
@@ -398,10 +678,14 @@ You operate within the following constraints:
                 BAD_REQUEST_ERRORS.inc()
                 print(f"Exception type: {type(e)}, {e}")
                 exception = e
+                if is_permanent_error(e):
+                    break
             except (openai.APIStatusError, httpx.ReadTimeout, TimeoutError) as e:
                 OPENAI_API_STATUS_ERROR.inc()
                 print(f"Exception type: {type(e)}, {e}")
                 exception = e
+                if is_permanent_error(e):
+                    break
             except httpx.RemoteProtocolError as e:
                 print(f"Exception type: {type(e)}, {e}")
                 exception = e
@@ -416,11 +700,18 @@ You operate within the following constraints:
         print(f"Retry from scratch: {type(e)}, {e}")
         # Try the team again from scratch
         self.retry_from_scratch_counter += 1
-        if self.retry_from_scratch_counter < self._MAX_RETRIES_FROM_SCRATCH:
+        if (
+            self.retry_from_scratch_counter < self._MAX_RETRIES_FROM_SCRATCH
+            and not is_permanent_error(e)
+            and RETRY_POLICY.wait(
+                attempt=self.retry_from_scratch_counter,
+                base_delay=delay,
+                caller="retry_from_scratch",
+            )
+        ):
             self.initial_message += (
                 f"\nTimestamp: {datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S')}"
             )
-            time.sleep(delay**self.retry_from_scratch_counter)
             self.initiate_chat(**self.initiate_chat_kwargs)
         else:
             raise e
@@ -428,34 +719,41 @@ You operate within the following constraints:
     @staticmethod
     def handle_exceptions(func: Callable[..., None]) -> Callable[..., None]:
         def wrapper(self: "Team", *args: Any, **kwargs: Any) -> None:
-            try:
-                delay = kwargs.get("delay", 2)
-                func(self, *args, **kwargs)
-
-                if len(self.get_messages()) >= self.max_round:
-                    error_message = f"Maximum number of messages reached: {self.max_round}, Retrying the team from scratch."
-                    Team.retry_from_scratch(self, Exception(error_message), delay=delay)
-            except (
-                openai.APIStatusError,
-                openai.BadRequestError,
-                httpx.ReadTimeout,
-                httpx.RemoteProtocolError,
-                TimeoutError,
-            ) as e:
-                print(f"Handling exception: {type(e)}, {e}")
+            # The LLM requests of the chat are counted for this team
+            token = current_team_name.set(type(self).__name__)
+            # The retries from scratch are nested, but they share the deadline of the first retry.
+            # The team is not evicted while it is chatting, e.g. when another team is created.
+            with RETRY_POLICY.deadline(), Team._teams.in_use(self.name):
                 try:
-                    # Try to unstuck the team
-                    self.retry_func(delay=delay)
+                    delay = kwargs.get("delay", 2)
+                    func(self, *args, **kwargs)
+
+                    if len(self.get_messages()) >= self.max_round:
+                        error_message = f"Maximum number of messages reached: {self.max_round}, Retrying the team from scratch."
+                        Team.retry_from_scratch(
+                            self, Exception(error_message), delay=delay
+                        )
                 except Exception as e:
-                    Team.retry_from_scratch(self, e, delay=delay)
+                    if not is_transient_error(e):
+                        raise
+                    print(f"Handling exception: {type(e)}, {e}")
+                    try:
+                        # Try to unstuck the team
+                        self.retry_func(delay=delay)
+                    except Exception as e:
+                        Team.retry_from_scratch(self, e, delay=delay)
+                finally:
+                    current_team_name.reset(token)
 
         return wrapper
 
     @handle_exceptions
     def initiate_chat(self, **kwargs: Any) -> None:
+        self.state_saved = False
         self.initiate_chat_kwargs = kwargs
         self.manager.initiate_chat(self.manager, message=self.initial_message, **kwargs)
 
     @handle_exceptions
     def continue_chat(self, message: str) -> None:
+        self.state_saved = False
         self.manager.send(recipient=self.manager, message=message)
@@ -0,0 +1,140 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Literal, Optional, Union
+
+import autogen
+from autogen.io.base import IOStream
+from pydantic import BaseModel
+
+from ._token_counter import current_team_name
+
+__all__ = ("ProgressEvent", "ProgressHooks", "stream_progress", "stream_reply_tokens")
+
+
+class ProgressEvent(BaseModel):
+    """Progress of the team sent to the client before the final message."""
+
+    type: Literal["progress"] = "progress"
+    event: Literal[
+        "agent_turn_started", "tool_call_started", "tool_call_finished", "reply_token"
+    ]
+    team: str
+    agent: Optional[str] = None
+    tool: Optional[str] = None
+    content: Optional[str] = None
+
+
+_progress_callback: ContextVar[Optional[Callable[[ProgressEvent], None]]] = ContextVar(
+    "progress_callback", default=None
+)
+# The member of the team which is generating the reply
+_current_agent: ContextVar[Optional[str]] = ContextVar("current_agent", default=None)
+
+
+@contextmanager
+def stream_progress(callback: Callable[[ProgressEvent], None]) -> Iterator[None]:
+    """Report the progress of the teams running in this context to the callback."""
+    token = _progress_callback.set(callback)
+    try:
+        yield
+    finally:
+        _progress_callback.reset(token)
+
+
+def _report_progress(**kwargs: Any) -> None:
+    callback = _progress_callback.get()
+    if callback is None:
+        return
+    try:
+        callback(ProgressEvent(team=current_team_name.get(), **kwargs))
+    except Exception as e:
+        # The progress must never break the conversation
+        print(f"Failed to report the progress: {e}")
+
+
+class _ReplyTokensIOStream:
+    """Reports the tokens printed by autogen while the LLM response is streamed.
+
+    The reported tokens are not printed to the wrapped IOStream (e.g. the websocket of the
+    client), so they are not sent twice. The whole response is printed when it is received.
+    """
+
+    def __init__(self, iostream: IOStream, agent: str) -> None:
+        self.iostream = iostream
+        self.agent = agent
+
+    def print(
+        self, *objects: Any, sep: str = " ", end: str = "\n", flush: bool = False
+    ) -> None:
+        # Only the content of the response is printed with flush and without the end of line
+        if flush and end == "":
+            _report_progress(
+                event="reply_token",
+                agent=self.agent,
+                content=sep.join(map(str, objects)),
+            )
+            return
+        self.iostream.print(*objects, sep=sep, end=end, flush=flush)
+
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        return self.iostream.input(prompt, password=password)  # type: ignore[no-any-return]
+
+
+@contextmanager
+def stream_reply_tokens() -> Iterator[None]:
+    """Report the tokens of the LLM response if it was requested by a member of the team."""
+    agent = _current_agent.get()
+    if _progress_callback.get() is None or agent is None:
+        yield
+        return
+
+    with IOStream.set_default(_ReplyTokensIOStream(IOStream.get_default(), agent)):
+        yield
+
+
+class ProgressHooks:
+    """Autogen hooks which report the turns and the tool calls of the team members."""
+
+    def __init__(self) -> None:
+        self._tool_names: Dict[str, str] = {}
+
+    def register(self, agents: List[autogen.ConversableAgent]) -> None:
+        for agent in agents:
+            agent.register_hook(
+                "process_all_messages_before_reply", self._turn_started(agent.name)
+            )
+            agent.register_hook("process_message_before_send", self._before_send)
+
+    @staticmethod
+    def _turn_started(
+        name: str,
+    ) -> Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]:
+        def hook(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            _current_agent.set(name)
+            _report_progress(event="agent_turn_started", agent=name)
+            return messages
+
+        return hook
+
+    def _before_send(
+        self,
+        sender: autogen.ConversableAgent,
+        message: Union[Dict[str, Any], str],
+        recipient: autogen.Agent,
+        silent: bool,
+    ) -> Union[Dict[str, Any], str]:
+        # The reply of the agent is generated
+        _current_agent.set(None)
+        if silent or not isinstance(message, dict):
+            return message
+
+        for tool_call in message.get("tool_calls") or []:
+            tool = tool_call["function"]["name"]
+            self._tool_names[tool_call["id"]] = tool
+            _report_progress(event="tool_call_started", agent=sender.name, tool=tool)
+
+        for tool_response in message.get("tool_responses") or []:
+            tool = self._tool_names.pop(tool_response.get("tool_call_id", ""), None)
+            _report_progress(event="tool_call_finished", agent=sender.name, tool=tool)
+
+        return message
@@ -0,0 +1,219 @@
+import json
+import threading
+import time
+from collections import Counter as CounterDict
+from contextlib import contextmanager
+from os import environ
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    MutableMapping,
+    Set,
+    Tuple,
+)
+
+from prometheus_client import Counter, Gauge
+
+from google_ads.cache import TTLCache
+
+if TYPE_CHECKING:
+    from ._team import Team
+
+__all__ = ("TeamRegistry", "estimate_team_memory")
+
+# Limits of the teams kept in the memory of one worker, the other teams are hibernated
+TEAM_REGISTRY_MAX_TEAMS = int(environ.get("TEAM_REGISTRY_MAX_TEAMS", 200))
+TEAM_REGISTRY_IDLE_TTL = int(environ.get("TEAM_REGISTRY_IDLE_TTL", 30 * 60))
+TEAM_REGISTRY_MAX_MEMORY_MB = int(environ.get("TEAM_REGISTRY_MAX_MEMORY_MB", 1024))
+TEAM_HIBERNATION_DIR = environ.get("TEAM_HIBERNATION_DIR", "./hibernated_teams")
+# The idle teams are evicted periodically, the hibernated teams of the conversations which
+# were not continued for TEAM_HIBERNATION_TTL seconds are deleted
+TEAM_REGISTRY_EVICT_INTERVAL = int(environ.get("TEAM_REGISTRY_EVICT_INTERVAL", 60))
+TEAM_HIBERNATION_TTL = int(environ.get("TEAM_HIBERNATION_TTL", 7 * 24 * 60 * 60))
+
+# Agents, tools and LLM configs of a team without messages (~465 KiB for GoogleAdsTeam)
+TEAM_MEMORY_OVERHEAD = 512 * 1024
+
+RESIDENT_TEAMS = Gauge(
+    "team_registry_resident_teams", "Number of teams in the memory of the worker"
+)
+RESIDENT_TEAMS_MEMORY = Gauge(
+    "team_registry_resident_teams_memory_bytes",
+    "Estimated memory used by the teams in the memory of the worker",
+)
+EVICTED_TEAMS_TOTAL = Counter(
+    "team_registry_evicted_teams_total",
+    "Total count of teams removed from the memory of the worker",
+    ["reason"],
+)
+RESTORED_TEAMS_TOTAL = Counter(
+    "team_registry_restored_teams_total",
+    "Total count of teams recreated from the stored or hibernated state",
+)
+
+
+def estimate_team_memory(team: "Team") -> int:
+    groupchat = getattr(team, "groupchat", None)
+    if groupchat is None:
+        return TEAM_MEMORY_OVERHEAD
+    messages_size = len(json.dumps(groupchat.messages, default=str))
+    # The manager and every member keep their own copy of the messages
+    return TEAM_MEMORY_OVERHEAD + messages_size * (len(groupchat.agents) + 2)
+
+
+class TeamRegistry(MutableMapping[str, "Team"]):
+    """The teams of the worker by team name, limited by count, idle time and memory.
+
+    When a limit is exceeded, the least recently used teams are evicted. Evicted teams are
+    hibernated with 'Team.hibernate' and recreated when the conversation continues. Teams
+    which are in use (see 'in_use') or can't be hibernated are never evicted.
+    """
+
+    def __init__(
+        self,
+        max_teams: int = TEAM_REGISTRY_MAX_TEAMS,
+        idle_ttl: float = TEAM_REGISTRY_IDLE_TTL,
+        max_memory: int = TEAM_REGISTRY_MAX_MEMORY_MB * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_teams = max_teams
+        self.idle_ttl = idle_ttl
+        self.max_memory = max_memory
+        # The least recently used team is the first one, the idle teams are hibernated by 'evict'
+        self._teams: TTLCache[str, "Team"] = TTLCache(clock=clock, refresh_on_get=True)
+        self._memory: Dict[str, int] = {}
+        self._in_use: CounterDict[str] = CounterDict()
+        self._lock = threading.RLock()
+
+    def __getitem__(self, team_name: str) -> "Team":
+        with self._lock:
+            team = self._teams.get(team_name)
+            if team is None:
+                raise KeyError(team_name)
+            return team
+
+    def __setitem__(self, team_name: str, team: "Team") -> None:
+        with self._lock:
+            self._teams.set(team_name, team)
+            self._memory[team_name] = estimate_team_memory(team)
+        self.evict()
+
+    def __delitem__(self, team_name: str) -> None:
+        with self._lock:
+            if self._teams.pop(team_name) is None:
+                raise KeyError(team_name)
+            del self._memory[team_name]
+            self._update_metrics()
+
+    def __contains__(self, team_name: Any) -> bool:
+        return team_name in self._teams
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._teams)
+
+    def __len__(self) -> int:
+        return len(self._teams)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._teams.clear()
+            self._memory.clear()
+            self._update_metrics()
+
+    @property
+    def memory(self) -> int:
+        return sum(self._memory.values())
+
+    def _update_metrics(self) -> None:
+        RESIDENT_TEAMS.set(len(self._teams))
+        RESIDENT_TEAMS_MEMORY.set(self.memory)
+
+    @contextmanager
+    def in_use(self, team_name: str) -> Iterator[None]:
+        """The team is not evicted while it is used, e.g. during the conversation."""
+        with self._lock:
+            self._in_use[team_name] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_use[team_name] -= 1
+                if self._in_use[team_name] <= 0:
+                    del self._in_use[team_name]
+                team = self._teams.get(team_name)
+                if team is not None:
+                    # The messages were added during the conversation
+                    self._memory[team_name] = estimate_team_memory(team)
+            self.evict()
+
+    def _evict_team(self, team_name: str, reason: str) -> bool:
+        # The team is hibernated without the lock, so the other teams can be used meanwhile
+        with self._lock:
+            team = self._teams.peek(team_name)
+        if team is None or not team.hibernate():
+            return False
+        with self._lock:
+            # The team could have been used or replaced while it was hibernated
+            if team_name in self._in_use or self._teams.peek(team_name) is not team:
+                return False
+            del self[team_name]
+        EVICTED_TEAMS_TOTAL.labels(reason=reason).inc()
+        return True
+
+    def _select_teams_to_evict(self, skipped: Set[str]) -> List[Tuple[str, str]]:
+        """The idle teams and the least recently used teams above the limits, with the reasons."""
+        team_names = list(self._teams)
+        candidates = [
+            team_name
+            for team_name in team_names
+            if team_name not in self._in_use and team_name not in skipped
+        ]
+        selected = []
+        for team_name in candidates:
+            if self._teams.age(team_name) <= self.idle_ttl:
+                # The rest of the teams were used more recently
+                break
+            selected.append((team_name, "idle"))
+
+        count = len(team_names) - len(selected)
+        memory = self.memory - sum(self._memory[team_name] for team_name, _ in selected)
+        for team_name in candidates[len(selected) :]:
+            # The most recently used team is kept even if the others can't be evicted
+            if team_name == team_names[-1]:
+                break
+            if count > self.max_teams:
+                reason = "count"
+            elif memory > self.max_memory:
+                reason = "memory"
+            else:
+                break
+            selected.append((team_name, reason))
+            count -= 1
+            memory -= self._memory[team_name]
+        return selected
+
+    def evict(self) -> List[str]:
+        """Evict the idle teams and the least recently used teams above the limits.
+
+        The teams are selected under the lock, but hibernated (e.g. written to a file) outside of it.
+        """
+        evicted: List[str] = []
+        skipped: Set[str] = set()
+        while True:
+            with self._lock:
+                selected = self._select_teams_to_evict(skipped)
+            if not selected:
+                break
+            for team_name, reason in selected:
+                if self._evict_team(team_name, reason=reason):
+                    evicted.append(team_name)
+                else:
+                    skipped.add(team_name)
+
+        with self._lock:
+            self._update_metrics()
+        return evicted
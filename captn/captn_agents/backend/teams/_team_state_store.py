@@ -0,0 +1,338 @@
+import asyncio
+import dataclasses
+import fcntl
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from os import environ
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Type
+
+import pandas as pd
+
+from ..toolboxes import Toolbox
+from ..tools._query_results import QueryResultPages
+
+__all__ = (
+    "TeamStateStore",
+    "FileTeamStateStore",
+    "PostgresTeamStateStore",
+    "create_team_state_store",
+    "dump_context",
+    "restore_context",
+)
+
+# Where the conversations are stored so that any worker can continue them:
+# "" (only in the memory of the worker), "file" or "postgres"
+TEAM_STATE_STORE = environ.get("TEAM_STATE_STORE", "")
+TEAM_STATE_STORE_DIR = environ.get("TEAM_STATE_STORE_DIR", "./team_states")
+# How long a request waits for the previous request of the same conversation to finish
+TEAM_STATE_LOCK_TIMEOUT = int(environ.get("TEAM_STATE_LOCK_TIMEOUT", 600))
+TEAM_STATE_LOCK_POLL_INTERVAL = 0.5
+# The lease of the conversation is renewed while the request is handled, it expires only if
+# the worker was killed
+TEAM_STATE_LEASE_TTL = int(environ.get("TEAM_STATE_LEASE_TTL", 120))
+
+
+def _wait_for_lock(
+    try_acquire: Callable[[], bool], team_name: str, timeout: float
+) -> None:
+    deadline = time.monotonic() + timeout
+    while not try_acquire():
+        if time.monotonic() >= deadline:
+            raise TimeoutError(
+                f"The conversation of the team '{team_name}' is still handled by another request"
+            )
+        time.sleep(TEAM_STATE_LOCK_POLL_INTERVAL)
+
+
+class TeamStateStore:
+    """Stores the serialised state of the teams by team name (see 'Team.construct_team_name')."""
+
+    def load(self, team_name: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError()
+
+    def save(
+        self,
+        team_name: str,
+        state: Dict[str, Any],
+        expected_version: Optional[int] = None,
+    ) -> bool:
+        """Store the state of the team.
+
+        If 'expected_version' is set, the state is stored only if the stored version is still
+        the expected one (or nothing is stored), otherwise False is returned: another worker
+        continued the conversation in the meantime.
+        """
+        raise NotImplementedError()
+
+    def delete(self, team_name: str) -> None:
+        raise NotImplementedError()
+
+    def lock(
+        self, team_name: str, timeout: float = TEAM_STATE_LOCK_TIMEOUT
+    ) -> ContextManager[None]:
+        """Lock the conversation of the team, for all the workers sharing the store.
+
+        The team is loaded, continued and saved under the lock, so two requests of the same
+        conversation are never answered from the same state. Raises TimeoutError if the lock
+        is not acquired within 'timeout' seconds.
+        """
+        raise NotImplementedError()
+
+
+class FileTeamStateStore(TeamStateStore):
+    """Stores every team in a JSON file, can be shared between the workers on the same node."""
+
+    def __init__(self, root_dir: Path) -> None:
+        self.root_dir = root_dir
+
+    def _path(self, team_name: str) -> Path:
+        return self.root_dir / f"{team_name}.json"
+
+    def load(self, team_name: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self._path(team_name).read_text())  # type: ignore[no-any-return]
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def _lock(self) -> Iterator[None]:
+        # The whole directory is locked, the saves are short
+        fd = os.open(self.root_dir, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def save(
+        self,
+        team_name: str,
+        state: Dict[str, Any],
+        expected_version: Optional[int] = None,
+    ) -> bool:
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(team_name)
+        with self._lock():
+            if expected_version is not None:
+                stored = self.load(team_name)
+                if stored is not None and stored["version"] != expected_version:
+                    return False
+            # Write to a temporary file first so the other workers never read a partial state
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(state))
+            tmp_path.replace(path)
+        return True
+
+    def delete(self, team_name: str) -> None:
+        self._path(team_name).unlink(missing_ok=True)
+
+    @contextmanager
+    def lock(
+        self, team_name: str, timeout: float = TEAM_STATE_LOCK_TIMEOUT
+    ) -> Iterator[None]:
+        # The lock files are kept, another request could be waiting for the lock
+        lock_dir = self.root_dir / "locks"
+        lock_dir.mkdir(parents=True, exist_ok=True)
+        fd = os.open(lock_dir / f"{team_name}.lock", os.O_RDWR | os.O_CREAT)
+
+        def _try_acquire() -> bool:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            return True
+
+        try:
+            _wait_for_lock(_try_acquire, team_name, timeout)
+            yield
+        finally:
+            os.close(fd)
+
+    def delete_expired(self, ttl: float) -> List[str]:
+        """Delete the teams which were not saved for 'ttl' seconds, returns their names."""
+        deleted = []
+        expires_before = time.time() - ttl
+        for path in self.root_dir.glob("*.json"):
+            try:
+                if path.stat().st_mtime < expires_before:
+                    path.unlink()
+                    deleted.append(path.stem)
+            except FileNotFoundError:
+                # Deleted or woken up by another worker
+                continue
+        return deleted
+
+
+class PostgresTeamStateStore(TeamStateStore):
+    """Stores the teams in the 'TeamState' table, can be shared between all the nodes."""
+
+    def load(self, team_name: str) -> Optional[Dict[str, Any]]:
+        from ...db_queries import get_team_state
+
+        state = asyncio.run(get_team_state(team_name))
+        return json.loads(state) if state is not None else None
+
+    def save(
+        self,
+        team_name: str,
+        state: Dict[str, Any],
+        expected_version: Optional[int] = None,
+    ) -> bool:
+        from ...db_queries import save_team_state
+
+        return asyncio.run(
+            save_team_state(
+                team_name=team_name,
+                user_id=state["user_id"],
+                conv_id=state["conv_id"],
+                version=state["version"],
+                state=json.dumps(state),
+                expected_version=expected_version,
+            )
+        )
+
+    def delete(self, team_name: str) -> None:
+        from ...db_queries import delete_team_state
+
+        asyncio.run(delete_team_state(team_name))
+
+    @contextmanager
+    def lock(
+        self, team_name: str, timeout: float = TEAM_STATE_LOCK_TIMEOUT
+    ) -> Iterator[None]:
+        from ...db_queries import (
+            acquire_team_state_lease,
+            release_team_state_lease,
+            renew_team_state_lease,
+        )
+
+        owner = uuid.uuid4().hex
+        _wait_for_lock(
+            lambda: asyncio.run(
+                acquire_team_state_lease(team_name, owner, TEAM_STATE_LEASE_TTL)
+            ),
+            team_name,
+            timeout,
+        )
+
+        stop = threading.Event()
+
+        def _renew() -> None:
+            while not stop.wait(TEAM_STATE_LEASE_TTL / 4):
+                try:
+                    renewed = asyncio.run(
+                        renew_team_state_lease(team_name, owner, TEAM_STATE_LEASE_TTL)
+                    )
+                except Exception as e:
+                    print(f"Failed to renew the lease of the team '{team_name}': {e}")
+                    continue
+                if not renewed:
+                    # The state is still saved with compare-and-set
+                    print(f"Lost the lease of the team '{team_name}'")
+                    return
+
+        thread = threading.Thread(target=_renew, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+            try:
+                asyncio.run(release_team_state_lease(team_name, owner))
+            except Exception as e:
+                print(f"Failed to release the lease of the team '{team_name}': {e}")
+
+
+def create_team_state_store(
+    name: str = TEAM_STATE_STORE, root_dir: str = TEAM_STATE_STORE_DIR
+) -> Optional[TeamStateStore]:
+    if not name:
+        return None
+    if name == "file":
+        return FileTeamStateStore(Path(root_dir))
+    if name == "postgres":
+        return PostgresTeamStateStore()
+    raise ValueError(f"Unknown team state store: '{name}'")
+
+
+# Dataclasses which can be used in the toolbox contexts
+_CONTEXT_DATACLASSES: Dict[str, Type[Any]] = {"QueryResultPages": QueryResultPages}
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, pd.DataFrame):
+        return {"__dataframe__": value.to_json(orient="split")}
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        name = type(value).__name__
+        if name not in _CONTEXT_DATACLASSES:
+            raise TypeError(f"Dataclass '{name}' can't be serialised")
+        return {
+            "__dataclass__": name,
+            "fields": {
+                field.name: _encode(getattr(value, field.name))
+                for field in dataclasses.fields(value)
+            },
+        }
+    if isinstance(value, dict):
+        return {str(k): _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise TypeError(f"Value of type '{type(value).__name__}' can't be serialised")
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "__dataframe__" in value:
+            return pd.read_json(io.StringIO(value["__dataframe__"]), orient="split")
+        if "__dataclass__" in value:
+            return _CONTEXT_DATACLASSES[value["__dataclass__"]](
+                **{k: _decode(v) for k, v in value["fields"].items()}
+            )
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+# These fields are set when the toolbox is created for the team
+_CONTEXT_FIELDS_FROM_TEAM = {
+    "user_id",
+    "conv_id",
+    "recommended_modifications_and_answer_list",
+}
+
+
+def dump_context(context: Any) -> Dict[str, Any]:
+    """Serialise the fields of the toolbox context (a dataclass) which change during the conversation."""
+    state = {}
+    for field in dataclasses.fields(context):
+        value = getattr(context, field.name)
+        if field.name in _CONTEXT_FIELDS_FROM_TEAM or isinstance(value, Toolbox):
+            continue
+        try:
+            state[field.name] = _encode(value)
+        except TypeError as e:
+            print(f"Context field '{field.name}' is not stored: {e}")
+    return state
+
+
+def restore_context(context: Any, state: Dict[str, Any]) -> None:
+    """Restore the fields of the newly created toolbox context."""
+    for name, encoded in state.items():
+        value = _decode(encoded)
+        current = getattr(context, name, None)
+        if isinstance(current, dict) and isinstance(value, dict):
+            # Keep the type of the field (e.g. defaultdict)
+            current.clear()
+            current.update(value)
+        else:
+            setattr(context, name, value)
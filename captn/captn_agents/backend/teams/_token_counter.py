@@ -0,0 +1,144 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import autogen
+import tiktoken
+from prometheus_client import Histogram
+
+__all__ = (
+    "MessageTokenCounter",
+    "count_token",
+    "current_team_name",
+    "get_token_counter",
+    "observe_request_tokens",
+)
+
+# Set by the team while it is chatting, used as the label of the metrics
+current_team_name: ContextVar[str] = ContextVar("current_team_name", default="unknown")
+
+REQUEST_TOKENS = Histogram(
+    "llm_request_tokens",
+    "Histogram of the number of prompt tokens sent to the LLM by team",
+    ["team"],
+    buckets=(1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000),
+)
+
+# Same as 'autogen.token_count_utils.count_token' for the gpt-4 models
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+TOKENS_PER_REPLY = 3
+
+
+class MessageTokenCounter:
+    """Counts the tokens of the messages sent to the LLM.
+
+    The messages of a conversation are sent again with every request, so the token count of
+    every message is cached by its content (and the encoding) and only the new messages are
+    tokenised.
+    """
+
+    def __init__(
+        self,
+        encoding_name: str = "cl100k_base",
+        max_cached_messages: int = 10_000,
+        encode: Optional[Callable[[str], List[int]]] = None,
+    ) -> None:
+        self.encoding_name = encoding_name
+        self.max_cached_messages = max_cached_messages
+        self._encode = encode
+        self._cache: "OrderedDict[bytes, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encode(self, text: str) -> List[int]:
+        if self._encode is None:
+            # The encoding is downloaded on the first use
+            self._encode = tiktoken.get_encoding(self.encoding_name).encode
+        return self._encode(text)
+
+    def _count_message_tokens(self, message: Dict[str, Any]) -> int:
+        tokens = TOKENS_PER_MESSAGE
+        for key, value in message.items():
+            if value is None:
+                continue
+            if not isinstance(value, str):
+                try:
+                    value = json.dumps(value)
+                except TypeError:
+                    continue
+            tokens += len(self.encode(value))
+            if key == "name":
+                tokens += TOKENS_PER_NAME
+        return tokens
+
+    def count_message(self, message: Dict[str, Any]) -> int:
+        key = hashlib.blake2b(
+            json.dumps(
+                [self.encoding_name, message], sort_keys=True, default=str
+            ).encode(),
+            digest_size=16,
+        ).digest()
+        with self._lock:
+            tokens = self._cache.get(key)
+            if tokens is not None:
+                self._cache.move_to_end(key)
+                return tokens
+
+        tokens = self._count_message_tokens(message)
+        with self._lock:
+            self._cache[key] = tokens
+            if len(self._cache) > self.max_cached_messages:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def count(self, messages: List[Dict[str, Any]]) -> int:
+        return (
+            sum(self.count_message(message) for message in messages) + TOKENS_PER_REPLY
+        )
+
+
+_token_counters: Dict[str, MessageTokenCounter] = {}
+_token_counters_lock = threading.Lock()
+
+
+def _get_encoding_name(model: str) -> str:
+    try:
+        return tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        # The same fallback as in 'autogen.token_count_utils'
+        return "cl100k_base"
+
+
+def get_token_counter(model: str) -> MessageTokenCounter:
+    """Get the token counter of the encoding of the model, shared by all models with the same encoding."""
+    encoding_name = _get_encoding_name(model)
+    with _token_counters_lock:
+        if encoding_name not in _token_counters:
+            _token_counters[encoding_name] = MessageTokenCounter(encoding_name)
+        return _token_counters[encoding_name]
+
+
+def observe_request_tokens(messages: List[Dict[str, Any]], model: str) -> None:
+    try:
+        tokens = get_token_counter(model).count(messages)
+    except Exception as e:
+        print(f"Failed to count the tokens of the request: {e}")
+        return
+    REQUEST_TOKENS.labels(team=current_team_name.get()).observe(tokens)
+
+
+def count_token(
+    input: Union[str, List[Dict[str, Any]], Dict[str, Any]],
+    model: str = "gpt-3.5-turbo-0613",
+) -> int:
+    """Same as 'autogen.token_count_utils.count_token', but the messages of the gpt-4 models are counted incrementally.
+
+    The messages are tokenised with the encoding of the model, autogen uses the encoding of
+    gpt-4 for all gpt-4 models (including gpt-4o).
+    """
+    if isinstance(input, list) and "gpt-4" in model:
+        return get_token_counter(model).count(input)
+    return autogen.token_count_utils.count_token(input, model=model)  # type: ignore[no-any-return]
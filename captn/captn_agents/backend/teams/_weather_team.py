@@ -37,6 +37,11 @@ Never introduce yourself when writing messages. E.g. do not write 'As an account
     ]
 
     _functions: Optional[List[Dict[str, Any]]] = []
+    # The two members take turns, the tool responses go back to the caller
+    _speaker_transitions: Dict[str, List[str]] = {
+        "Weather_forecaster": ["News_reporter"],
+        "News_reporter": ["Weather_forecaster"],
+    }
 
     def __init__(
         self,
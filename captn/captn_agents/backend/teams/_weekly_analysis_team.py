@@ -1,29 +1,67 @@
 import ast
+import asyncio
+import contextvars
 import json
+import os
+import socket
+import threading
+import time
 import traceback
+import zlib
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from functools import partial
 from os import environ
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
 
+import pandas as pd
 import requests
 from autogen.io import IOConsole, IOStream
 from markdownify import markdownify as md
+from prisma.models import WeeklyAnalysisCheckpoint
 from prometheus_client import Counter
 from pydantic import BaseModel
-from tenacity import retry, stop_after_attempt
+from tenacity import retry, retry_if_not_exception_type, stop_after_attempt
 
 from ....email.send_email import send_email as send_email_infobip
+from ....email.templates import load_template
+from ....google_ads.circuit_breaker import (
+    CircuitOpenError,
+    call_with_circuit_breaker,
+    consume_retry_budget,
+    stop_when_retry_budget_exhausted,
+)
 from ....google_ads.client import (
-    ALREADY_AUTHENTICATED,
     execute_query,
-    get_login_url,
-    get_user_ids_and_emails,
+    get_authenticated_user_ids_and_emails,
     list_accessible_customers,
 )
+from ...db_queries import (
+    acquire_weekly_analysis_lease,
+    delete_daily_metrics,
+    get_daily_metrics,
+    get_weekly_analysis_checkpoint,
+    release_weekly_analysis_lease,
+    renew_weekly_analysis_lease,
+    save_daily_metrics,
+    save_weekly_analysis_checkpoint,
+)
 from ..config import Config
-from ..tools._functions import get_webpage_status_code
+from ..tools._url_health_checker import URLHealthChecker
 from ..tools._weekly_analysis_team_tools import create_weekly_analysis_team_toolbox
 from ._shared_prompts import GET_INFO_FROM_THE_WEB_COMMAND
 from ._team import Team
@@ -33,6 +71,24 @@ __all__ = ("WeeklyAnalysisTeam",)
 REACT_APP_API_URL = environ.get("REACT_APP_API_URL", "http://localhost:3001")
 REDIRECT_DOMAIN = environ.get("REDIRECT_DOMAIN", "https://captn.ai")
 
+WEEKLY_ANALYSIS_MAX_WORKERS = int(environ.get("WEEKLY_ANALYSIS_MAX_WORKERS", 4))
+# Global caps shared by all the weekly analysis workers
+WEEKLY_ANALYSIS_MAX_CONCURRENT_CONVERSATIONS = int(
+    environ.get("WEEKLY_ANALYSIS_MAX_CONCURRENT_CONVERSATIONS", 2)
+)
+WEEKLY_ANALYSIS_MAX_CONCURRENT_CUSTOMERS = int(
+    environ.get("WEEKLY_ANALYSIS_MAX_CONCURRENT_CUSTOMERS", 4)
+)
+WEEKLY_ANALYSIS_MAX_CONCURRENT_GOOGLE_ADS_CALLS = int(
+    environ.get("WEEKLY_ANALYSIS_MAX_CONCURRENT_GOOGLE_ADS_CALLS", 4)
+)
+_conversations_semaphore = threading.BoundedSemaphore(
+    WEEKLY_ANALYSIS_MAX_CONCURRENT_CONVERSATIONS
+)
+_google_ads_calls_semaphore = threading.BoundedSemaphore(
+    WEEKLY_ANALYSIS_MAX_CONCURRENT_GOOGLE_ADS_CALLS
+)
+
 
 class Metrics(BaseModel):
     impressions: int
@@ -45,6 +101,12 @@ class Metrics(BaseModel):
     interactions_increase: Optional[float] = None
     conversions_increase: Optional[float] = None
     cost_micros_increase: Optional[float] = None
+    # LAST week values, set when the metrics are compared
+    last_impressions: Optional[int] = None
+    last_clicks: Optional[int] = None
+    last_interactions: Optional[int] = None
+    last_conversions: Optional[int] = None
+    last_cost_micros: Optional[int] = None
 
 
 class KeywordMetrics(Metrics):
@@ -94,10 +156,41 @@ class WeeklyReport(BaseModel):
     weekly_customer_reports: List[WeeklyCustomerReports]
 
 
+# The LAST week values are used only to find the anomalies, they are not sent to the LLM
+_EXCLUDE_LAST_WEEK_METRICS: Dict[str, Any] = {
+    "metrics": {field for field in Metrics.model_fields if field.startswith("last_")}
+}
+_EXCLUDE_LAST_WEEK_METRICS_FROM_REPORT: Dict[str, Any] = {
+    "weekly_customer_reports": {
+        "__all__": {
+            "campaigns": {
+                "__all__": {
+                    **_EXCLUDE_LAST_WEEK_METRICS,
+                    "ad_groups": {
+                        "__all__": {
+                            **_EXCLUDE_LAST_WEEK_METRICS,
+                            "keywords": {"__all__": _EXCLUDE_LAST_WEEK_METRICS},
+                            "ad_group_ads": {"__all__": _EXCLUDE_LAST_WEEK_METRICS},
+                        }
+                    },
+                }
+            }
+        }
+    }
+}
+
+
+def _dump_weekly_report_without_last_week_metrics(weekly_reports: str) -> str:
+    weekly_report = WeeklyReport.model_validate_json(weekly_reports)
+    return weekly_report.model_dump_json(
+        indent=2, exclude=_EXCLUDE_LAST_WEEK_METRICS_FROM_REPORT
+    )
+
+
 def calculate_metrics_change(metrics1: Metrics, metrics2: Metrics) -> Metrics:
     return_metrics = {}
     for key, value in metrics1.__dict__.items():
-        if key.endswith("_increase") or value is None:
+        if key.endswith("_increase") or key.startswith("last_") or value is None:
             continue
 
         return_metrics[key] = value
@@ -105,6 +198,8 @@ def calculate_metrics_change(metrics1: Metrics, metrics2: Metrics) -> Metrics:
             continue
 
         value2 = getattr(metrics2, key)
+        if f"last_{key}" in Metrics.model_fields:
+            return_metrics[f"last_{key}"] = value2
         if value == value2:
             return_metrics[key + "_increase"] = 0
         elif value == 0 or value2 == 0 or value2 is None:
@@ -120,7 +215,11 @@ def calculate_metrics_change(metrics1: Metrics, metrics2: Metrics) -> Metrics:
     return Metrics(**return_metrics)
 
 
-@retry(stop=stop_after_attempt(3))
+@retry(
+    stop=stop_after_attempt(3) | stop_when_retry_budget_exhausted(),
+    retry=retry_if_not_exception_type(CircuitOpenError),
+    after=consume_retry_budget,
+)
 def google_ads_api_call(
     function: Union[
         Callable[[int, int, bool], Union[List[str], Dict[str, str]]],
@@ -131,124 +230,195 @@ def google_ads_api_call(
     ],
     **kwargs: Any,
 ) -> Any:
-    return function(**kwargs)  # type: ignore
+    with _google_ads_calls_semaphore:
+        return call_with_circuit_breaker(function, **kwargs)
 
 
-def get_weekly_keywords_report(
-    user_id: int, conv_id: int, customer_id: str, date_query: str
-) -> Dict[str, Dict[str, Keyword]]:
-    query = (
-        "SELECT ad_group.id, ad_group_criterion.criterion_id, ad_group_criterion.keyword.text, ad_group_criterion.keyword.match_type, metrics.impressions, metrics.clicks, metrics.interactions, metrics.conversions, metrics.cost_micros, "
-        "metrics.historical_quality_score, metrics.historical_landing_page_quality_score, metrics.historical_creative_quality_score "
-        "FROM keyword_view "
-        f"WHERE {date_query} AND campaign.status != 'REMOVED' AND ad_group.status != 'REMOVED' AND ad_group_criterion.status != 'REMOVED' "  # nosec: [B608]
-    )
+def _run_concurrently(
+    calls: Dict[str, Callable[[], Any]], max_workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """Run independent calls in threads and return their results by name.
+
+    The calls are run in a copy of the current context so they use the same IOStream.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers or len(calls)) as executor:
+        futures = {
+            name: executor.submit(contextvars.copy_context().run, call)
+            for name, call in calls.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+TWO_WEEKS_METRICS_FIELDS = "segments.date, metrics.impressions, metrics.clicks, metrics.interactions, metrics.conversions, metrics.cost_micros"
+# The attributes are stored with the daily rows too, but the current attributes are queried
+# live (see RESOURCE_ATTRIBUTES_QUERIES)
+TWO_WEEKS_REPORT_QUERIES = {
+    "campaign": "SELECT campaign.id, campaign.name, "
+    + TWO_WEEKS_METRICS_FIELDS
+    + " FROM campaign WHERE {date_query} AND campaign.status != 'REMOVED'",
+    "ad_group": "SELECT campaign.id, ad_group.id, ad_group.name, "
+    + TWO_WEEKS_METRICS_FIELDS
+    + " FROM ad_group WHERE {date_query} AND campaign.status != 'REMOVED' AND ad_group.status != 'REMOVED'",
+    "keyword_view": "SELECT ad_group.id, ad_group_criterion.criterion_id, ad_group_criterion.keyword.text, ad_group_criterion.keyword.match_type, "
+    + TWO_WEEKS_METRICS_FIELDS
+    + ", metrics.historical_quality_score, metrics.historical_landing_page_quality_score, metrics.historical_creative_quality_score"
+    + " FROM keyword_view WHERE {date_query} AND campaign.status != 'REMOVED' AND ad_group.status != 'REMOVED' AND ad_group_criterion.status != 'REMOVED'",
+    "ad_group_ad": "SELECT ad_group.id, ad_group_ad.ad.id, ad_group_ad.ad.final_urls, "
+    + TWO_WEEKS_METRICS_FIELDS
+    + " FROM ad_group_ad WHERE {date_query} AND ad_group.status != 'REMOVED' AND ad_group_ad.status != 'REMOVED'",
+}
+METRIC_FIELDS = {
+    "impressions": "metrics.impressions",
+    "clicks": "metrics.clicks",
+    "interactions": "metrics.interactions",
+    "conversions": "metrics.conversions",
+    "cost_micros": "metrics.costMicros",
+}
+# Segmented queries don't return the resources without activity. The unsegmented queries list
+# the current attributes of all campaigns and ad groups (with the currency of the customer),
+# keywords and ads, so the resources without activity are included in the report with zero metrics.
+RESOURCE_ATTRIBUTES_QUERIES = {
+    "ad_group": "SELECT customer.currency_code, campaign.id, campaign.name, ad_group.id, ad_group.name "
+    "FROM ad_group WHERE campaign.status != 'REMOVED' AND ad_group.status != 'REMOVED'",
+    "keyword_view": "SELECT ad_group.id, ad_group_criterion.criterion_id, ad_group_criterion.keyword.text, ad_group_criterion.keyword.match_type, ad_group_criterion.status "
+    "FROM ad_group_criterion WHERE ad_group_criterion.type = 'KEYWORD' AND ad_group_criterion.negative = FALSE "
+    "AND campaign.status != 'REMOVED' AND ad_group.status != 'REMOVED' AND ad_group_criterion.status != 'REMOVED'",
+    "ad_group_ad": "SELECT ad_group.id, ad_group_ad.ad.id, ad_group_ad.ad.final_urls, ad_group_ad.status "
+    "FROM ad_group_ad WHERE campaign.status != 'REMOVED' AND ad_group.status != 'REMOVED' AND ad_group_ad.status != 'REMOVED'",
+}
+KEYWORD_QUALITY_SCORE_FIELDS = {
+    "historical_quality_score": "metrics.historicalQualityScore",
+    "historical_landing_page_quality_score": "metrics.historicalLandingPageQualityScore",
+    "historical_creative_quality_score": "metrics.historicalCreativeQualityScore",
+}
+
+
+DAILY_METRICS_SETTLE_DAYS = int(environ.get("DAILY_METRICS_SETTLE_DAYS", 3))
+# The report needs the last two weeks, older days are deleted at the start of each run
+DAILY_METRICS_RETENTION_DAYS = max(
+    int(environ.get("DAILY_METRICS_RETENTION_DAYS", 28)), 14
+)
+
+
+def _create_date_range_query(start_date: str, end_date: str) -> str:
+    return f"segments.date BETWEEN '{start_date}' AND '{end_date}'"
+
+
+def _execute_daily_metrics_query(
+    user_id: int,
+    conv_id: int,
+    customer_id: str,
+    start_date: str,
+    end_date: str,
+    query: str,
+) -> List[Dict[str, Any]]:
     query_result = google_ads_api_call(
         function=execute_query,
         user_id=user_id,
         conv_id=conv_id,
         customer_ids=[customer_id],
-        query=query,
+        query=query.format(date_query=_create_date_range_query(start_date, end_date)),
     )
+    return ast.literal_eval(query_result)[customer_id]  # type: ignore[no-any-return]
 
-    customer_results = ast.literal_eval(query_result)[customer_id]
 
-    ad_group_keywords_dict: Dict[str, Dict[str, Keyword]] = defaultdict(dict)
-    for customer_result in customer_results:
-        historical_quality_score = (
-            customer_result["metrics"]["historicalQualityScore"]
-            if "historicalQualityScore" in customer_result["metrics"]
-            else None
-        )
-        historical_landing_page_quality_score = (
-            customer_result["metrics"]["historicalLandingPageQualityScore"]
-            if "historicalLandingPageQualityScore" in customer_result["metrics"]
-            else None
-        )
-        historical_creative_quality_score = (
-            customer_result["metrics"]["historicalCreativeQualityScore"]
-            if "historicalCreativeQualityScore" in customer_result["metrics"]
-            else None
+def _load_daily_metrics(
+    customer_id: str, start_date: str, end_date: str
+) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    try:
+        return asyncio.run(
+            get_daily_metrics(
+                customer_id,
+                start_date,
+                end_date,
+                settle_days=DAILY_METRICS_SETTLE_DAYS,
+            )
         )
+    except Exception as e:
+        # The store only saves Google Ads API calls, all days will be fetched instead
+        print(f"Failed to load daily metrics for customer {customer_id}: {e}")
+        return {}
 
-        keyword = Keyword(
-            id=customer_result["adGroupCriterion"]["criterionId"],
-            text=customer_result["adGroupCriterion"]["keyword"]["text"],
-            match_type=customer_result["adGroupCriterion"]["keyword"]["matchType"],
-            metrics=KeywordMetrics(
-                impressions=customer_result["metrics"]["impressions"],
-                clicks=customer_result["metrics"]["clicks"],
-                interactions=customer_result["metrics"]["interactions"],
-                conversions=customer_result["metrics"]["conversions"],
-                cost_micros=customer_result["metrics"]["costMicros"],
-                historical_quality_score=historical_quality_score,
-                historical_landing_page_quality_score=historical_landing_page_quality_score,
-                historical_creative_quality_score=historical_creative_quality_score,
-            ),
-        )
 
-        ad_group_keywords_dict[customer_result["adGroup"]["id"]][keyword.id] = keyword
+def _save_daily_metrics(
+    customer_id: str, rows: Dict[str, Dict[str, List[Dict[str, Any]]]]
+) -> None:
+    try:
+        asyncio.run(save_daily_metrics(customer_id, rows))
+    except Exception as e:
+        print(f"Failed to save daily metrics for customer {customer_id}: {e}")
 
-    return ad_group_keywords_dict
 
+def _prune_daily_metrics(date: str) -> None:
+    before = (
+        datetime.strptime(date, "%Y-%m-%d").date()
+        - timedelta(DAILY_METRICS_RETENTION_DAYS - 1)
+    ).isoformat()
+    try:
+        count = asyncio.run(delete_daily_metrics(before))
+        print(f"Deleted {count} daily metrics rows before {before}")
+    except Exception as e:
+        print(f"Failed to delete daily metrics before {before}: {e}")
 
-def get_ad_groups_report(
-    user_id: int, conv_id: int, customer_id: str, date_query: str
-) -> Dict[str, Dict[str, AdGroup]]:
-    query = (
-        "SELECT campaign.id, ad_group.id, ad_group.name, metrics.impressions, metrics.clicks, metrics.interactions, metrics.conversions, metrics.cost_micros "
-        "FROM ad_group "
-        f"WHERE {date_query} AND campaign.status != 'REMOVED' AND ad_group.status != 'REMOVED'"  # nosec: [B608]
-    )
-    query_result = google_ads_api_call(
-        function=execute_query,
-        user_id=user_id,
-        conv_id=conv_id,
-        customer_ids=[customer_id],
-        query=query,
-    )
-    customer_result = ast.literal_eval(query_result)[customer_id]
 
-    keywords_report = get_weekly_keywords_report(
-        user_id, conv_id, customer_id, date_query=date_query
-    )
-    ad_group_ads_report = get_weekly_ad_group_ads_report(
-        user_id=user_id, conv_id=conv_id, customer_id=customer_id, date_query=date_query
-    )
-    campaign_ad_groups_dict: Dict[str, Dict[str, AdGroup]] = defaultdict(dict)
-
-    for ad_group_result in customer_result:
-        ad_group_id = ad_group_result["adGroup"]["id"]
-        keywords = keywords_report.get(ad_group_id, {})
-        ad_group_ads = ad_group_ads_report.get(ad_group_id, {})
-        ad_group = AdGroup(
-            id=ad_group_result["adGroup"]["id"],
-            name=ad_group_result["adGroup"]["name"],
-            metrics=Metrics(
-                impressions=ad_group_result["metrics"]["impressions"],
-                clicks=ad_group_result["metrics"]["clicks"],
-                interactions=ad_group_result["metrics"]["interactions"],
-                conversions=ad_group_result["metrics"]["conversions"],
-                cost_micros=ad_group_result["metrics"]["costMicros"],
-            ),
-            keywords=keywords,
-            ad_group_ads=ad_group_ads,
+def get_two_weeks_daily_rows(
+    user_id: int, conv_id: int, customer_id: str, date: str
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Get the daily rows of the last two weeks for every resource level.
+
+    The rows are read from the daily metrics store and only the missing days are fetched
+    from Google Ads API (one query per resource level) and stored for the next runs.
+    """
+    end_date = datetime.strptime(date, "%Y-%m-%d").date()
+    days = [(end_date - timedelta(i)).isoformat() for i in range(13, -1, -1)]
+    stored = _load_daily_metrics(customer_id, days[0], days[-1])
+
+    missing_days = [
+        day
+        for day in days
+        if any(
+            day not in stored.get(resource, {}) for resource in TWO_WEEKS_REPORT_QUERIES
         )
-        campaign_ad_groups_dict[ad_group_result["campaign"]["id"]][ad_group.id] = (
-            ad_group
+    ]
+    if missing_days:
+        fetched_days = days[
+            days.index(missing_days[0]) : days.index(missing_days[-1]) + 1
+        ]
+        fetched = _run_concurrently(
+            {
+                resource: partial(
+                    _execute_daily_metrics_query,
+                    user_id,
+                    conv_id,
+                    customer_id,
+                    fetched_days[0],
+                    fetched_days[-1],
+                    query,
+                )
+                for resource, query in TWO_WEEKS_REPORT_QUERIES.items()
+            }
         )
-
-    return campaign_ad_groups_dict
+        fetched_rows: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        for resource, resource_rows in fetched.items():
+            # Days without any activity are stored too (with no rows)
+            rows_by_date: Dict[str, List[Dict[str, Any]]] = {
+                day: [] for day in fetched_days
+            }
+            for row in resource_rows:
+                rows_by_date.setdefault(row["segments"]["date"], []).append(row)
+            fetched_rows[resource] = rows_by_date
+            stored.setdefault(resource, {}).update(rows_by_date)
+        _save_daily_metrics(customer_id, fetched_rows)
+
+    return {
+        resource: [row for day in days for row in stored.get(resource, {}).get(day, [])]
+        for resource in TWO_WEEKS_REPORT_QUERIES
+    }
 
 
-def get_campaigns_report(
-    user_id: int, conv_id: int, customer_id: str, date_query: str
-) -> Dict[str, Campaign]:
-    query = (
-        "SELECT campaign.id, campaign.name, metrics.impressions, metrics.clicks, metrics.interactions, metrics.conversions, metrics.cost_micros "
-        "FROM campaign "
-        f"WHERE {date_query} AND campaign.status != 'REMOVED'"  # nosec: [B608]
-    )
+def _execute_attributes_query(
+    user_id: int, conv_id: int, customer_id: str, query: str
+) -> List[Dict[str, Any]]:
     query_result = google_ads_api_call(
         function=execute_query,
         user_id=user_id,
@@ -256,143 +426,263 @@ def get_campaigns_report(
         customer_ids=[customer_id],
         query=query,
     )
-    customer_result = ast.literal_eval(query_result)[customer_id]
-    campaigns: Dict[str, Campaign] = {}
-    if not customer_result:
-        return campaigns
-
-    ad_groups_report = get_ad_groups_report(user_id, conv_id, customer_id, date_query)
-    for campaign_result in customer_result:
-        ad_groups = ad_groups_report.get(campaign_result["campaign"]["id"], {})
-        campaign = Campaign(
-            id=campaign_result["campaign"]["id"],
-            name=campaign_result["campaign"]["name"],
-            metrics=Metrics(
-                impressions=campaign_result["metrics"]["impressions"],
-                clicks=campaign_result["metrics"]["clicks"],
-                interactions=campaign_result["metrics"]["interactions"],
-                conversions=campaign_result["metrics"]["conversions"],
-                cost_micros=campaign_result["metrics"]["costMicros"],
-            ),
-            ad_groups=ad_groups,
-        )
+    return ast.literal_eval(query_result)[customer_id]  # type: ignore[no-any-return]
 
-        campaigns[campaign.id] = campaign
 
-    return campaigns
+def get_resources_attributes(
+    user_id: int, conv_id: int, customer_id: str
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Get the current attributes of the (not removed) resources of the customer by resource level.
+
+    The rows of the ad groups include the campaigns and the currency of the customer.
+    """
+    return _run_concurrently(
+        {
+            resource: partial(
+                _execute_attributes_query, user_id, conv_id, customer_id, query
+            )
+            for resource, query in RESOURCE_ATTRIBUTES_QUERIES.items()
+        }
+    )
 
 
-def get_weekly_ad_group_ads_report(
-    user_id: int, conv_id: int, customer_id: str, date_query: str
-) -> Dict[str, Dict[str, AdGroupAd]]:
-    query = (
-        "SELECT ad_group.id, ad_group_ad.ad.id, ad_group_ad.ad.final_urls, metrics.impressions, metrics.clicks, metrics.interactions, metrics.conversions, metrics.cost_micros "
-        "FROM ad_group_ad "
-        f"WHERE {date_query} AND ad_group.status != 'REMOVED' AND ad_group_ad.status != 'REMOVED'"  # nosec: [B608]
+def _to_weekly_frame(
+    rows: List[Dict[str, Any]],
+    date: str,
+    keys: Dict[str, str],
+    attributes: Dict[str, str],
+    resource_rows: Optional[List[Dict[str, Any]]] = None,
+    with_quality_scores: bool = False,
+    listed_only: bool = False,
+) -> pd.DataFrame:
+    """Aggregate the daily rows into one row per resource.
+
+    The returned frame has a row for every resource in 'resource_rows' (in the same order)
+    followed by the other resources with activity (unless 'listed_only' is set), with the
+    resource keys and attributes, THIS week metrics and LAST week metrics (prefixed with
+    'last_'). The attributes in 'resource_rows' are preferred, otherwise they are taken from
+    the latest daily row of the resource. Resources without activity in one of the weeks get
+    zero metrics for that week.
+    """
+    if not resource_rows and (listed_only or not rows):
+        return pd.DataFrame()
+
+    key_columns = list(keys)
+    columns = {path: column for column, path in {**keys, **attributes}.items()}
+    df = (
+        pd.json_normalize(rows).rename(columns=columns)
+        if rows
+        else pd.DataFrame(columns=[*key_columns, *attributes, "segments.date"])
     )
-    query_result = google_ads_api_call(
-        function=execute_query,
-        user_id=user_id,
-        conv_id=conv_id,
-        customer_ids=[customer_id],
-        query=query,
+    df = df.sort_values("segments.date", kind="stable")
+    # Attributes without values are omitted from the response (e.g. ads without final urls)
+    resources = (
+        df.reindex(columns=[*key_columns, *attributes])
+        .groupby(key_columns, sort=False)[list(attributes)]
+        .last()
     )
-    customer_result = ast.literal_eval(query_result)[customer_id]
-
-    ad_group_ads_dict: Dict[str, Dict[str, AdGroupAd]] = defaultdict(dict)
-    for ad_group_ad_result in customer_result:
-        ad_group_ad = AdGroupAd(
-            id=ad_group_ad_result["adGroupAd"]["ad"]["id"],
-            final_urls=ad_group_ad_result["adGroupAd"]["ad"]["finalUrls"],
-            metrics=Metrics(
-                impressions=ad_group_ad_result["metrics"]["impressions"],
-                clicks=ad_group_ad_result["metrics"]["clicks"],
-                interactions=ad_group_ad_result["metrics"]["interactions"],
-                conversions=ad_group_ad_result["metrics"]["conversions"],
-                cost_micros=ad_group_ad_result["metrics"]["costMicros"],
-            ),
+    if resource_rows:
+        listed_resources = (
+            pd.json_normalize(resource_rows)
+            .rename(columns=columns)
+            .drop_duplicates(key_columns)
+            .set_index(key_columns)
+            .reindex(columns=list(attributes))
         )
-        ad_group_ads_dict[ad_group_ad_result["adGroup"]["id"]][ad_group_ad.id] = (
-            ad_group_ad
+        resources = (
+            listed_resources
+            if listed_only
+            else pd.concat(
+                [
+                    listed_resources,
+                    resources[~resources.index.isin(listed_resources.index)],
+                ]
+            )
         )
 
-    return ad_group_ads_dict
-
-
-def _calculate_update_metrics(
-    resource_id: str,
-    report: Union[ResourceWithMetrics, ResourceWithKeywordMetrics],
-    report_yesterday: Dict[str, Union[ResourceWithMetrics, ResourceWithKeywordMetrics]],
-) -> None:
-    if resource_id not in report_yesterday:
-        return
-    report.metrics = calculate_metrics_change(
-        report.metrics, report_yesterday[resource_id].metrics
+    this_week_start = (
+        datetime.strptime(date, "%Y-%m-%d").date() - timedelta(6)
+    ).isoformat()
+    is_this_week = df["segments.date"] >= this_week_start
+    for column, path in METRIC_FIELDS.items():
+        # Zero metrics are omitted from the response
+        values = pd.to_numeric(df.get(path, pd.Series(0, index=df.index))).fillna(0)
+        df[column] = values if column == "conversions" else values.astype("int64")
+    if with_quality_scores:
+        for column, path in KEYWORD_QUALITY_SCORE_FIELDS.items():
+            df[column] = df[path] if path in df else None
+        df["historical_quality_score"] = pd.to_numeric(df["historical_quality_score"])
+
+    frame = resources
+    for week_rows, prefix in ((df[is_this_week], ""), (df[~is_this_week], "last_")):
+        grouped = week_rows.groupby(key_columns, sort=False)
+        metrics = (
+            grouped[list(METRIC_FIELDS)].sum().reindex(resources.index, fill_value=0)
+        )
+        if with_quality_scores:
+            # Quality scores are not additive, the value for the whole week is the latest one
+            metrics = metrics.join(
+                grouped[list(KEYWORD_QUALITY_SCORE_FIELDS)]
+                .last()
+                .reindex(resources.index)
+            )
+        frame = frame.join(metrics.add_prefix(prefix))
+
+    # conversions are floats, rounding removes the summation error
+    frame[["conversions", "last_conversions"]] = frame[
+        ["conversions", "last_conversions"]
+    ].round(6)
+    return frame.reset_index()
+
+
+def compare_weekly_metrics(frame: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """Add '<column>_increase' columns comparing THIS week with LAST week ('last_<column>').
+
+    Vectorised version of 'calculate_metrics_change': the increase is 0 if the values are equal,
+    missing if any of the values is 0 or missing and the percentage change otherwise.
+    """
+    this_week = frame[columns].astype(float)
+    last_week = frame[[f"last_{column}" for column in columns]].astype(float)
+    last_week.columns = pd.Index(columns)
+
+    increase = (this_week - last_week) / last_week * 100
+    increase = increase.mask((this_week == 0) | (last_week == 0) | last_week.isna())
+    increase = increase.mask(this_week == last_week, 0.0)
+    increase = increase.mask(this_week.isna())
+    return frame.join(increase.add_suffix("_increase"))
+
+
+def _to_records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    if frame.empty:
+        return []
+    # NaN values (missing quality scores and increases) are converted to None
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")  # type: ignore[no-any-return]
+
+
+def _create_metrics(
+    record: Dict[str, Any],
+    compared_columns: List[str],
+    other_columns: Tuple[str, ...] = (),
+) -> Dict[str, Any]:
+    metrics = {column: record[column] for column in (*compared_columns, *other_columns)}
+    for column in compared_columns:
+        increase = record[f"{column}_increase"]
+        metrics[f"{column}_increase"] = None if increase is None else round(increase, 2)
+    for column in METRIC_FIELDS:
+        metrics[f"last_{column}"] = record[f"last_{column}"]
+    return metrics
+
+
+def create_compared_campaigns_report(
+    rows: Dict[str, List[Dict[str, Any]]],
+    resource_rows: Dict[str, List[Dict[str, Any]]],
+    date: str,
+) -> Dict[str, Campaign]:
+    """Create the campaigns report with THIS week metrics compared to LAST week.
+
+    The daily rows of both weeks (see 'get_two_weeks_daily_rows') are aggregated and
+    compared in pandas, the Pydantic models are created only at the end. Google Ads API
+    doesn't return zero-metric rows for segmented queries, so the resources are listed by
+    'get_resources_attributes' with their current attributes and the ones without activity
+    get zero metrics. Removed ad groups, keywords and ads are left out even if they had
+    activity.
+    """
+    metric_columns = list(METRIC_FIELDS)
+    keyword_metric_columns = metric_columns + ["historical_quality_score"]
+    keyword_score_columns = (
+        "historical_landing_page_quality_score",
+        "historical_creative_quality_score",
     )
 
+    campaigns = _to_weekly_frame(
+        rows["campaign"],
+        date,
+        keys={"campaign_id": "campaign.id"},
+        attributes={"name": "campaign.name"},
+        resource_rows=resource_rows.get("ad_group"),
+    )
+    ad_groups = _to_weekly_frame(
+        rows["ad_group"],
+        date,
+        keys={"campaign_id": "campaign.id", "ad_group_id": "adGroup.id"},
+        attributes={"name": "adGroup.name"},
+        resource_rows=resource_rows.get("ad_group"),
+        listed_only=True,
+    )
+    keywords = _to_weekly_frame(
+        rows["keyword_view"],
+        date,
+        keys={
+            "ad_group_id": "adGroup.id",
+            "keyword_id": "adGroupCriterion.criterionId",
+        },
+        attributes={
+            "text": "adGroupCriterion.keyword.text",
+            "match_type": "adGroupCriterion.keyword.matchType",
+        },
+        resource_rows=resource_rows.get("keyword_view"),
+        with_quality_scores=True,
+        listed_only=True,
+    )
+    ad_group_ads = _to_weekly_frame(
+        rows["ad_group_ad"],
+        date,
+        keys={"ad_group_id": "adGroup.id", "ad_group_ad_id": "adGroupAd.ad.id"},
+        attributes={"final_urls": "adGroupAd.ad.finalUrls"},
+        resource_rows=resource_rows.get("ad_group_ad"),
+        listed_only=True,
+    )
 
-def compare_reports(
-    report: Dict[str, Campaign],
-    report_yesterday: Dict[str, Campaign],
-) -> Dict[str, Campaign]:
-    for campaign_id, campaign in report.items():
-        _calculate_update_metrics(campaign_id, campaign, report_yesterday)  # type: ignore
-        for ad_group_id, ad_group in campaign.ad_groups.items():
-            _calculate_update_metrics(
-                ad_group_id,
-                ad_group,
-                report_yesterday[campaign_id].ad_groups,  # type: ignore
+    ad_group_keywords: Dict[str, Dict[str, Keyword]] = defaultdict(dict)
+    ad_group_ads_dict: Dict[str, Dict[str, AdGroupAd]] = defaultdict(dict)
+    campaign_ad_groups: Dict[str, Dict[str, AdGroup]] = defaultdict(dict)
+    if not keywords.empty:
+        for record in _to_records(
+            compare_weekly_metrics(keywords, keyword_metric_columns)
+        ):
+            ad_group_keywords[record["ad_group_id"]][record["keyword_id"]] = Keyword(
+                id=record["keyword_id"],
+                text=record["text"],
+                match_type=record["match_type"],
+                metrics=KeywordMetrics(
+                    **_create_metrics(
+                        record, keyword_metric_columns, keyword_score_columns
+                    )
+                ),
             )
-            for keyword_id, keyword in ad_group.keywords.items():
-                _calculate_update_metrics(
-                    keyword_id,
-                    keyword,
-                    report_yesterday[campaign_id].ad_groups[ad_group_id].keywords,  # type: ignore
+    if not ad_group_ads.empty:
+        for record in _to_records(compare_weekly_metrics(ad_group_ads, metric_columns)):
+            ad_group_ads_dict[record["ad_group_id"]][record["ad_group_ad_id"]] = (
+                AdGroupAd(
+                    id=record["ad_group_ad_id"],
+                    final_urls=record["final_urls"] or [],
+                    metrics=Metrics(**_create_metrics(record, metric_columns)),
                 )
-            for ad_group_ad_id, ad_group_ad in ad_group.ad_group_ads.items():
-                _calculate_update_metrics(
-                    ad_group_ad_id,
-                    ad_group_ad,
-                    report_yesterday[campaign_id].ad_groups[ad_group_id].ad_group_ads,  # type: ignore
-                )
-
-    return report
-
-
-def _create_date_query(date: str, week: Literal["THIS", "LAST"]) -> str:
-    datetime_date = datetime.strptime(date, "%Y-%m-%d").date()
-
-    if week == "THIS":
-        six_days_before = (datetime_date - timedelta(6)).isoformat()
-        query = f"segments.date BETWEEN '{six_days_before}' AND '{date}'"
-    elif week == "LAST":
-        seven_days_before = (datetime_date - timedelta(7)).isoformat()
-        thirteen_days_before = (datetime_date - timedelta(13)).isoformat()
-        query = (
-            f"segments.date BETWEEN '{thirteen_days_before}' AND '{seven_days_before}'"
+            )
+    if not ad_groups.empty:
+        for record in _to_records(compare_weekly_metrics(ad_groups, metric_columns)):
+            campaign_ad_groups[record["campaign_id"]][record["ad_group_id"]] = AdGroup(
+                id=record["ad_group_id"],
+                name=record["name"],
+                metrics=Metrics(**_create_metrics(record, metric_columns)),
+                keywords=ad_group_keywords.get(record["ad_group_id"], {}),
+                ad_group_ads=ad_group_ads_dict.get(record["ad_group_id"], {}),
+            )
+    if campaigns.empty:
+        return {}
+
+    return {
+        record["campaign_id"]: Campaign(
+            id=record["campaign_id"],
+            name=record["name"],
+            metrics=Metrics(**_create_metrics(record, metric_columns)),
+            ad_groups=campaign_ad_groups.get(record["campaign_id"], {}),
         )
-    else:
-        raise ValueError("Invalid week value. Must be 'THIS' or 'LAST'.")
-    return query
-
-
-def get_weekly_report_for_customer(
-    user_id: int, conv_id: int, customer_id: str, date: str
-) -> WeeklyCustomerReports:
-    this_week_query = _create_date_query(date, "THIS")
-    campaigns_report = get_campaigns_report(
-        user_id, conv_id, customer_id, this_week_query
-    )
-
-    last_week_query = _create_date_query(date, "LAST")
-    last_week_campaigns_report = get_campaigns_report(
-        user_id, conv_id, customer_id, last_week_query
-    )
+        for record in _to_records(compare_weekly_metrics(campaigns, metric_columns))
+    }
 
-    compared_campaigns_report = compare_reports(
-        campaigns_report, last_week_campaigns_report
-    )
 
+def get_customer_currency(user_id: int, conv_id: int, customer_id: str) -> str:
     query = "SELECT customer.currency_code FROM customer"
     query_result = google_ads_api_call(
         function=execute_query,
@@ -401,16 +691,54 @@ def get_weekly_report_for_customer(
         customer_ids=[customer_id],
         query=query,
     )
-    currency = ast.literal_eval(query_result)[customer_id][0]["customer"][
-        "currencyCode"
-    ]
+    return ast.literal_eval(query_result)[customer_id][0]["customer"]["currencyCode"]  # type: ignore[no-any-return]
+
+
+def get_weekly_report_for_customer(
+    user_id: int, conv_id: int, customer_id: str, date: str
+) -> WeeklyCustomerReports:
+    results = _run_concurrently(
+        {
+            "rows": partial(
+                get_two_weeks_daily_rows, user_id, conv_id, customer_id, date
+            ),
+            "resources": partial(
+                get_resources_attributes, user_id, conv_id, customer_id
+            ),
+        }
+    )
+    resource_rows = results["resources"]
+    # The currency is queried separately only for customers without any ad group
+    currency = (
+        resource_rows["ad_group"][0]["customer"]["currencyCode"]
+        if resource_rows["ad_group"]
+        else get_customer_currency(user_id, conv_id, customer_id)
+    )
     return WeeklyCustomerReports(
-        customer_id=customer_id, currency=currency, campaigns=compared_campaigns_report
+        customer_id=customer_id,
+        currency=currency,
+        campaigns=create_compared_campaigns_report(
+            results["rows"], resource_rows, date
+        ),
     )
 
 
 WARNING_DESCRIPTION = "Some final URLs for your Ads are not reachable:"
 
+# The status codes are cached for the whole weekly run, the cache is cleared at the start of each run
+FINAL_URLS_HEALTH_CHECKER = URLHealthChecker(
+    max_requests_per_host=int(environ.get("WEEKLY_ANALYSIS_MAX_REQUESTS_PER_HOST", 4))
+)
+
+
+def _get_final_urls(campaign: Dict[str, Any]) -> List[str]:
+    return [
+        final_url
+        for ad_group in campaign["ad_groups"].values()
+        for ad_group_ad in ad_group["ad_group_ads"].values()
+        for final_url in ad_group_ad["final_urls"]
+    ]
+
 
 def get_web_status_code_report_for_campaign(
     campaign: Dict[str, Any], customer_id: str
@@ -418,12 +746,13 @@ def get_web_status_code_report_for_campaign(
     warning_message = f"<li><strong>WARNING:</strong>{WARNING_DESCRIPTION}\n<ul>\n"
     warning_messages_list: List[str] = []
     send_warning_message_for_campaign = False
+    status_codes = FINAL_URLS_HEALTH_CHECKER.get_status_codes(_get_final_urls(campaign))
 
     for ad_group_id, ad_group in campaign["ad_groups"].items():
         for ad_group_ad_id, ad_group_ad in ad_group["ad_group_ads"].items():
             final_urls = ad_group_ad["final_urls"]
             for final_url in final_urls:
-                status_code = get_webpage_status_code(url=final_url)
+                status_code = status_codes[final_url]
                 if status_code is None or status_code < 200 or status_code >= 400:
                     send_warning_message_for_campaign = True
                     final_url_link = (
@@ -442,19 +771,136 @@ def get_web_status_code_report_for_campaign(
     )
 
 
+# Week over week change (in percent) of a metric which is analysed by the team
+WEEKLY_ANALYSIS_ANOMALY_THRESHOLD = float(
+    environ.get("WEEKLY_ANALYSIS_ANOMALY_THRESHOLD", 20)
+)
+# Changes of metrics below these values (e.g. 3 instead of 2 clicks) are not significant
+WEEKLY_ANALYSIS_MIN_SIGNIFICANT_VALUES: Dict[str, float] = {
+    "impressions": 100,
+    "clicks": 10,
+    "interactions": 10,
+    "conversions": 1,
+    "cost_micros": 1_000_000,
+}
+# Users without any anomaly get the weekly report email without the team analysis
+WEEKLY_ANALYSIS_SKIP_QUIET_ACCOUNTS = (
+    environ.get("WEEKLY_ANALYSIS_SKIP_QUIET_ACCOUNTS", "true").lower() == "true"
+)
+
+
+def _find_metrics_anomalies(
+    metrics: Dict[str, Any],
+    threshold: float,
+    min_significant_values: Dict[str, float],
+) -> List[str]:
+    anomalies: List[str] = []
+    for field, min_value in min_significant_values.items():
+        value = metrics.get(field)
+        if value is None or f"{field}_increase" not in metrics:
+            continue
+        increase = metrics[f"{field}_increase"]
+        last_value = metrics.get(f"last_{field}")
+        if increase is None:
+            # The metric changed from or to zero
+            if value == 0:
+                # Without the LAST week value the change can't be checked
+                if last_value is not None and last_value >= min_value:
+                    anomalies.append(f"{field} dropped from {last_value} to 0")
+            elif value >= min_value:
+                anomalies.append(f"{field} increased from 0 to {value}")
+            continue
+
+        if abs(increase) < threshold:
+            continue
+        if last_value is None:
+            last_value = value / (1 + increase / 100) if increase != -100 else 0
+        if max(value, last_value) >= min_value:
+            anomalies.append(f"{field} changed by {increase:+}% to {value}")
+
+    historical_quality_score_increase = metrics.get("historical_quality_score_increase")
+    if historical_quality_score_increase is not None and (
+        historical_quality_score_increase <= -threshold
+    ):
+        anomalies.append(
+            f"historical_quality_score changed by {historical_quality_score_increase:+}%"
+        )
+
+    return anomalies
+
+
+def find_weekly_report_anomalies(
+    weekly_reports: Dict[str, Any],
+    threshold: float = WEEKLY_ANALYSIS_ANOMALY_THRESHOLD,
+    min_significant_values: Optional[Dict[str, float]] = None,
+) -> List[str]:
+    """Find significant week over week changes and unreachable final URLs in the weekly report.
+
+    The check is deterministic and doesn't use the LLM, if nothing is found there is nothing
+    for the team to analyse.
+    """
+    if min_significant_values is None:
+        min_significant_values = WEEKLY_ANALYSIS_MIN_SIGNIFICANT_VALUES
+
+    campaigns_report = weekly_reports["weekly_customer_reports"]
+    status_codes = FINAL_URLS_HEALTH_CHECKER.get_status_codes(
+        final_url
+        for customer_report in campaigns_report
+        for campaign in customer_report["campaigns"].values()
+        for final_url in _get_final_urls(campaign)
+    )
+
+    anomalies: List[str] = []
+    for customer_report in campaigns_report:
+        customer_id = customer_report["customer_id"]
+        for campaign in customer_report["campaigns"].values():
+            resource = f"Customer {customer_id}, campaign '{campaign['name']}'"
+            resources_with_metrics = [(resource, campaign)]
+            for ad_group in campaign["ad_groups"].values():
+                ad_group_resource = f"{resource}, ad group '{ad_group['name']}'"
+                resources_with_metrics.append((ad_group_resource, ad_group))
+                resources_with_metrics.extend(
+                    (f"{ad_group_resource}, keyword '{keyword['text']}'", keyword)
+                    for keyword in ad_group["keywords"].values()
+                )
+                resources_with_metrics.extend(
+                    (f"{ad_group_resource}, ad {ad_group_ad['id']}", ad_group_ad)
+                    for ad_group_ad in ad_group["ad_group_ads"].values()
+                )
+
+            for name, resource_with_metrics in resources_with_metrics:
+                anomalies.extend(
+                    f"{name}: {anomaly}"
+                    for anomaly in _find_metrics_anomalies(
+                        resource_with_metrics["metrics"],
+                        threshold=threshold,
+                        min_significant_values=min_significant_values,
+                    )
+                )
+
+            for final_url in _get_final_urls(campaign):
+                status_code = status_codes[final_url]
+                if status_code is None or status_code < 200 or status_code >= 400:
+                    anomalies.append(
+                        f"{resource}: final url {final_url} is not reachable"
+                    )
+
+    return anomalies
+
+
 EMAIL_TEMPLATES_PATH = (
     Path(__file__).parent.parent.parent.parent.parent.absolute() / "templates" / "email"
 )
-with open(str(EMAIL_TEMPLATES_PATH / "main_email_template.html")) as file:
-    MAIN_EMAIL_TEMPLATE = file.read()
-with open(str(EMAIL_TEMPLATES_PATH / "customer_report_template.html")) as file:
-    CUSTOMER_REPORT_TEMPLATE = file.read()
-with open(str(EMAIL_TEMPLATES_PATH / "campaigns_template.html")) as file:
-    CAMPAIGNS_TEMPLATE = file.read()
-with open(str(EMAIL_TEMPLATES_PATH / "campaign_warning_template.html")) as file:
-    CAMPAIGN_WARNING_TEMPLATE = file.read()
-with open(str(EMAIL_TEMPLATES_PATH / "proposed_action.html")) as file:
-    PROPOSED_ACTION_TEMPLATE = file.read()
+MAIN_EMAIL_TEMPLATE = load_template(EMAIL_TEMPLATES_PATH / "main_email_template.html")
+CUSTOMER_REPORT_TEMPLATE = load_template(
+    EMAIL_TEMPLATES_PATH / "customer_report_template.html"
+)
+CAMPAIGNS_TEMPLATE = load_template(EMAIL_TEMPLATES_PATH / "campaigns_template.html")
+CAMPAIGN_WARNING_TEMPLATE = load_template(
+    EMAIL_TEMPLATES_PATH / "campaign_warning_template.html"
+)
+PROPOSED_ACTION_TEMPLATE = load_template(EMAIL_TEMPLATES_PATH / "proposed_action.html")
+NO_ANOMALIES_TEMPLATE = load_template(EMAIL_TEMPLATES_PATH / "no_anomalies.html")
 
 
 def _add_metrics_message(
@@ -487,112 +933,93 @@ def _add_metrics_message(
     )
 
 
-def _update_message_and_campaigns_template(
-    title: str,
-    metrics: Dict[str, Optional[Union[int, float]]],
-    field: str,
-    message: str,
-    campaigns_template: str,
-    currency: str = "",
-) -> Tuple[str, str]:
-    message_for_metric, value_with_currency, is_increase = _add_metrics_message(
-        title=title, metrics=metrics, field=field, currency=currency
-    )
-    message += message_for_metric
-    campaigns_template = campaigns_template.replace(f"{{{field}}}", value_with_currency)
-    campaigns_template = campaigns_template.replace(
-        f"{{{field}_change_rate}}", is_increase
-    )
+def _get_campaign_metrics(
+    metrics: Dict[str, Optional[Union[int, float]]], currency: str
+) -> Tuple[str, Dict[str, str]]:
+    """Get the metrics message for the chat and the metrics values for the campaigns template."""
+    messages: List[str] = []
+    values: Dict[str, str] = {}
+    for title, field, field_currency in (
+        ("Clicks", "clicks", ""),
+        ("Conversions", "conversions", ""),
+        ("Cost", "cost_micros", currency),
+    ):
+        message_for_metric, value_with_currency, is_increase = _add_metrics_message(
+            title=title, metrics=metrics, field=field, currency=field_currency
+        )
+        messages.append(message_for_metric)
+        values[field] = value_with_currency
+        values[f"{field}_change_rate"] = is_increase
 
-    return message, campaigns_template
+    return "".join(messages), values
 
 
 def construct_weekly_report_email_from_template(
     weekly_reports: Dict[str, Any], date: str
 ) -> Tuple[str, str]:
-    main_email_template = MAIN_EMAIL_TEMPLATE
-    main_email_template = main_email_template.replace("{todays_date}", date)
-    customers_section = ""
-
-    message = f"<h2>Weekly Google Ads Performance Report - {date}</h2>"
-    message += "<p>We're here with your weekly analysis of your Google Ads campaigns. Below, you'll find insights into your campaign performances, along with notable updates and recommendations for optimization.</p>"
+    message_parts = [
+        f"<h2>Weekly Google Ads Performance Report - {date}</h2>",
+        "<p>We're here with your weekly analysis of your Google Ads campaigns. Below, you'll find insights into your campaign performances, along with notable updates and recommendations for optimization.</p>",
+    ]
+    customer_sections: List[str] = []
     campaigns_report = weekly_reports["weekly_customer_reports"]
+    # Check all final URLs of the report at once (concurrently)
+    FINAL_URLS_HEALTH_CHECKER.get_status_codes(
+        final_url
+        for customer_report in campaigns_report
+        for campaign in customer_report["campaigns"].values()
+        for final_url in _get_final_urls(campaign)
+    )
     for customer_report in campaigns_report:
-        customer_report_template = CUSTOMER_REPORT_TEMPLATE
-
         customer_id = customer_report["customer_id"]
-        customer_report_template = customer_report_template.replace(
-            "{customer_id}", customer_report["customer_id"]
-        )
         currency = customer_report["currency"]
-        message += f"<p>Customer <strong>{customer_id}</strong></p>"
-        message += "<ul>"
-
-        campaigns_section = ""
-        for _, campaign in customer_report["campaigns"].items():
-            campaigns_template = CAMPAIGNS_TEMPLATE
+        message_parts.append(f"<p>Customer <strong>{customer_id}</strong></p><ul>")
 
+        campaign_sections: List[str] = []
+        for campaign in customer_report["campaigns"].values():
             campaign_name = campaign["name"]
-            campaigns_template = campaigns_template.replace(
-                "{campaign_name}", campaign_name
-            )
-
             link_to_campaign = f"https://ads.google.com/aw/campaigns?campaignId={campaign['id']}&__e={customer_id}"
-            message += f"<li>Campaign <strong><a href='{link_to_campaign}' target='_blank'>{campaign_name}</a></strong>"
-            message += "<ul>"
-
-            update_list = [
-                ("Clicks", "clicks", ""),
-                ("Conversions", "conversions", ""),
-                ("Cost", "cost_micros", currency),
-            ]
-            for title, field, currency in update_list:
-                message, campaigns_template = _update_message_and_campaigns_template(
-                    title=title,
-                    metrics=campaign["metrics"],
-                    field=field,
-                    message=message,
-                    campaigns_template=campaigns_template,
-                    currency=currency,
-                )
+            metrics_message, metrics_values = _get_campaign_metrics(
+                metrics=campaign["metrics"], currency=currency
+            )
+            message_parts.append(
+                f"<li>Campaign <strong><a href='{link_to_campaign}' target='_blank'>{campaign_name}</a></strong><ul>{metrics_message}"
+            )
 
             (
                 warning_message,
                 warning_messages_list,
             ) = get_web_status_code_report_for_campaign(campaign, customer_id)
+            campaign_warnings = ""
             if warning_message:
-                campaign_warning_template = CAMPAIGN_WARNING_TEMPLATE
-                campaign_warning_template = campaign_warning_template.replace(
-                    "{warning_description}", WARNING_DESCRIPTION
+                message_parts.append(warning_message)
+                campaign_warnings = CAMPAIGN_WARNING_TEMPLATE.render(
+                    warning_description=WARNING_DESCRIPTION,
+                    warning_list="".join(warning_messages_list),
                 )
-                campaign_warning_template = campaign_warning_template.replace(
-                    "{warning_list}", "".join(warning_messages_list)
-                )
-                message += warning_message
 
-            if warning_message:
-                campaigns_template = campaigns_template.replace(
-                    "{campaign_warnings}", campaign_warning_template
+            campaign_sections.append(
+                CAMPAIGNS_TEMPLATE.render(
+                    campaign_name=campaign_name,
+                    campaign_warnings=campaign_warnings,
+                    **metrics_values,
                 )
-            else:
-                campaigns_template = campaigns_template.replace(
-                    "{campaign_warnings}", ""
-                )
-
-            campaigns_section += campaigns_template
-            message += "</ul></li>"
-        message += "</ul>"
+            )
+            message_parts.append("</ul></li>")
+        message_parts.append("</ul>")
 
-        customer_report_template = customer_report_template.replace(
-            "{campaigns}", campaigns_section
+        customer_sections.append(
+            CUSTOMER_REPORT_TEMPLATE.render(
+                customer_id=customer_id, campaigns="".join(campaign_sections)
+            )
         )
-        customers_section += customer_report_template
 
-    main_email_template = main_email_template.replace(
-        "{customers_report}", customers_section
+    # '{proposed_action}' is rendered after the team conversation
+    main_email_template = MAIN_EMAIL_TEMPLATE.render(
+        todays_date=date, customers_report="".join(customer_sections)
     )
 
-    return message, main_email_template
+    return "".join(message_parts), main_email_template
 
 
 def _check_if_any_campaign_exists(weekly_report: WeeklyReport) -> bool:
@@ -609,11 +1036,21 @@ def get_weekly_report(date: str, user_id: int, conv_id: int) -> Optional[str]:
         conv_id=conv_id,
         get_only_non_manager_accounts=True,
     )
+    customer_reports = _run_concurrently(
+        {
+            customer_id: partial(
+                get_weekly_report_for_customer,
+                user_id=user_id,
+                conv_id=conv_id,
+                customer_id=customer_id,
+                date=date,
+            )
+            for customer_id in customer_ids
+        },
+        max_workers=WEEKLY_ANALYSIS_MAX_CONCURRENT_CUSTOMERS,
+    )
     weekly_customer_reports = [
-        get_weekly_report_for_customer(
-            user_id=user_id, conv_id=conv_id, customer_id=customer_id, date=date
-        )
-        for customer_id in customer_ids
+        customer_reports[customer_id] for customer_id in customer_ids
     ]
     weekly_report = WeeklyReport(weekly_customer_reports=weekly_customer_reports)
 
@@ -862,20 +1299,20 @@ You can execute the provided queries ONLY by using the 'execute_query' command!
 def _create_final_html_message(
     main_email_template: str, proposed_user_action: List[str], conv_uuid: str
 ) -> str:
-    proposed_user_actions_section = ""
-    proposed_action_template = PROPOSED_ACTION_TEMPLATE
-
-    for i, action in enumerate(proposed_user_action):
-        proposed_user_actions_section += f"<li>{action} (<a href='{REDIRECT_DOMAIN}/chat/{conv_uuid}?selected_user_action={i+1}'>Link</a>)</li>"
-
-    proposed_action_template = proposed_action_template.replace(
-        "{proposed_actions_li_tags}", proposed_user_actions_section
-    )
-    main_email_template = main_email_template.replace(
-        "{proposed_action}", proposed_action_template
-    )
+    if proposed_user_action:
+        proposed_user_actions_section = "".join(
+            f"<li>{action} (<a href='{REDIRECT_DOMAIN}/chat/{conv_uuid}?selected_user_action={i+1}'>Link</a>)</li>"
+            for i, action in enumerate(proposed_user_action)
+        )
+        proposed_action = PROPOSED_ACTION_TEMPLATE.render(
+            proposed_actions_li_tags=proposed_user_actions_section
+        )
+    else:
+        proposed_action = NO_ANOMALIES_TEMPLATE.render(
+            chat_link=f"{REDIRECT_DOMAIN}/chat/{conv_uuid}"
+        )
 
-    return main_email_template
+    return main_email_template.replace("{proposed_action}", proposed_action)
 
 
 def _update_chat_message_and_send_email(
@@ -948,6 +1385,7 @@ def _delete_chat_webhook(user_id: int, conv_id: int) -> None:
 def _create_task_message(
     date: str, weekly_reports: str, weekly_report_message: str
 ) -> str:
+    weekly_reports = _dump_weekly_report_without_last_week_metrics(weekly_reports)
     task = f"""
 You need to perform Google Ads Analysis for date: {date}.
 
@@ -976,13 +1414,10 @@ WEEKLY_ANALYSIS_TEAM_CONVERSATION_SUCCESS_TOTAL = Counter(
 )
 
 
-def _validate_conversation_and_send_email(
-    weekly_analysis_team: WeeklyAnalysisTeam,
-    conv_uuid: str,
-    email: str,
-    weekly_report_message: str,
-    main_email_template: str,
-) -> None:
+def _get_team_result(
+    weekly_analysis_team: WeeklyAnalysisTeam, email: str
+) -> Dict[str, Any]:
+    """Get the messages for the chat and the proposed user actions from the finished conversation."""
     last_message = weekly_analysis_team.get_last_message(add_prefix=False)
 
     messages_list = weekly_analysis_team.get_messages()
@@ -997,23 +1432,56 @@ def _validate_conversation_and_send_email(
             # Don't include the first message (task) and the last message (send_email)
             messages = json.dumps(messages_list[1:-1])
         last_message_json = json.loads(last_message)
-        _update_chat_message_and_send_email(
-            user_id=weekly_analysis_team.user_id,
-            conv_id=weekly_analysis_team.conv_id,
-            conv_uuid=conv_uuid,
-            client_email=email,
-            messages=messages,
-            initial_message_in_chat=weekly_report_message,
-            main_email_template=main_email_template,
-            proposed_user_action=last_message_json["proposed_user_action"],
-        )
-        WEEKLY_ANALYSIS_TEAM_CONVERSATION_SUCCESS_TOTAL.inc()
+        return {
+            "messages": messages,
+            "proposed_user_action": last_message_json["proposed_user_action"],
+        }
     else:
         raise ValueError(
             f"Send email function is not called for user_id: {weekly_analysis_team.user_id} - email {email}!"
         )
 
 
+def _send_weekly_analysis_email(
+    user_id: int,
+    conv_id: int,
+    conv_uuid: str,
+    email: str,
+    weekly_report_message: str,
+    main_email_template: str,
+    team_result: Dict[str, Any],
+) -> None:
+    _update_chat_message_and_send_email(
+        user_id=user_id,
+        conv_id=conv_id,
+        conv_uuid=conv_uuid,
+        client_email=email,
+        messages=team_result["messages"],
+        initial_message_in_chat=weekly_report_message,
+        main_email_template=main_email_template,
+        proposed_user_action=team_result["proposed_user_action"],
+    )
+    WEEKLY_ANALYSIS_TEAM_CONVERSATION_SUCCESS_TOTAL.inc()
+
+
+def _validate_conversation_and_send_email(
+    weekly_analysis_team: WeeklyAnalysisTeam,
+    conv_uuid: str,
+    email: str,
+    weekly_report_message: str,
+    main_email_template: str,
+) -> None:
+    _send_weekly_analysis_email(
+        user_id=weekly_analysis_team.user_id,
+        conv_id=weekly_analysis_team.conv_id,
+        conv_uuid=conv_uuid,
+        email=email,
+        weekly_report_message=weekly_report_message,
+        main_email_template=main_email_template,
+        team_result=_get_team_result(weekly_analysis_team, email),
+    )
+
+
 WEEKLY_ANALYSIS_TEAM_CONVERSATIONS_TOTAL = Counter(
     "weekly_analysis_team_conversations_total",
     "Total count of executed weekly analysis (team conversation started)",
@@ -1030,6 +1498,11 @@ SKIPPED_USERS_TOTAL = Counter(
     "Total count of users that were skipped during weekly analysis",
 )
 
+QUIET_ACCOUNTS_TOTAL = Counter(
+    "weekly_analysis_quiet_accounts_total",
+    "Total count of users without anomalies who got the email without the team analysis",
+)
+
 
 def _get_day_of_week(date_str: str) -> str:
     # Parse the date string into a datetime object
@@ -1053,70 +1526,315 @@ def _get_day_of_week(date_str: str) -> str:
     return day_of_week_name
 
 
-def execute_weekly_analysis(
-    send_only_to_emails: Optional[List[str]] = None,
-    date: Optional[str] = None,
-) -> None:
-    iostream = IOConsole()
-    with IOStream.set_default(iostream):
-        if date is None:
-            date = (datetime.today().date() - timedelta(1)).isoformat()
-        print("Starting weekly analysis.")
-        if send_only_to_emails is not None:
-            day_of_week = None
-        else:
-            day_of_week = _get_day_of_week(date)
-        id_email_dict = json.loads(get_user_ids_and_emails(day_of_week=day_of_week))
+UserStatus = Literal["completed", "skipped", "failed"]
 
-        # if send_only_to_emails is None:
-        #     send_only_to_emails = ["robert@airt.ai", "harish@airt.ai"]
+WEEKLY_ANALYSIS_LEASE_TTL = int(environ.get("WEEKLY_ANALYSIS_LEASE_TTL", 3600))
+# The lease is renewed while the user is processed, so it expires only if the worker dies
+WEEKLY_ANALYSIS_LEASE_RENEW_INTERVAL = max(
+    int(
+        environ.get(
+            "WEEKLY_ANALYSIS_LEASE_RENEW_INTERVAL", WEEKLY_ANALYSIS_LEASE_TTL // 4
+        )
+    ),
+    1,
+)
+# The number of workers (on all nodes) running the weekly analysis and the index of this
+# worker, without the index it is derived from the worker id
+WEEKLY_ANALYSIS_NUM_WORKERS = int(environ.get("WEEKLY_ANALYSIS_NUM_WORKERS", 1))
+WEEKLY_ANALYSIS_WORKER_INDEX = environ.get("WEEKLY_ANALYSIS_WORKER_INDEX")
 
-        for user_id, email in id_email_dict.items():
-            if send_only_to_emails is not None and email not in send_only_to_emails:
-                SKIPPED_USERS_TOTAL.inc()
-                print(f"Skipping user_id: {user_id} - email {email}")
-                continue
 
+def _get_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _get_worker_index(worker_id: str, num_workers: int) -> int:
+    if WEEKLY_ANALYSIS_WORKER_INDEX is not None:
+        return int(WEEKLY_ANALYSIS_WORKER_INDEX) % num_workers
+    return zlib.crc32(worker_id.encode()) % num_workers
+
+
+def _order_user_ids_for_worker(
+    user_ids: List[str], worker_index: int, num_workers: int
+) -> List[str]:
+    """The users are assigned to the workers by 'user_id % num_workers'.
+
+    Each worker processes its own users first and then the users of the other workers, so
+    the users of a worker which is down or slow are still processed. The leases make sure
+    that every user is processed by only one worker.
+    """
+    user_ids = sorted(user_ids, key=int)
+    own_user_ids = [
+        user_id for user_id in user_ids if int(user_id) % num_workers == worker_index
+    ]
+    return own_user_ids + [
+        user_id for user_id in user_ids if int(user_id) % num_workers != worker_index
+    ]
+
+
+@contextmanager
+def _renew_lease_periodically(
+    date: str,
+    user_id: int,
+    worker_id: str,
+    interval: float = WEEKLY_ANALYSIS_LEASE_RENEW_INTERVAL,
+) -> Iterator[threading.Event]:
+    """Renew the lease every 'interval' seconds in a background thread until the block exits.
+
+    Waiting for a conversation slot or a long team conversation can take longer than the
+    lease TTL, without renewing another worker would take over the user. The yielded event
+    is set once the lease is lost (it was taken over or it couldn't be renewed within the
+    TTL), the user is then processed by another worker.
+    """
+    stop = threading.Event()
+    lost = threading.Event()
+
+    def _renew() -> None:
+        renewed_at = time.monotonic()
+        while not stop.wait(interval):
             try:
-                conv_id, conv_uuid = _get_conv_id_and_uuid(user_id=user_id, email=email)
-            except Exception as e:
-                print(
-                    f"Failed to create chat for user_id: {user_id} - email {email}.\nError: {e}"
-                )
-                traceback.print_stack()
-                traceback.print_exc()
-                WEEKLY_ANALYSIS_EXCEPTIONS_TOTAL.inc()
-                continue
-            weekly_analysis_team = None
-            try:
-                login_url_response = get_login_url(
-                    user_id=user_id, conv_id=conv_id
-                ).get("login_url")
-                if not login_url_response == ALREADY_AUTHENTICATED:
-                    # Do not proceed with Google Ads analysis for non authenticated users
-                    print(
-                        f"Skipping user_id: {user_id} - email {email} because he hasn't logged in yet."
+                renewed = asyncio.run(
+                    renew_weekly_analysis_lease(
+                        date=date,
+                        user_id=int(user_id),
+                        owner=worker_id,
+                        ttl=WEEKLY_ANALYSIS_LEASE_TTL,
                     )
-                    _delete_chat_webhook(user_id=user_id, conv_id=conv_id)
-                    SKIPPED_USERS_TOTAL.inc()
+                )
+            except Exception as e:
+                print(f"Failed to renew the lease for user_id: {user_id}.\nError: {e}")
+                if time.monotonic() - renewed_at < WEEKLY_ANALYSIS_LEASE_TTL:
                     continue
+                renewed = False
+            if not renewed:
+                print(f"Lost the lease for user_id: {user_id}")
+                lost.set()
+                return
+            renewed_at = time.monotonic()
+
+    thread = threading.Thread(target=_renew, daemon=True)
+    thread.start()
+    try:
+        yield lost
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _execute_weekly_analysis_for_user_with_lease(
+    user_id: int,
+    email: str,
+    date: str,
+    worker_id: str,
+    resume: bool = False,
+    force: bool = False,
+) -> UserStatus:
+    # Called from the thread pool, so the lease is acquired only once a worker slot is free
+    try:
+        acquired, taken_over = asyncio.run(
+            acquire_weekly_analysis_lease(
+                date=date,
+                user_id=int(user_id),
+                owner=worker_id,
+                ttl=WEEKLY_ANALYSIS_LEASE_TTL,
+            )
+        )
+    except Exception as e:
+        # Without the lease the user could get the email from multiple workers
+        print(f"Failed to acquire the lease for user_id: {user_id}.\nError: {e}")
+        return "failed"
+    if not acquired:
+        print(f"User_id: {user_id} is processed by another worker")
+        return "skipped"
+    if taken_over:
+        # The previous owner failed or was killed, possibly after sending the email. The
+        # finished users are skipped and the stages of the previous owner are not repeated.
+        print(f"Took over the lease for user_id: {user_id} from the previous owner")
+        resume = True
+
+    with _renew_lease_periodically(date, user_id, worker_id) as lease_lost:
+        status = _execute_weekly_analysis_for_user(
+            user_id=user_id,
+            email=email,
+            date=date,
+            resume=resume,
+            lease_lost=lease_lost,
+            force=force,
+        )
+    try:
+        asyncio.run(
+            release_weekly_analysis_lease(
+                date=date, user_id=int(user_id), owner=worker_id, status=status
+            )
+        )
+    except Exception as e:
+        print(f"Failed to release the lease for user_id: {user_id}.\nError: {e}")
+    return status
 
+
+def _is_lease_lost(lease_lost: Optional[threading.Event], user_id: int) -> bool:
+    if lease_lost is None or not lease_lost.is_set():
+        return False
+    # Another worker owns the user now, it would send the email too
+    print(f"Weekly analysis for user_id: {user_id} is aborted, the lease was lost")
+    SKIPPED_USERS_TOTAL.inc()
+    return True
+
+
+def _needs_team_analysis(user_id: int, weekly_reports: str) -> bool:
+    if not WEEKLY_ANALYSIS_SKIP_QUIET_ACCOUNTS:
+        return True
+
+    anomalies = find_weekly_report_anomalies(json.loads(weekly_reports))
+    if not anomalies:
+        print(f"No anomalies found for user_id: {user_id}, team analysis is skipped")
+        return False
+
+    print(f"Found {len(anomalies)} anomalies for user_id: {user_id}:")
+    print("\n".join(anomalies))
+    return True
+
+
+# The stages of the weekly analysis of one user, 'email_sent' and 'skipped' are final
+WeeklyAnalysisStage = Literal[
+    "pending", "report_built", "team_done", "email_sent", "skipped"
+]
+_STAGE_ORDER: Dict[WeeklyAnalysisStage, int] = {
+    "pending": 0,
+    "report_built": 1,
+    "team_done": 2,
+    "email_sent": 3,
+    "skipped": 3,
+}
+
+
+def _load_checkpoint(date: str, user_id: int) -> Optional[WeeklyAnalysisCheckpoint]:
+    try:
+        return asyncio.run(get_weekly_analysis_checkpoint(date, int(user_id)))
+    except Exception as e:
+        print(f"Failed to load the checkpoint for user_id: {user_id}.\nError: {e}")
+        return None
+
+
+def _save_checkpoint(date: str, user_id: int, **data: Any) -> None:
+    # Checkpoints are only needed for resuming, the analysis continues without them
+    try:
+        asyncio.run(save_weekly_analysis_checkpoint(date, int(user_id), data))
+    except Exception as e:
+        print(f"Failed to save the checkpoint for user_id: {user_id}.\nError: {e}")
+
+
+def _advance_checkpoint(
+    date: str,
+    user_id: int,
+    stored_stage: WeeklyAnalysisStage,
+    stage: WeeklyAnalysisStage,
+    **data: Any,
+) -> WeeklyAnalysisStage:
+    """Save the checkpoint of the finished stage, returns the stored stage.
+
+    The stored stage never goes back, e.g. when the stages are repeated without 'resume'.
+    """
+    if _STAGE_ORDER[stage] >= _STAGE_ORDER[stored_stage]:
+        stored_stage = stage
+    _save_checkpoint(date, user_id, stage=stored_stage, **data)
+    return stored_stage
+
+
+def _execute_weekly_analysis_for_user(
+    user_id: int,
+    email: str,
+    date: str,
+    resume: bool = False,
+    lease_lost: Optional[threading.Event] = None,
+    force: bool = False,
+) -> UserStatus:
+    """Execute the weekly analysis for the user and save the progress after every stage.
+
+    Users who already got the email for the same date are skipped, unless 'force' is set
+    (the previous run is then ignored). If 'resume' is set, the finished stages of the
+    previous run are not repeated: the cached weekly report and team conversation result
+    are used. If 'lease_lost' is set before the team conversation or the email, the
+    analysis is aborted.
+    """
+    # Every worker thread has its own IOStream so the output of the users is not mixed
+    with IOStream.set_default(IOConsole()):
+        checkpoint = None if force else _load_checkpoint(date, user_id)
+        stored_stage = cast(
+            WeeklyAnalysisStage,
+            checkpoint.stage if checkpoint is not None else "pending",
+        )
+        if stored_stage in ("email_sent", "skipped"):
+            print(f"Weekly analysis for user_id: {user_id} is already finished")
+            SKIPPED_USERS_TOTAL.inc()
+            return "skipped"
+        stage: WeeklyAnalysisStage = stored_stage if resume else "pending"
+
+        try:
+            if checkpoint is not None and checkpoint.conv_id is not None:
+                conv_id, conv_uuid = checkpoint.conv_id, str(checkpoint.conv_uuid)
+            else:
+                conv_id, conv_uuid = _get_conv_id_and_uuid(user_id=user_id, email=email)
+        except Exception as e:
+            print(
+                f"Failed to create chat for user_id: {user_id} - email {email}.\nError: {e}"
+            )
+            traceback.print_exc()
+            WEEKLY_ANALYSIS_EXCEPTIONS_TOTAL.inc()
+            return "failed"
+        _save_checkpoint(
+            date, user_id, stage=stored_stage, conv_id=conv_id, conv_uuid=conv_uuid
+        )
+
+        weekly_analysis_team = None
+        try:
+            if checkpoint is not None and stage in ("report_built", "team_done"):
+                weekly_reports = checkpoint.weekly_report
+            else:
                 # Always get the weekly report for the previous day
                 weekly_reports = get_weekly_report(
                     date=date, user_id=user_id, conv_id=conv_id
                 )
                 if weekly_reports is None:
                     _delete_chat_webhook(user_id=user_id, conv_id=conv_id)
+                    _advance_checkpoint(
+                        date,
+                        user_id,
+                        stored_stage,
+                        "skipped",
+                        conv_id=None,
+                        conv_uuid=None,
+                    )
                     SKIPPED_USERS_TOTAL.inc()
-                    continue
-
-                (
-                    weekly_report_message,
-                    main_email_template,
-                ) = construct_weekly_report_email_from_template(
-                    weekly_reports=json.loads(weekly_reports), date=date
+                    return "skipped"
+                stored_stage = _advance_checkpoint(
+                    date,
+                    user_id,
+                    stored_stage,
+                    "report_built",
+                    weekly_report=weekly_reports,
                 )
 
+            (
+                weekly_report_message,
+                main_email_template,
+            ) = construct_weekly_report_email_from_template(
+                weekly_reports=json.loads(weekly_reports), date=date
+            )
+
+            if checkpoint is not None and stage == "team_done":
+                team_result = json.loads(str(checkpoint.team_result))
+            elif not _needs_team_analysis(user_id, weekly_reports):
+                QUIET_ACCOUNTS_TOTAL.inc()
+                team_result = {"messages": "[]", "proposed_user_action": []}
+                stored_stage = _advance_checkpoint(
+                    date,
+                    user_id,
+                    stored_stage,
+                    "team_done",
+                    team_result=json.dumps(team_result),
+                )
+            else:
                 task = _create_task_message(date, weekly_reports, weekly_report_message)
 
                 weekly_analysis_team = WeeklyAnalysisTeam(
@@ -1124,25 +1842,140 @@ def execute_weekly_analysis(
                     user_id=user_id,
                     conv_id=conv_id,
                 )
-                WEEKLY_ANALYSIS_TEAM_CONVERSATIONS_TOTAL.inc()
-                weekly_analysis_team.initiate_chat()
-                _validate_conversation_and_send_email(
-                    weekly_analysis_team=weekly_analysis_team,
-                    conv_uuid=conv_uuid,
-                    email=email,
-                    weekly_report_message=weekly_report_message,
-                    main_email_template=main_email_template,
+                with _conversations_semaphore:
+                    if _is_lease_lost(lease_lost, user_id):
+                        return "skipped"
+                    WEEKLY_ANALYSIS_TEAM_CONVERSATIONS_TOTAL.inc()
+                    weekly_analysis_team.initiate_chat()
+                team_result = _get_team_result(weekly_analysis_team, email)
+                stored_stage = _advance_checkpoint(
+                    date,
+                    user_id,
+                    stored_stage,
+                    "team_done",
+                    team_result=json.dumps(team_result),
                 )
 
-            except Exception as e:
-                WEEKLY_ANALYSIS_EXCEPTIONS_TOTAL.inc()
-                print(
-                    f"Weekly analysis failed for user_id: {user_id} - email {email}.\nError: {e}"
-                )
-                traceback.print_stack()
-                traceback.print_exc()
-                _delete_chat_webhook(user_id=user_id, conv_id=conv_id)
-            finally:
-                if weekly_analysis_team:
-                    Team.pop_team(user_id=user_id, conv_id=conv_id)
-        print("Weekly analysis completed.")
+            if _is_lease_lost(lease_lost, user_id):
+                return "skipped"
+            _send_weekly_analysis_email(
+                user_id=user_id,
+                conv_id=conv_id,
+                conv_uuid=conv_uuid,
+                email=email,
+                weekly_report_message=weekly_report_message,
+                main_email_template=main_email_template,
+                team_result=team_result,
+            )
+            _save_checkpoint(date, user_id, stage="email_sent")
+            return "completed"
+
+        except Exception as e:
+            WEEKLY_ANALYSIS_EXCEPTIONS_TOTAL.inc()
+            print(
+                f"Weekly analysis failed for user_id: {user_id} - email {email}.\nError: {e}"
+            )
+            traceback.print_exc()
+            _delete_chat_webhook(user_id=user_id, conv_id=conv_id)
+            # The finished stages are kept, only the deleted chat is removed
+            _save_checkpoint(date, user_id, conv_id=None, conv_uuid=None)
+            return "failed"
+        finally:
+            if weekly_analysis_team:
+                Team.pop_team(user_id=user_id, conv_id=conv_id)
+
+
+def execute_weekly_analysis(
+    send_only_to_emails: Optional[List[str]] = None,
+    date: Optional[str] = None,
+    max_workers: int = WEEKLY_ANALYSIS_MAX_WORKERS,
+    use_leases: bool = False,
+    resume: bool = False,
+    force: bool = False,
+) -> None:
+    """Execute the weekly analysis for all the users created on the same day of the week.
+
+    If 'use_leases' is set, the users are processed only if the worker acquires their lease,
+    so the analysis can be run by all the workers (and nodes) at the same time.
+    If 'resume' is set, the run continues where the previous run for the same date stopped.
+    The users who already got the email for the date are skipped, unless 'force' is set.
+    """
+    iostream = IOConsole()
+    with IOStream.set_default(iostream):
+        if date is None:
+            date = (datetime.today().date() - timedelta(1)).isoformat()
+        print("Starting weekly analysis.")
+        start_time = time.monotonic()
+        FINAL_URLS_HEALTH_CHECKER.clear()
+        _prune_daily_metrics(date)
+        if send_only_to_emails is not None:
+            day_of_week = None
+        else:
+            day_of_week = _get_day_of_week(date)
+        # Only users who have already logged in to Google Ads are returned, so there is
+        # no need to create (and delete) a chat just to find out that the login is missing
+        id_email_dict = json.loads(
+            get_authenticated_user_ids_and_emails(day_of_week=day_of_week)
+        )
+
+        # if send_only_to_emails is None:
+        #     send_only_to_emails = ["robert@airt.ai", "harish@airt.ai"]
+
+        worker_id = _get_worker_id()
+        user_ids: List[Any] = (
+            _order_user_ids_for_worker(
+                list(id_email_dict),
+                worker_index=_get_worker_index(worker_id, WEEKLY_ANALYSIS_NUM_WORKERS),
+                num_workers=WEEKLY_ANALYSIS_NUM_WORKERS,
+            )
+            if use_leases
+            else list(id_email_dict)
+        )
+
+        statuses: Dict[UserStatus, int] = {"completed": 0, "skipped": 0, "failed": 0}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for user_id in user_ids:
+                email = id_email_dict[user_id]
+                if send_only_to_emails is not None and email not in send_only_to_emails:
+                    SKIPPED_USERS_TOTAL.inc()
+                    statuses["skipped"] += 1
+                    print(f"Skipping user_id: {user_id} - email {email}")
+                    continue
+                if use_leases:
+                    future = executor.submit(
+                        _execute_weekly_analysis_for_user_with_lease,
+                        user_id=user_id,
+                        email=email,
+                        date=date,
+                        worker_id=worker_id,
+                        resume=resume,
+                        force=force,
+                    )
+                else:
+                    future = executor.submit(
+                        _execute_weekly_analysis_for_user,
+                        user_id=user_id,
+                        email=email,
+                        date=date,
+                        resume=resume,
+                        force=force,
+                    )
+                futures[future] = user_id
+
+            for future in as_completed(futures):
+                try:
+                    statuses[future.result()] += 1
+                except Exception as e:
+                    print(
+                        f"Weekly analysis failed for user_id: {futures[future]}.\nError: {e}"
+                    )
+                    statuses["failed"] += 1
+
+        elapsed = time.monotonic() - start_time
+        processed = sum(statuses.values())
+        print(
+            f"Weekly analysis completed in {elapsed:.1f}s: {processed} users processed "
+            f"({processed / max(elapsed / 60, 1e-9):.2f} users/min) - "
+            f"{statuses['completed']} completed, {statuses['skipped']} skipped, {statuses['failed']} failed."
+        )
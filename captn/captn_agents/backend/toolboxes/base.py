@@ -1,10 +1,13 @@
+import copy
 import functools
 import inspect
 import logging
 import types
-from typing import Any, Callable, Dict, NamedTuple, Optional, TypeVar
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
 
+from autogen import OpenAIWrapper
 from autogen.agentchat import ConversableAgent, UserProxyAgent
+from autogen.function_utils import get_function_schema
 
 T = TypeVar("T")
 F = TypeVar("F", bound=Callable[..., Any])
@@ -43,6 +46,23 @@ def _args_kwargs_to_kwargs(
     return combined_kwargs
 
 
+# The tool schemas depend only on the function definition, so they are generated once
+# for all the teams and conversations
+_tool_schemas: Dict[Tuple[Any, str, str], Dict[str, Any]] = {}
+
+
+def _get_tool_schema(info: FunctionInfo, origin: Callable[..., Any]) -> Dict[str, Any]:
+    # The functions created per toolbox (e.g. by a factory and wrapped in lru_cache) share
+    # the code of the definition, so the schemas don't grow with the number of toolboxes
+    unwrapped = inspect.unwrap(origin)
+    key = (getattr(unwrapped, "__code__", unwrapped), info.name, info.description)
+    if key not in _tool_schemas:
+        _tool_schemas[key] = get_function_schema(
+            info.function, name=info.name, description=info.description
+        )
+    return copy.deepcopy(_tool_schemas[key])
+
+
 class Toolbox:
     class Functions:
         def __init__(self, toolbox: "Toolbox") -> None:
@@ -51,6 +71,11 @@ class Toolbox:
     def __init__(self) -> None:
         self._function_infos: Dict[str, FunctionInfo] = {}
         self._context: Optional[Any] = None
+        # The functions with the injected context and their tool schemas, created once per toolbox
+        self._prepared_function_infos: Optional[
+            Dict[str, Tuple[FunctionInfo, Dict[str, Any]]]
+        ] = None
+        self._user_proxies: List[UserProxyAgent] = []
 
         # used to access the functions in the toolbox
         self.functions = Toolbox.Functions(self)
@@ -79,6 +104,7 @@ class Toolbox:
             info = FunctionInfo(_wrapper, name, description)
 
             self._function_infos[name] = info
+            self._prepared_function_infos = None
 
             return f
 
@@ -130,6 +156,20 @@ class Toolbox:
 
         return info
 
+    def _prepare_function_infos(
+        self,
+    ) -> Dict[str, Tuple[FunctionInfo, Dict[str, Any]]]:
+        if self._prepared_function_infos is None:
+            self._prepared_function_infos = {}
+            for name, info in self._function_infos.items():
+                injected_info = self._inject_context(info)
+                origin = getattr(info.function, "_origin", info.function)
+                self._prepared_function_infos[name] = (
+                    injected_info,
+                    _get_tool_schema(injected_info, origin),
+                )
+        return self._prepared_function_infos
+
     def add_to_agent(
         self, agent: ConversableAgent, user_proxy: Optional[UserProxyAgent] = None
     ) -> Dict[str, FunctionInfo]:
@@ -137,25 +177,29 @@ class Toolbox:
             agent.llm_config["tools"] = []
 
         # inject context into all the functions where needed
-        retval = {
-            name: self._inject_context(info)
-            for name, info in self._function_infos.items()
-        }
-
-        # register the functions with the agent and user_proxy if needed
-        for info in retval.values():
-            agent.register_for_llm(name=info.name, description=info.description)(
-                info.function
+        prepared = self._prepare_function_infos()
+        retval = {name: info for name, (info, _) in prepared.items()}
+
+        # The same as 'agent.register_for_llm' for every function, but the client of the
+        # agent is created only once instead of after every function
+        agent.llm_config["tools"] = [
+            tool
+            for tool in agent.llm_config["tools"]
+            if tool.get("function", {}).get("name") not in prepared
+        ] + [schema for _, schema in prepared.values()]
+        if len(agent.llm_config["tools"]) > 0:
+            agent.client = OpenAIWrapper(**agent.llm_config)
+
+        # register the functions for execution once per user_proxy
+        if user_proxy is not None:
+            if all(p is not user_proxy for p in self._user_proxies):
+                self._user_proxies.append(user_proxy)
+                for info in retval.values():
+                    user_proxy.register_for_execution(name=info.name)(info.function)
+        else:
+            logger.warning(
+                f"UserProxyAgent not provided. The functions {list(retval)} are added only to the LLM of {agent.name} and nobody executes them."
             )
-            if user_proxy is not None:
-                user_proxy.register_for_execution(name=info.name)(info.function)
-            else:
-                logger.warning(
-                    f"UserProxyAgent not provided. Registering {info.name} for execution with {agent.name}."
-                )
-                agent.register_for_llm(name=info.name, description=info.description)(
-                    info.function
-                )
 
         return retval
 
@@ -20,7 +20,6 @@ from typing import (
 )
 
 import autogen
-import requests
 from annotated_types import Len
 from autogen.agentchat import AssistantAgent
 from autogen.agentchat.contrib.web_surfer import WebSurferAgent  # noqa: E402
@@ -36,7 +35,10 @@ from ....google_ads.client import (
 )
 from ...model import SmartSuggestions
 from ..config import Config
+from ..retry_policy import RETRY_POLICY, is_permanent_error
 from ..toolboxes.base import Toolbox
+from ._query_results import QueryResultPages
+from ._url_health_checker import URLHealthChecker
 
 __all__ = (
     "Context",
@@ -216,6 +218,7 @@ class Context(BaseContext):
     created_campaigns: Dict[str, List[str]] = field(
         default_factory=lambda: defaultdict(list)
     )
+    query_results: Dict[str, QueryResultPages] = field(default_factory=dict)
 
 
 ask_client_for_permission_description = """Ask the client for permission to make the changes. Use this method before calling any of the modification methods!
@@ -729,13 +732,7 @@ def _is_termination_msg(x: Dict[str, Optional[str]]) -> bool:
 
 
 def get_webpage_status_code(url: str) -> Optional[int]:
-    if "http" not in url:
-        url = f"https://{url}"
-    try:
-        status_code = requests.head(url, allow_redirects=True, timeout=10).status_code
-        return status_code
-    except requests.ConnectionError:
-        return None
+    return URLHealthChecker().get_status_code(url)
 
 
 def _get_task_message(max_links_to_click: int) -> str:
@@ -843,7 +840,11 @@ But before giving up, please try to navigate to another page and continue with t
         last_message: str = ""
         failure_message: str = ""
         min_relevant_pages_msg = f"The summary must include AT LEAST {min_relevant_pages} or more relevant pages."
-        for _ in range(outer_retries):
+        for attempt in range(outer_retries):
+            if attempt > 0 and not RETRY_POLICY.wait(
+                attempt=attempt - 1, base_delay=1, caller="websurfer"
+            ):
+                break
             last_message = ""
             failure_message = ""
             try:
@@ -886,6 +887,8 @@ The JSON-encoded string must contain at least {min_relevant_pages} relevant page
                 try:
                     manager.initiate_chat(recipient=manager, message=initial_message)
                 except Exception as e:
+                    if is_permanent_error(e):
+                        raise
                     print(f"Exception '{type(e)}' in initiating chat: {e}")
 
                 for i in range(inner_retries):
@@ -966,6 +969,8 @@ Example of correctly formatted JSON (unrelated to the task):
                         )
 
                     except Exception as e:
+                        if is_permanent_error(e):
+                            raise
                         retry_message = _constuct_retry_message(
                             new_message=f"FAILED: {str(e)}",
                             give_up_message=give_up_message,
@@ -978,6 +983,9 @@ Example of correctly formatted JSON (unrelated to the task):
                 failure_message = str(e)
                 print("Exception:")
                 print(e)
+                # Retrying won't help, e.g. the context of the LLM is exceeded
+                if is_permanent_error(e):
+                    break
             finally:
                 if timestamp_copy:
                     # reset the timestamp (because of the autogen cache)
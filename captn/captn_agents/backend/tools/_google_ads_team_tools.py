@@ -29,6 +29,8 @@ from ._functions import (
     get_info_from_the_web_page_description,
     reply_to_client,
 )
+from ._query_results import get_query_result_page as get_query_result_page_from_store
+from ._query_results import shape_query_result
 
 __all__ = (
     "add_shared_functions",
@@ -36,6 +38,8 @@ __all__ = (
     "change_google_account_description",
     "execute_query",
     "execute_query_description",
+    "get_query_result_page",
+    "get_query_result_page_description",
     "list_accessible_customers",
     "list_accessible_customers_description",
     "properties_config",
@@ -81,9 +85,29 @@ def execute_query(
 ) -> Union[str, Dict[str, str]]:
     user_id = context.user_id
     conv_id = context.conv_id
-    return execute_query_client(
+    query_result = execute_query_client(
         user_id=user_id, conv_id=conv_id, customer_ids=customer_ids, query=query
     )
+    if not isinstance(query_result, str):
+        return query_result
+
+    return shape_query_result(
+        query_result, query=query, query_results=context.query_results
+    )
+
+
+get_query_result_page_description = """Retrieve another page of the 'execute_query' result.
+Use this command ONLY when the 'execute_query' result was split into pages and you need the rows which are NOT in the pages you have already seen."""
+
+
+def get_query_result_page(
+    context: Context,
+    result_id: Annotated[str, "The id of the query result e.g. 'query_result_1'"],
+    page: Annotated[int, "The number of the page (starting from 1)"],
+) -> str:
+    return get_query_result_page_from_store(
+        context.query_results, result_id=result_id, page=page
+    )
 
 
 properties_config = {
@@ -929,6 +953,7 @@ def add_shared_functions(toolbox: Toolbox) -> None:
         list_accessible_customers
     )
     toolbox.add_function(execute_query_description)(execute_query)
+    toolbox.add_function(get_query_result_page_description)(get_query_result_page)
     toolbox.add_function(create_campaign_description)(create_campaign)
 
 
@@ -0,0 +1,180 @@
+import ast
+import csv
+import io
+import json
+from dataclasses import dataclass
+from os import environ
+from typing import Any, Dict, List, Optional, Tuple
+
+from autogen.token_count_utils import count_token
+
+__all__ = (
+    "EXECUTE_QUERY_MAX_TOKENS",
+    "QueryResultPages",
+    "get_query_result_page",
+    "shape_query_result",
+)
+
+# Maximum number of tokens of the 'execute_query' result which is added to the group chat.
+# Everything above this budget is split into pages which can be retrieved with a follow-up tool.
+EXECUTE_QUERY_MAX_TOKENS = int(environ.get("EXECUTE_QUERY_MAX_TOKENS", 2000))
+TOKEN_COUNT_MODEL = "gpt-4-1106-preview"
+
+CUSTOMER_ID_COLUMN = "customer_id"
+
+
+@dataclass
+class QueryResultPages:
+    pages: List[str]
+    total_rows: int
+
+
+def _count_tokens(text: str) -> int:
+    return count_token(text, model=TOKEN_COUNT_MODEL)  # type: ignore[no-any-return]
+
+
+def _flatten_row(
+    row: Dict[str, Any], keep_resource_names: bool, prefix: str = ""
+) -> Dict[str, Any]:
+    flat_row: Dict[str, Any] = {}
+    for key, value in row.items():
+        if key == "resourceName" and not keep_resource_names:
+            continue
+        column = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat_row.update(
+                _flatten_row(value, keep_resource_names, prefix=f"{column}.")
+            )
+        elif isinstance(value, list):
+            flat_row[column] = (
+                json.dumps(value)
+                if any(isinstance(item, (dict, list)) for item in value)
+                else "; ".join(str(item) for item in value)
+            )
+        else:
+            flat_row[column] = value
+    return flat_row
+
+
+def _to_csv_lines(
+    response: Dict[str, List[Dict[str, Any]]], keep_resource_names: bool
+) -> Tuple[str, List[str], List[str]]:
+    columns: Dict[str, None] = {CUSTOMER_ID_COLUMN: None}
+    flat_rows: List[Dict[str, Any]] = []
+    customers_without_rows: List[str] = []
+    for customer_id, rows in response.items():
+        if not rows:
+            customers_without_rows.append(customer_id)
+        for row in rows:
+            flat_row = {
+                CUSTOMER_ID_COLUMN: customer_id,
+                **_flatten_row(row, keep_resource_names),
+            }
+            columns.update(dict.fromkeys(flat_row))
+            flat_rows.append(flat_row)
+
+    def _write_line(values: List[Any]) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="").writerow(values)
+        return buffer.getvalue()
+
+    header = _write_line(list(columns))
+    lines = [_write_line([row.get(c, "") for c in columns]) for row in flat_rows]
+    return header, lines, customers_without_rows
+
+
+def _split_into_pages(header: str, lines: List[str], max_tokens: int) -> List[str]:
+    header_tokens = _count_tokens(header)
+    pages: List[str] = []
+    page_lines: List[str] = []
+    page_tokens = header_tokens
+    for line in lines:
+        line_tokens = _count_tokens(line) + 1
+        if page_lines and page_tokens + line_tokens > max_tokens:
+            pages.append("\n".join([header, *page_lines]))
+            page_lines = []
+            page_tokens = header_tokens
+        page_lines.append(line)
+        page_tokens += line_tokens
+    pages.append("\n".join([header, *page_lines]))
+    return pages
+
+
+def _format_page(result_id: str, result: QueryResultPages, page: int) -> str:
+    message = f"""{result.pages[page - 1]}
+
+This is page {page} of {len(result.pages)} of the query result '{result_id}' ({result.total_rows} rows in total)."""
+    if page < len(result.pages):
+        message += f"\nTo see the next page, use the 'get_query_result_page' command with result_id='{result_id}' and page={page + 1}."
+    return message
+
+
+def shape_query_result(
+    query_result: str,
+    *,
+    query: Optional[str],
+    query_results: Dict[str, QueryResultPages],
+    max_tokens: int = EXECUTE_QUERY_MAX_TOKENS,
+) -> str:
+    """Convert the raw Google Ads search response into a compact CSV table.
+
+    Nested rows are flattened into dotted columns and 'resourceName' echoes are dropped
+    unless 'resource_name' was explicitly selected in the query. If the table exceeds
+    the token budget, only the first page is returned and all the pages are stored in
+    'query_results' so they can be retrieved with 'get_query_result_page'.
+
+    Args:
+        query_result (str): The result returned by the 'execute_query' client function.
+        query (Optional[str]): The executed query.
+        query_results (Dict[str, QueryResultPages]): Storage for the paged results.
+        max_tokens (int): The token budget for a single page.
+
+    Returns:
+        str: The shaped result.
+    """
+    try:
+        response = ast.literal_eval(query_result)
+    except (ValueError, SyntaxError):
+        return query_result
+    if not isinstance(response, dict):
+        return query_result
+
+    keep_resource_names = query is not None and "resource_name" in query.lower()
+    header, lines, customers_without_rows = _to_csv_lines(
+        response, keep_resource_names=keep_resource_names
+    )
+    no_rows_message = (
+        f"\nNo rows returned for customer(s): {', '.join(customers_without_rows)}"
+        if customers_without_rows
+        else ""
+    )
+    if not lines:
+        return no_rows_message.strip()
+
+    table = "\n".join([header, *lines])
+    if _count_tokens(table) <= max_tokens:
+        return table + no_rows_message
+
+    result = QueryResultPages(
+        pages=_split_into_pages(header, lines, max_tokens), total_rows=len(lines)
+    )
+    result_id = f"query_result_{len(query_results) + 1}"
+    query_results[result_id] = result
+
+    return _format_page(result_id, result, page=1) + no_rows_message
+
+
+def get_query_result_page(
+    query_results: Dict[str, QueryResultPages], result_id: str, page: int
+) -> str:
+    if result_id not in query_results:
+        raise ValueError(
+            f"Unknown result_id '{result_id}'. Available result ids: {list(query_results.keys())}"
+        )
+    result = query_results[result_id]
+    if page < 1 or page > len(result.pages):
+        raise ValueError(
+            f"Page {page} does not exist. The query result '{result_id}' has {len(result.pages)} pages."
+        )
+
+    return _format_page(result_id, result, page=page)
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+__all__ = ("URLHealthChecker", "normalize_url")
+
+# Some servers don't allow HEAD requests, such URLs are checked with GET
+FALLBACK_TO_GET_STATUS_CODES = {403, 405}
+
+
+def normalize_url(url: str) -> str:
+    # Append https if protocol is missing
+    url = url.strip()
+    return url if "http" in url else f"https://{url}"
+
+
+class URLHealthChecker:
+    """Checks if URLs are reachable and caches the status codes.
+
+    Duplicate URLs are checked only once and all URLs are checked concurrently, with at most
+    'max_requests_per_host' requests to the same host at a time. The status codes are cached
+    for the lifetime of the checker (e.g. one weekly run), None is returned for URLs which
+    could not be reached.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 10.0,
+        max_requests_per_host: int = 4,
+        max_requests: int = 32,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self.timeout = timeout
+        self.max_requests_per_host = max_requests_per_host
+        self.max_requests = max_requests
+        self._transport = transport
+        self._status_codes: Dict[str, Optional[int]] = {}
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._status_codes.clear()
+
+    async def _check_url(
+        self, client: httpx.AsyncClient, url: str, semaphore: asyncio.Semaphore
+    ) -> Optional[int]:
+        async with semaphore:
+            try:
+                response = await client.head(url)
+                if response.status_code in FALLBACK_TO_GET_STATUS_CODES:
+                    # Only the status code is needed, the body is not downloaded
+                    async with client.stream("GET", url) as response:
+                        pass
+                return response.status_code
+            except (httpx.HTTPError, httpx.InvalidURL):
+                return None
+
+    async def aget_status_codes(self, urls: Iterable[str]) -> Dict[str, Optional[int]]:
+        urls = list(urls)
+        normalized_urls = {url: normalize_url(url) for url in urls}
+        with self._lock:
+            status_codes = dict(self._status_codes)
+        urls_to_check: List[str] = sorted(
+            set(normalized_urls.values()) - status_codes.keys()
+        )
+
+        if urls_to_check:
+            host_semaphores: Dict[Optional[str], asyncio.Semaphore] = defaultdict(
+                lambda: asyncio.Semaphore(self.max_requests_per_host)
+            )
+            async with httpx.AsyncClient(
+                follow_redirects=True,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_requests),
+                transport=self._transport,
+            ) as client:
+                checked = await asyncio.gather(
+                    *(
+                        self._check_url(
+                            client, url, host_semaphores[urlsplit(url).hostname]
+                        )
+                        for url in urls_to_check
+                    )
+                )
+            new_status_codes = dict(zip(urls_to_check, checked, strict=False))
+            with self._lock:
+                self._status_codes.update(new_status_codes)
+            status_codes.update(new_status_codes)
+
+        return {url: status_codes[normalized_urls[url]] for url in urls}
+
+    def get_status_codes(self, urls: Iterable[str]) -> Dict[str, Optional[int]]:
+        urls = list(urls)
+        # Don't start an event loop if all URLs were already checked
+        with self._lock:
+            if all(normalize_url(url) in self._status_codes for url in urls):
+                return {url: self._status_codes[normalize_url(url)] for url in urls}
+
+        coroutine = self.aget_status_codes(urls)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+        # Called from a running event loop, the check is run in a separate thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coroutine).result()
+
+    def get_status_code(self, url: str) -> Optional[int]:
+        return self.get_status_codes([url])[url]
@@ -11,6 +11,8 @@ from ._functions import (
 from ._google_ads_team_tools import (
     execute_query,
     execute_query_description,
+    get_query_result_page,
+    get_query_result_page_description,
     list_accessible_customers,
     list_accessible_customers_description,
 )
@@ -40,6 +42,7 @@ def create_weekly_analysis_team_toolbox(
         list_accessible_customers
     )
     toolbox.add_function(execute_query_description)(execute_query)
+    toolbox.add_function(get_query_result_page_description)(get_query_result_page)
     toolbox.add_function(get_info_from_the_web_page_description)(
         get_get_info_from_the_web_page()
     )
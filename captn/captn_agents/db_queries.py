@@ -1,6 +1,9 @@
-from typing import Optional, Union
+from datetime import date as date_type
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from prisma.models import UserInitialTeam
+from prisma import Json
+from prisma.models import UserInitialTeam, WeeklyAnalysisCheckpoint
 
 from .helpers import get_db_connection
 
@@ -12,3 +15,227 @@ async def get_initial_team(user_id: Union[int, str]) -> Optional[UserInitialTeam
         )
 
     return user_initial_team
+
+
+async def get_daily_metrics(
+    customer_id: str, start_date: str, end_date: str, settle_days: int = 0
+) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """Get the stored daily metrics rows grouped by resource and date.
+
+    Only days which were fetched at least 'settle_days' after the day itself are returned,
+    the metrics of the recent days can still change (e.g. late conversions).
+    """
+    async with get_db_connection() as db:
+        daily_metrics = await db.dailymetrics.find_many(
+            where={
+                "customer_id": customer_id,
+                "date": {"gte": start_date, "lte": end_date},
+            }
+        )
+
+    rows: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+    for day in daily_metrics:
+        fetched_on = day.fetched_at.astimezone(timezone.utc).date()
+        if (fetched_on - date_type.fromisoformat(day.date)).days < settle_days:
+            continue
+        rows.setdefault(day.resource, {})[day.date] = day.rows
+    return rows
+
+
+async def save_daily_metrics(
+    customer_id: str, rows: Dict[str, Dict[str, List[Dict[str, Any]]]]
+) -> None:
+    """Store the daily metrics rows (grouped by resource and date), existing days are overwritten."""
+    fetched_at = datetime.now(timezone.utc)
+    async with get_db_connection() as db:
+        async with db.batch_() as batcher:
+            for resource, rows_by_date in rows.items():
+                for date, day_rows in rows_by_date.items():
+                    batcher.dailymetrics.upsert(
+                        where={
+                            "customer_id_resource_date": {
+                                "customer_id": customer_id,
+                                "resource": resource,
+                                "date": date,
+                            }
+                        },
+                        data={
+                            "create": {
+                                "customer_id": customer_id,
+                                "resource": resource,
+                                "date": date,
+                                "rows": Json(day_rows),
+                                "fetched_at": fetched_at,
+                            },
+                            "update": {
+                                "rows": Json(day_rows),
+                                "fetched_at": fetched_at,
+                            },
+                        },
+                    )
+
+
+async def delete_daily_metrics(before: str) -> int:
+    """Delete the stored daily metrics of all customers for the days before 'before'."""
+    async with get_db_connection() as db:
+        count = await db.dailymetrics.delete_many(where={"date": {"lt": before}})
+    return count  # type: ignore[no-any-return]
+
+
+ACQUIRE_WEEKLY_ANALYSIS_LEASE_QUERY = """INSERT INTO "WeeklyAnalysisLease" ("date", "user_id", "owner", "status", "expires_at", "updated_at")
+VALUES ($1, $2, $3, 'running', NOW() + $4 * INTERVAL '1 second', NOW())
+ON CONFLICT ("date", "user_id") DO UPDATE
+SET "owner" = EXCLUDED."owner", "status" = 'running', "expires_at" = EXCLUDED."expires_at", "updated_at" = NOW()
+WHERE ("WeeklyAnalysisLease"."status" = 'running' AND "WeeklyAnalysisLease"."expires_at" < NOW())
+OR "WeeklyAnalysisLease"."status" = 'failed'
+RETURNING ("WeeklyAnalysisLease".xmax <> 0) AS taken_over"""
+
+RENEW_WEEKLY_ANALYSIS_LEASE_QUERY = """UPDATE "WeeklyAnalysisLease" SET "expires_at" = NOW() + $4 * INTERVAL '1 second', "updated_at" = NOW()
+WHERE "date" = $1 AND "user_id" = $2 AND "owner" = $3 AND "status" = 'running'"""
+
+RELEASE_WEEKLY_ANALYSIS_LEASE_QUERY = """UPDATE "WeeklyAnalysisLease" SET "status" = $4, "updated_at" = NOW()
+WHERE "date" = $1 AND "user_id" = $2 AND "owner" = $3"""
+
+
+async def acquire_weekly_analysis_lease(
+    date: str, user_id: int, owner: str, ttl: int
+) -> Tuple[bool, bool]:
+    """Acquire the lease for the weekly analysis of the user, returns if it was acquired and taken over.
+
+    The lease can be acquired only once per date, unless the analysis failed or the owner
+    didn't finish it within 'ttl' seconds (e.g. the worker was killed). In that case the
+    lease is taken over from the previous owner.
+    """
+    async with get_db_connection() as db:
+        rows = await db.query_raw(
+            ACQUIRE_WEEKLY_ANALYSIS_LEASE_QUERY, date, user_id, owner, ttl
+        )
+    if not rows:
+        return False, False
+    return True, bool(rows[0]["taken_over"])
+
+
+async def renew_weekly_analysis_lease(
+    date: str, user_id: int, owner: str, ttl: int
+) -> bool:
+    """Extend the lease by 'ttl' seconds, returns False if the owner doesn't hold the lease anymore."""
+    async with get_db_connection() as db:
+        count = await db.execute_raw(
+            RENEW_WEEKLY_ANALYSIS_LEASE_QUERY, date, user_id, owner, ttl
+        )
+    return count == 1  # type: ignore[no-any-return]
+
+
+async def release_weekly_analysis_lease(
+    date: str, user_id: int, owner: str, status: str
+) -> None:
+    async with get_db_connection() as db:
+        await db.execute_raw(
+            RELEASE_WEEKLY_ANALYSIS_LEASE_QUERY, date, user_id, owner, status
+        )
+
+
+async def get_weekly_analysis_checkpoint(
+    date: str, user_id: int
+) -> Optional[WeeklyAnalysisCheckpoint]:
+    async with get_db_connection() as db:
+        checkpoint = await db.weeklyanalysischeckpoint.find_unique(
+            where={"date_user_id": {"date": date, "user_id": user_id}}
+        )
+    return checkpoint
+
+
+async def save_weekly_analysis_checkpoint(
+    date: str, user_id: int, data: Dict[str, Any]
+) -> None:
+    async with get_db_connection() as db:
+        await db.weeklyanalysischeckpoint.upsert(
+            where={"date_user_id": {"date": date, "user_id": user_id}},
+            data={
+                "create": {
+                    "date": date,
+                    "user_id": user_id,
+                    "stage": "pending",
+                    **data,
+                },
+                "update": data,
+            },
+        )
+
+
+async def get_team_state(team_name: str) -> Optional[str]:
+    async with get_db_connection() as db:
+        team_state = await db.teamstate.find_unique(where={"team_name": team_name})
+
+    return team_state.state if team_state is not None else None
+
+
+SAVE_TEAM_STATE_QUERY = """INSERT INTO "TeamState" ("team_name", "user_id", "conv_id", "version", "state", "updated_at")
+VALUES ($1, $2, $3, $4, $5, NOW())
+ON CONFLICT ("team_name") DO UPDATE
+SET "user_id" = EXCLUDED."user_id", "conv_id" = EXCLUDED."conv_id", "version" = EXCLUDED."version", "state" = EXCLUDED."state", "updated_at" = NOW()
+WHERE $6::INTEGER IS NULL OR "TeamState"."version" = $6::INTEGER"""
+
+
+async def save_team_state(
+    team_name: str,
+    user_id: int,
+    conv_id: int,
+    version: int,
+    state: str,
+    expected_version: Optional[int] = None,
+) -> bool:
+    """Store the state of the team, if 'expected_version' is set only if the stored version is still the expected one."""
+    async with get_db_connection() as db:
+        count = await db.execute_raw(
+            SAVE_TEAM_STATE_QUERY,
+            team_name,
+            user_id,
+            conv_id,
+            version,
+            state,
+            expected_version,
+        )
+    return count == 1  # type: ignore[no-any-return]
+
+
+async def delete_team_state(team_name: str) -> None:
+    async with get_db_connection() as db:
+        await db.teamstate.delete_many(where={"team_name": team_name})
+
+
+ACQUIRE_TEAM_STATE_LEASE_QUERY = """INSERT INTO "TeamStateLease" ("team_name", "owner", "expires_at", "updated_at")
+VALUES ($1, $2, NOW() + $3 * INTERVAL '1 second', NOW())
+ON CONFLICT ("team_name") DO UPDATE
+SET "owner" = EXCLUDED."owner", "expires_at" = EXCLUDED."expires_at", "updated_at" = NOW()
+WHERE "TeamStateLease"."expires_at" < NOW()"""
+
+RENEW_TEAM_STATE_LEASE_QUERY = """UPDATE "TeamStateLease" SET "expires_at" = NOW() + $3 * INTERVAL '1 second', "updated_at" = NOW()
+WHERE "team_name" = $1 AND "owner" = $2"""
+
+RELEASE_TEAM_STATE_LEASE_QUERY = (
+    """DELETE FROM "TeamStateLease" WHERE "team_name" = $1 AND "owner" = $2"""
+)
+
+
+async def acquire_team_state_lease(team_name: str, owner: str, ttl: int) -> bool:
+    """Acquire the lease of the conversation, unless another request holds it (and it didn't expire)."""
+    async with get_db_connection() as db:
+        count = await db.execute_raw(
+            ACQUIRE_TEAM_STATE_LEASE_QUERY, team_name, owner, ttl
+        )
+    return count == 1  # type: ignore[no-any-return]
+
+
+async def renew_team_state_lease(team_name: str, owner: str, ttl: int) -> bool:
+    """Extend the lease by 'ttl' seconds, returns False if the owner doesn't hold the lease anymore."""
+    async with get_db_connection() as db:
+        count = await db.execute_raw(
+            RENEW_TEAM_STATE_LEASE_QUERY, team_name, owner, ttl
+        )
+    return count == 1  # type: ignore[no-any-return]
+
+
+async def release_team_state_lease(team_name: str, owner: str) -> None:
+    async with get_db_connection() as db:
+        await db.execute_raw(RELEASE_TEAM_STATE_LEASE_QUERY, team_name, owner)
@@ -0,0 +1,291 @@
+import asyncio
+import time
+import traceback
+from collections import Counter as CounterDict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from os import environ
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Optional
+
+import websockets
+from autogen.io.base import IOStream
+from websockets.server import WebSocketServerProtocol
+
+from ..observability.websocket_utils import (
+    CONVERSATION_QUEUE_WAIT_TIME,
+    PING_REQUESTS,
+    QUEUED_CONVERSATIONS,
+    REJECTED_CONVERSATIONS,
+    RUNNING_CONVERSATIONS,
+    WEBSOCKET_REQUESTS,
+)
+from .application import (
+    INVALID_MESSAGE_IN_IOSTREAM,
+    ON_FAILURE_MESSAGE,
+    RANDOM_EXCEPTIONS,
+    CaptnAgentRequest,
+    run_conversation,
+)
+
+__all__ = (
+    "ConversationQueueFullError",
+    "ConversationScheduler",
+    "serve_websockets",
+)
+
+# Conversations are processed in threads, the others wait in the queue
+WEBSOCKET_MAX_CONVERSATIONS = int(environ.get("WEBSOCKET_MAX_CONVERSATIONS", 16))
+WEBSOCKET_MAX_CONVERSATIONS_PER_USER = int(
+    environ.get("WEBSOCKET_MAX_CONVERSATIONS_PER_USER", 2)
+)
+WEBSOCKET_MAX_QUEUED_CONVERSATIONS = int(
+    environ.get("WEBSOCKET_MAX_QUEUED_CONVERSATIONS", 100)
+)
+
+BUSY_MESSAGE = "We are currently handling too many conversations. Please try again in a few minutes."
+
+
+class ConversationQueueFullError(Exception):
+    pass
+
+
+@dataclass(eq=False)
+class _QueuedConversation:
+    user_id: int
+    queued_at: float
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+    admitted: bool = False
+
+
+class ConversationScheduler:
+    """Admission control of the conversations.
+
+    At most 'max_conversations' conversations run at the same time and at most
+    'max_conversations_per_user' of them belong to the same user. The other conversations
+    wait in the queue in the order of arrival, a user at the limit doesn't block the others.
+    All the methods, except the conversations run in the executor, are called on the event loop.
+    """
+
+    def __init__(
+        self,
+        max_conversations: int = WEBSOCKET_MAX_CONVERSATIONS,
+        max_conversations_per_user: int = WEBSOCKET_MAX_CONVERSATIONS_PER_USER,
+        max_queued_conversations: int = WEBSOCKET_MAX_QUEUED_CONVERSATIONS,
+    ) -> None:
+        self.max_conversations = max_conversations
+        self.max_conversations_per_user = max_conversations_per_user
+        self.max_queued_conversations = max_queued_conversations
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_conversations, thread_name_prefix="conversation"
+        )
+        self._queue: Deque[_QueuedConversation] = deque()
+        self._running: CounterDict[int] = CounterDict()
+
+    @property
+    def running(self) -> int:
+        return sum(self._running.values())
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def _can_start(self, user_id: int) -> bool:
+        return (
+            self.running < self.max_conversations
+            and self._running[user_id] < self.max_conversations_per_user
+        )
+
+    def _update_metrics(self) -> None:
+        QUEUED_CONVERSATIONS.set(self.queued)
+        RUNNING_CONVERSATIONS.set(self.running)
+
+    def _dispatch(self) -> None:
+        for queued in list(self._queue):
+            if self.running >= self.max_conversations:
+                break
+            if self._can_start(queued.user_id):
+                self._queue.remove(queued)
+                queued.admitted = True
+                queued.changed.set()
+                self._running[queued.user_id] += 1
+                CONVERSATION_QUEUE_WAIT_TIME.observe(
+                    time.monotonic() - queued.queued_at
+                )
+        # The positions in the queue have changed
+        for queued in self._queue:
+            queued.changed.set()
+        self._update_metrics()
+
+    def _release(self, user_id: int) -> None:
+        self._running[user_id] -= 1
+        if self._running[user_id] <= 0:
+            del self._running[user_id]
+        self._dispatch()
+
+    async def _wait(
+        self,
+        queued: _QueuedConversation,
+        on_position: Optional[Callable[[int], Awaitable[Any]]],
+    ) -> None:
+        position = None
+        while not queued.admitted:
+            queued.changed.clear()
+            new_position = self._queue.index(queued) + 1
+            if on_position is not None and new_position != position:
+                position = new_position
+                await on_position(position)
+            if not queued.admitted and not queued.changed.is_set():
+                await queued.changed.wait()
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        user_id: int,
+        on_position: Optional[Callable[[int], Awaitable[Any]]] = None,
+    ) -> AsyncIterator[None]:
+        """Wait until the conversation of the user can start, 'on_position' is called with the position in the queue."""
+        if not self._can_start(user_id) or self._queue:
+            if self.queued >= self.max_queued_conversations:
+                REJECTED_CONVERSATIONS.inc()
+                raise ConversationQueueFullError(
+                    f"The queue is full ({self.queued} conversations)"
+                )
+
+        queued = _QueuedConversation(user_id=user_id, queued_at=time.monotonic())
+        self._queue.append(queued)
+        self._dispatch()
+        try:
+            await self._wait(queued, on_position)
+        except BaseException:
+            # e.g. the client disconnected
+            if queued.admitted:
+                self._release(user_id)
+            else:
+                self._queue.remove(queued)
+                self._dispatch()
+            raise
+
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, func, *args
+        )
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class WebsocketIOStream:
+    """IOStream used in the conversation threads, the messages are sent by the event loop."""
+
+    def __init__(
+        self, websocket: WebSocketServerProtocol, loop: asyncio.AbstractEventLoop
+    ) -> None:
+        self.websocket = websocket
+        self.loop = loop
+
+    def print(
+        self, *objects: Any, sep: str = " ", end: str = "\n", flush: bool = False
+    ) -> None:
+        message = sep.join(map(str, objects)) + end
+        asyncio.run_coroutine_threadsafe(
+            self.websocket.send(message), self.loop
+        ).result()
+
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        if prompt != "":
+            asyncio.run_coroutine_threadsafe(
+                self.websocket.send(prompt), self.loop
+            ).result()
+        message = asyncio.run_coroutine_threadsafe(
+            self.websocket.recv(), self.loop
+        ).result()
+        return message.decode("utf-8") if isinstance(message, bytes) else message
+
+
+def _run_conversation_in_thread(
+    iostream: WebsocketIOStream, request: CaptnAgentRequest, num_of_retries: int
+) -> None:
+    # autogen prints the messages of the agents to the default IOStream
+    with IOStream.set_default(iostream):
+        try:
+            run_conversation(
+                iostream=iostream,
+                request=request,
+                num_of_retries=num_of_retries,
+            )
+        except Exception as e:
+            RANDOM_EXCEPTIONS.inc()
+            print(f"Agent conversation failed with an error: {e}")
+            traceback.print_exc()
+
+
+async def handle_websocket(
+    websocket: WebSocketServerProtocol,
+    scheduler: ConversationScheduler,
+    num_of_retries: int = 3,
+) -> None:
+    """The same as 'on_connect', but the conversations are admitted by the scheduler."""
+    try:
+        original_message = await websocket.recv()
+        if original_message == "ping":
+            PING_REQUESTS.inc()
+            await websocket.send("pong\n")
+            return
+        WEBSOCKET_REQUESTS.inc()
+        try:
+            request = CaptnAgentRequest.model_validate_json(original_message)
+        except Exception as e:
+            INVALID_MESSAGE_IN_IOSTREAM.inc()
+            await websocket.send(ON_FAILURE_MESSAGE + "\n")
+            print(f"Failed to read the message from the client: {e}")
+            return
+
+        async def _send_position(position: int) -> None:
+            if request.stream_progress:
+                await websocket.send(f'{{"type": "queue", "position": {position}}}\n')
+
+        try:
+            async with scheduler.slot(request.user_id, on_position=_send_position):
+                if not websocket.open:
+                    print("The client disconnected while waiting in the queue")
+                    return
+                iostream = WebsocketIOStream(websocket, asyncio.get_running_loop())
+                await scheduler.run(
+                    _run_conversation_in_thread, iostream, request, num_of_retries
+                )
+        except ConversationQueueFullError as e:
+            print(f"Conversation of the user {request.user_id} rejected: {e}")
+            await websocket.send(BUSY_MESSAGE + "\n")
+
+    except websockets.ConnectionClosed:
+        print("The client disconnected before the conversation started")
+    except Exception as e:
+        RANDOM_EXCEPTIONS.inc()
+        print(f"Agent conversation failed with an error: {e}")
+        traceback.print_exc()
+
+
+@asynccontextmanager
+async def serve_websockets(
+    host: str,
+    port: int,
+    scheduler: Optional[ConversationScheduler] = None,
+) -> AsyncIterator[str]:
+    """Run the websocket server on the running event loop, yields the URI of the server."""
+    scheduler = scheduler if scheduler is not None else ConversationScheduler()
+
+    async def _handler(websocket: WebSocketServerProtocol) -> None:
+        await handle_websocket(websocket, scheduler)
+
+    try:
+        async with websockets.serve(_handler, host, port):
+            yield f"ws://{host}:{port}"
+    finally:
+        scheduler.shutdown()
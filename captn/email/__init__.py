@@ -1,5 +1,6 @@
 from captn.email.send_email import (
     send_email,
 )
+from captn.email.templates import CompiledTemplate, load_template
 
-__all__ = ("send_email",)
+__all__ = ("CompiledTemplate", "load_template", "send_email")
@@ -0,0 +1,37 @@
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import List
+
+__all__ = ("CompiledTemplate", "load_template")
+
+# Only lowercase identifiers are placeholders, so the CSS blocks in the templates are left alone
+PLACEHOLDER_PATTERN = re.compile(r"\{([a-z_]+)\}")
+
+
+class CompiledTemplate:
+    """Template with '{placeholder}' fields which is parsed once and rendered in one pass.
+
+    Placeholders without a value are left in the output, so a template can be rendered in
+    steps (e.g. '{proposed_action}' is known only after the team conversation).
+    """
+
+    def __init__(self, source: str) -> None:
+        # The literal parts are at even and the placeholder names at odd indexes
+        self._parts: List[str] = PLACEHOLDER_PATTERN.split(source)
+
+    @property
+    def placeholders(self) -> List[str]:
+        return self._parts[1::2]
+
+    def render(self, **values: str) -> str:
+        return "".join(
+            part if i % 2 == 0 else values.get(part, f"{{{part}}}")
+            for i, part in enumerate(self._parts)
+        )
+
+
+@lru_cache(maxsize=None)
+def load_template(path: Path) -> CompiledTemplate:
+    """Load and compile the template, every template is read only once per process."""
+    return CompiledTemplate(path.read_text())
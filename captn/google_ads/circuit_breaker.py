@@ -0,0 +1,261 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from os import environ
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import requests
+from prometheus_client import Counter
+from tenacity import RetryCallState
+from tenacity.stop import stop_base
+
+__all__ = (
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "GOOGLE_ADS_CIRCUIT_BREAKER",
+    "GOOGLE_ADS_RETRY_BUDGET",
+    "GoogleAdsAPIError",
+    "RetryBudget",
+    "TRANSIENT_STATUS_CODES",
+    "call_with_circuit_breaker",
+    "consume_retry_budget",
+    "is_transient_google_ads_error",
+    "stop_when_retry_budget_exhausted",
+)
+
+CIRCUIT_BREAKER_REJECTED_CALLS_TOTAL = Counter(
+    "google_ads_circuit_breaker_rejected_calls_total",
+    "Total count of Google Ads API calls rejected because the circuit was open",
+)
+CIRCUIT_BREAKER_OPENED_TOTAL = Counter(
+    "google_ads_circuit_breaker_opened_total",
+    "Total count of Google Ads API circuits which were opened",
+)
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, key: str, retry_after: float) -> None:
+        self.key = key
+        self.retry_after = retry_after
+        super().__init__(
+            f"Google Ads API is currently unavailable ('{key}' failed too many times in a row). "
+            f"Do NOT retry the same command, inform the client about the outage and ask the client to try again in {int(retry_after) + 1} seconds."
+        )
+
+
+@dataclass
+class _CircuitState:
+    failures: int = 0
+    opened_at: Optional[float] = None
+    probe_in_flight: bool = False
+
+
+class CircuitBreaker:
+    """Circuit breaker keyed by an arbitrary string (e.g. endpoint and customer id).
+
+    After 'failure_threshold' consecutive failures the circuit opens and all calls fail
+    fast with 'CircuitOpenError'. Once 'recovery_timeout' seconds pass, a single probe
+    call is let through (half-open state): if it succeeds the circuit closes, otherwise
+    it opens again.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 60.0,
+        is_failure: Callable[[BaseException], bool] = lambda e: True,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.is_failure = is_failure
+        self._clock = clock
+        self._states: Dict[str, _CircuitState] = {}
+        self._lock = threading.Lock()
+
+    def get_state(self, key: str) -> str:
+        with self._lock:
+            state = self._states.get(key)
+            if state is None or state.opened_at is None:
+                return "closed"
+            if self._clock() - state.opened_at < self.recovery_timeout:
+                return "open"
+            return "half_open"
+
+    def _before_call(self, key: str) -> None:
+        with self._lock:
+            state = self._states.get(key)
+            if state is None or state.opened_at is None:
+                return
+            elapsed = self._clock() - state.opened_at
+            if elapsed < self.recovery_timeout or state.probe_in_flight:
+                CIRCUIT_BREAKER_REJECTED_CALLS_TOTAL.inc()
+                raise CircuitOpenError(
+                    key=key, retry_after=max(self.recovery_timeout - elapsed, 0)
+                )
+            state.probe_in_flight = True
+
+    def _record_success(self, key: str) -> None:
+        with self._lock:
+            self._states.pop(key, None)
+
+    def _record_failure(self, key: str) -> None:
+        with self._lock:
+            state = self._states.setdefault(key, _CircuitState())
+            state.failures += 1
+            if state.probe_in_flight or state.failures >= self.failure_threshold:
+                if state.opened_at is None or state.probe_in_flight:
+                    CIRCUIT_BREAKER_OPENED_TOTAL.inc()
+                state.opened_at = self._clock()
+                state.probe_in_flight = False
+
+    @contextmanager
+    def guard(self, key: str) -> Iterator[None]:
+        self._before_call(key)
+        try:
+            yield
+        except Exception as e:
+            if self.is_failure(e):
+                self._record_failure(key)
+            else:
+                # The service responded (e.g. with an invalid query error) so it is reachable
+                self._record_success(key)
+            raise
+        else:
+            self._record_success(key)
+
+
+class RetryBudget:
+    """Wall-clock budget (in seconds) for retrying calls within one conversation.
+
+    Time spent on failed attempts and waiting between them is consumed from the budget.
+    The budget is renewed 'window' seconds after it was first used.
+    """
+
+    def __init__(
+        self,
+        budget: float = 60.0,
+        window: float = 900.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.budget = budget
+        self.window = window
+        self._clock = clock
+        self._spent: Dict[int, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _get_spent(self, conv_id: int) -> float:
+        if conv_id not in self._spent:
+            return 0.0
+        window_start, spent = self._spent[conv_id]
+        if self._clock() - window_start > self.window:
+            del self._spent[conv_id]
+            return 0.0
+        return spent
+
+    def _prune(self) -> None:
+        # The conversations are not reused after they end, so the expired windows are removed here
+        now = self._clock()
+        for conv_id in [
+            conv_id
+            for conv_id, (window_start, _) in self._spent.items()
+            if now - window_start > self.window
+        ]:
+            del self._spent[conv_id]
+
+    def consume(self, conv_id: int, seconds: float) -> None:
+        with self._lock:
+            self._prune()
+            spent = self._get_spent(conv_id)
+            window_start = self._spent.get(conv_id, (self._clock(), 0.0))[0]
+            self._spent[conv_id] = (window_start, spent + seconds)
+
+    def remaining(self, conv_id: int) -> float:
+        with self._lock:
+            return self.budget - self._get_spent(conv_id)
+
+
+class GoogleAdsAPIError(ValueError):
+    def __init__(self, content: Any, status_code: Optional[int] = None) -> None:
+        self.status_code = status_code
+        super().__init__(content)
+
+
+TRANSIENT_STATUS_CODES = {502, 503, 504}
+TRANSIENT_GRPC_STATUSES = (
+    "StatusCode.UNAVAILABLE",
+    "StatusCode.DEADLINE_EXCEEDED",
+    "StatusCode.INTERNAL",
+    "StatusCode.RESOURCE_EXHAUSTED",
+)
+
+
+def is_transient_google_ads_error(e: BaseException) -> bool:
+    """Only outages count as circuit failures, invalid queries or missing permissions do not."""
+    if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(e, GoogleAdsAPIError) and e.status_code in TRANSIENT_STATUS_CODES:
+        return True
+    return any(status in str(e) for status in TRANSIENT_GRPC_STATUSES)
+
+
+GOOGLE_ADS_CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(
+    environ.get("GOOGLE_ADS_CIRCUIT_BREAKER_FAILURE_THRESHOLD", 5)
+)
+GOOGLE_ADS_CIRCUIT_BREAKER_RECOVERY_TIMEOUT = float(
+    environ.get("GOOGLE_ADS_CIRCUIT_BREAKER_RECOVERY_TIMEOUT", 60)
+)
+GOOGLE_ADS_RETRY_BUDGET_SECONDS = float(
+    environ.get("GOOGLE_ADS_RETRY_BUDGET_SECONDS", 60)
+)
+
+GOOGLE_ADS_CIRCUIT_BREAKER = CircuitBreaker(
+    failure_threshold=GOOGLE_ADS_CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+    recovery_timeout=GOOGLE_ADS_CIRCUIT_BREAKER_RECOVERY_TIMEOUT,
+    is_failure=is_transient_google_ads_error,
+)
+GOOGLE_ADS_RETRY_BUDGET = RetryBudget(budget=GOOGLE_ADS_RETRY_BUDGET_SECONDS)
+
+
+def get_circuit_key(function: Callable[..., Any], **kwargs: Any) -> str:
+    name = kwargs.get("endpoint") or getattr(
+        function, "__name__", type(function).__name__
+    )
+    customer_ids = kwargs.get("customer_ids")
+    if customer_ids:
+        customer = ",".join(sorted(customer_ids))
+    else:
+        model = kwargs.get("model") or kwargs.get("ad")
+        customer = (
+            getattr(model, "customer_id", None) or f"user:{kwargs.get('user_id')}"
+        )
+    return f"{name}:{customer}"
+
+
+def call_with_circuit_breaker(function: Callable[..., Any], **kwargs: Any) -> Any:
+    with GOOGLE_ADS_CIRCUIT_BREAKER.guard(get_circuit_key(function, **kwargs)):
+        return function(**kwargs)
+
+
+_BUDGET_MARK = "_retry_budget_mark"
+
+
+def consume_retry_budget(retry_state: RetryCallState) -> None:
+    """Tenacity 'after' callback which consumes the time of the failed attempts from the conversation budget."""
+    conv_id = retry_state.kwargs.get("conv_id")
+    now = time.monotonic()
+    mark = getattr(retry_state, _BUDGET_MARK, retry_state.start_time)
+    setattr(retry_state, _BUDGET_MARK, now)
+    if conv_id is not None:
+        GOOGLE_ADS_RETRY_BUDGET.consume(conv_id, now - mark)
+
+
+class stop_when_retry_budget_exhausted(stop_base):
+    """Stop retrying when the retry budget of the conversation ('conv_id' kwarg) is exhausted."""
+
+    def __call__(self, retry_state: RetryCallState) -> bool:
+        conv_id = retry_state.kwargs.get("conv_id")
+        if conv_id is None:
+            return False
+        return GOOGLE_ADS_RETRY_BUDGET.remaining(conv_id) <= 0
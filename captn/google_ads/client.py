@@ -5,7 +5,21 @@ from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Union
 from pydantic import BaseModel
 from requests import get as requests_get
 from requests import post as requests_post
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import (
+    retry,
+    retry_if_not_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+
+from .circuit_breaker import (
+    TRANSIENT_STATUS_CODES,
+    CircuitOpenError,
+    GoogleAdsAPIError,
+    call_with_circuit_breaker,
+    consume_retry_budget,
+    stop_when_retry_budget_exhausted,
+)
 
 BASE_URL = environ.get("CAPTN_BACKEND_URL", "http://localhost:9000")
 ALREADY_AUTHENTICATED = "User is already authenticated"
@@ -18,7 +32,9 @@ __all__ = (
     "list_sub_accounts",
     "execute_query",
     "get_user_ids_and_emails",
+    "get_authenticated_user_ids_and_emails",
     "google_ads_create_update",
+    "GoogleAdsAPIError",
 )
 
 
@@ -42,7 +58,7 @@ def get_conv_uuid(conv_id: int) -> str:
     }
     response = requests_get(f"{BASE_URL}/user-id-chat-uuid", params=params, timeout=60)
     if not response.ok:
-        raise ValueError(response.content)
+        raise GoogleAdsAPIError(response.content, status_code=response.status_code)
 
     return response.json()  # type: ignore[no-any-return]
 
@@ -75,7 +91,7 @@ def list_accessible_customers(
         f"{BASE_URL}/list-accessible-customers", params=params, timeout=60
     )
     if not response.ok:
-        raise ValueError(response.content)
+        raise GoogleAdsAPIError(response.content, status_code=response.status_code)
 
     respone_json = response.json()
     return respone_json  # type: ignore[no-any-return]
@@ -97,7 +113,7 @@ def list_accessible_customers_with_account_types(
         timeout=60,
     )
     if not response.ok:
-        raise ValueError(response.content)
+        raise GoogleAdsAPIError(response.content, status_code=response.status_code)
 
     return response.json()  # type: ignore[no-any-return]
 
@@ -180,6 +196,8 @@ def execute_query(
 
     response = requests_get(f"{BASE_URL}/search", params=params, timeout=60)
     if not response.ok:
+        if response.status_code in TRANSIENT_STATUS_CODES:
+            raise GoogleAdsAPIError(response.content, status_code=response.status_code)
         if AUTHENTICATION_ERROR in response.text:
             content = AUTHENTICATION_ERROR
         else:
@@ -192,7 +210,7 @@ def execute_query(
 If you have just created the account, please wait for a few hours before trying again.
 If the account has been active for a while, please check the account status in the Google Ads UI.
 """
-        raise ValueError(content)
+        raise GoogleAdsAPIError(content, status_code=response.status_code)
 
     response_json = response.json()
 
@@ -216,7 +234,19 @@ def get_user_ids_and_emails(day_of_week: Optional[str] = None) -> str:
         f"{BASE_URL}/get-user-ids-and-emails", params=params, timeout=60
     )
     if not response.ok:
-        raise ValueError(response.content)
+        raise GoogleAdsAPIError(response.content, status_code=response.status_code)
+    return response.json()  # type: ignore[no-any-return]
+
+
+def get_authenticated_user_ids_and_emails(day_of_week: Optional[str] = None) -> str:
+    params = {
+        "day_of_week_created": day_of_week,
+    }
+    response = requests_get(
+        f"{BASE_URL}/get-authenticated-user-ids-and-emails", params=params, timeout=60
+    )
+    if not response.ok:
+        raise GoogleAdsAPIError(response.content, status_code=response.status_code)
     return response.json()  # type: ignore[no-any-return]
 
 
@@ -346,7 +376,7 @@ def google_ads_create_update(
 
     response = requests_get(f"{BASE_URL}{endpoint}", params=params, timeout=60)
     if not response.ok:
-        raise ValueError(response.content)
+        raise GoogleAdsAPIError(response.content, status_code=response.status_code)
 
     response_dict: Union[Dict[str, Any], str] = response.json()
     return response_dict
@@ -385,15 +415,20 @@ def google_ads_post_or_get(
     )
 
     if not response.ok:
-        raise ValueError(response.content)
+        raise GoogleAdsAPIError(response.content, status_code=response.status_code)
 
     response_dict: Union[Dict[str, Any], str] = response.json()
     return response_dict
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(min=4, max=15))
+@retry(
+    stop=stop_after_attempt(3) | stop_when_retry_budget_exhausted(),
+    wait=wait_exponential(min=4, max=15),
+    retry=retry_if_not_exception_type(CircuitOpenError),
+    after=consume_retry_budget,
+)
 def google_ads_api_call(
     function: Callable[[Any], Union[Dict[str, Any], str]],
     **kwargs: Any,
 ) -> Union[Dict[str, Any], str]:
-    return function(**kwargs)  # type: ignore[call-arg]
+    return call_with_circuit_breaker(function, **kwargs)  # type: ignore[no-any-return]
@@ -1,4 +1,4 @@
-from prometheus_client import Counter
+from prometheus_client import Counter, Gauge, Histogram
 
 WEBSOCKET_REQUESTS = Counter(
     "websocket_requests_total", "Total count of websocket requests"
@@ -7,3 +7,26 @@ WEBSOCKET_REQUESTS = Counter(
 WEBSOCKET_TOKENS = Counter("websocket_tokens_total", "Total count of websocket tokens")
 
 PING_REQUESTS = Counter("ping_requests_total", "Total count of ping requests")
+
+WEBSOCKET_TIME_TO_FIRST_MESSAGE = Histogram(
+    "websocket_time_to_first_message_seconds",
+    "Histogram of the time from the request to the first message sent to the client (in seconds)",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+
+QUEUED_CONVERSATIONS = Gauge(
+    "websocket_queued_conversations",
+    "Number of conversations waiting for a free slot",
+)
+RUNNING_CONVERSATIONS = Gauge(
+    "websocket_running_conversations", "Number of conversations being processed"
+)
+CONVERSATION_QUEUE_WAIT_TIME = Histogram(
+    "websocket_conversation_queue_wait_time_seconds",
+    "Histogram of the time conversations waited for a free slot (in seconds)",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+REJECTED_CONVERSATIONS = Counter(
+    "websocket_rejected_conversations_total",
+    "Total count of conversations rejected because the queue was full",
+)
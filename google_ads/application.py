@@ -19,6 +19,7 @@ from google.protobuf import json_format
 
 from captn.captn_agents.helpers import get_db_connection, get_wasp_db_url
 
+from .cache import async_ttl_cache
 from .model import (
     AdBase,
     AdCopy,
@@ -55,24 +56,62 @@ oauth2_settings = {
 }
 
 
+ISO_DAYS_OF_WEEK = {
+    "Monday": 1,
+    "Tuesday": 2,
+    "Wednesday": 3,
+    "Thursday": 4,
+    "Friday": 5,
+    "Saturday": 6,
+    "Sunday": 7,
+}
+
+
+def _get_iso_day_of_week(day_of_week: str) -> int:
+    day_of_week = day_of_week.strip().capitalize()
+    if day_of_week not in ISO_DAYS_OF_WEEK:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid day of the week: {day_of_week}. Valid values are: {list(ISO_DAYS_OF_WEEK.keys())}",
+        )
+    return ISO_DAYS_OF_WEEK[day_of_week]
+
+
+# EXTRACT(ISODOW ...) on "createdAt" (timestamp without time zone) is immutable, so the
+# filter below can use the expression index from wasp_migrations/
+GET_USERS_CREATED_ON_DAY_OF_WEEK_QUERY = """SELECT * FROM "User"
+WHERE EXTRACT(ISODOW FROM "createdAt") = $1"""
+
+
 async def get_users(day_of_week_created: Optional[str] = None) -> Any:
     wasp_db_url = await get_wasp_db_url()
-    if day_of_week_created:
-        query = f"""SELECT * FROM "User"
-WHERE TRIM(TO_CHAR("createdAt", 'Day')) = '{day_of_week_created}'"""  # nosec: [B608]
-    else:
-        query = 'SELECT * from "User"'
     async with get_db_connection(db_url=wasp_db_url) as db:
-        users = await db.query_raw(query)
+        if day_of_week_created:
+            users = await db.query_raw(
+                GET_USERS_CREATED_ON_DAY_OF_WEEK_QUERY,
+                _get_iso_day_of_week(day_of_week_created),
+            )
+        else:
+            users = await db.query_raw('SELECT * from "User"')
 
     return users
 
 
+# Users and chats are never updated in a way that matters for these lookups, so they can be cached
+WASP_DB_CACHE_TTL = float(environ.get("WASP_DB_CACHE_TTL", 300))
+WASP_DB_CACHE_MAXSIZE = int(environ.get("WASP_DB_CACHE_MAXSIZE", 1024))
+
+
+@async_ttl_cache(
+    maxsize=WASP_DB_CACHE_MAXSIZE,
+    ttl=WASP_DB_CACHE_TTL,
+    key=lambda user_id: int(user_id),
+)
 async def get_user(user_id: Union[int, str]) -> Any:
     wasp_db_url = await get_wasp_db_url()
     async with get_db_connection(db_url=wasp_db_url) as db:
         user = await db.query_first(
-            f'SELECT * from "User" where id={user_id}'  # nosec: [B608]
+            'SELECT id, email FROM "User" WHERE id = $1', int(user_id)
         )
     if not user:
         raise HTTPException(status_code=404, detail=f"user_id {user_id} not found")
@@ -94,16 +133,21 @@ async def get_user(user_id: Union[int, str]) -> Any:
 #     return user_id, chat_id
 
 
+@async_ttl_cache(
+    maxsize=WASP_DB_CACHE_MAXSIZE,
+    ttl=WASP_DB_CACHE_TTL,
+    key=lambda chat_id: int(chat_id),
+)
 async def get_user_id_chat_uuid_from_chat_id(
     chat_id: Union[int, str],
 ) -> Tuple[int, str]:
     wasp_db_url = await get_wasp_db_url()
     async with get_db_connection(db_url=wasp_db_url) as db:
         chat = await db.query_first(
-            f'SELECT * from "Chat" where id={chat_id}'  # nosec: [B608]
+            'SELECT "userId", uuid FROM "Chat" WHERE id = $1', int(chat_id)
         )
         if not chat:
-            raise HTTPException(status_code=404, detail=f"chat {chat} not found")
+            raise HTTPException(status_code=404, detail=f"chat {chat_id} not found")
     user_id = chat["userId"]
     chat_uuid = chat["uuid"]
     return user_id, chat_uuid
@@ -415,6 +459,28 @@ async def get_user_ids_and_emails(day_of_week_created: Optional[str] = None) ->
     return json.dumps(id_email_dict)
 
 
+async def get_authenticated_users(day_of_week_created: Optional[str] = None) -> Any:
+    # "User" (Wasp DB) and "GAuth" (app DB) live in different databases, so they are joined here
+    users = await get_users(day_of_week_created=day_of_week_created)
+    if not users:
+        return []
+    async with get_db_connection() as db:
+        gauths = await db.gauth.find_many(
+            where={"user_id": {"in": [user["id"] for user in users]}}
+        )
+    authenticated_user_ids = {gauth.user_id for gauth in gauths}
+    return [user for user in users if user["id"] in authenticated_user_ids]
+
+
+@router.get("/get-authenticated-user-ids-and-emails")
+async def get_authenticated_user_ids_and_emails(
+    day_of_week_created: Optional[str] = None,
+) -> str:
+    users = await get_authenticated_users(day_of_week_created=day_of_week_created)
+    id_email_dict = {user["id"]: user["email"] for user in users}
+    return json.dumps(id_email_dict)
+
+
 AVALIABLE_KEYS = ["campaign", "ad_group", "ad_group_ad", "ad_group_criterion"]
 
 
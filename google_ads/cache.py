@@ -0,0 +1,123 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Generic,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+__all__ = ("TTLCache", "async_ttl_cache")
+
+T = TypeVar("T")
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """Size bounded LRU cache whose entries expire 'ttl' seconds after they were set.
+
+    If 'refresh_on_get' is set, the entries expire 'ttl' seconds after they were last used
+    instead. Iterating over the cache starts with the least recently used entry. Used by the
+    Wasp DB lookups, the LLM response cache and the team registry.
+    """
+
+    def __init__(
+        self,
+        maxsize: float = math.inf,
+        ttl: float = math.inf,
+        clock: Callable[[], float] = time.monotonic,
+        refresh_on_get: bool = False,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.refresh_on_get = refresh_on_get
+        self._clock = clock
+        self._data: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        with self._lock:
+            if key not in self._data:
+                return default
+            timestamp, value = self._data[key]
+            now = self._clock()
+            if now - timestamp >= self.ttl:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            if self.refresh_on_get:
+                self._data[key] = (now, value)
+            return value
+
+    def peek(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """The value of the entry without using it, even if it expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            return default if entry is None else entry[1]
+
+    def set(self, key: K, value: V) -> List[K]:
+        """Returns the least recently used keys which were evicted to stay within 'maxsize'."""
+        with self._lock:
+            self._data[key] = (self._clock(), value)
+            self._data.move_to_end(key)
+            evicted = []
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False)[0])
+            return evicted
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def age(self, key: K) -> float:
+        """Seconds since the entry was set (or last used, if 'refresh_on_get')."""
+        with self._lock:
+            return self._clock() - self._data[key][0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._data
+
+    def __iter__(self) -> Iterator[K]:
+        with self._lock:
+            return iter(list(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def async_ttl_cache(
+    maxsize: int, ttl: float, key: Callable[..., Hashable]
+) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Cache the results of an async function. Exceptions (e.g. 404s) are not cached."""
+
+    def decorator(f: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        cache: TTLCache[Hashable, T] = TTLCache(maxsize=maxsize, ttl=ttl)
+
+        @wraps(f)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            cache_key = key(*args, **kwargs)
+            value = cache.get(cache_key)
+            if value is None:
+                value = await f(*args, **kwargs)
+                cache.set(cache_key, value)
+            return value
+
+        wrapper.cache = cache  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
@@ -0,0 +1,10 @@
+-- CreateTable
+CREATE TABLE "DailyMetrics" (
+    "customer_id" TEXT NOT NULL,
+    "resource" TEXT NOT NULL,
+    "date" TEXT NOT NULL,
+    "rows" JSONB NOT NULL,
+    "fetched_at" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "DailyMetrics_pkey" PRIMARY KEY ("customer_id","resource","date")
+);
@@ -0,0 +1,12 @@
+-- CreateTable
+CREATE TABLE "WeeklyAnalysisLease" (
+    "date" TEXT NOT NULL,
+    "user_id" INTEGER NOT NULL,
+    "owner" TEXT NOT NULL,
+    "status" TEXT NOT NULL,
+    "expires_at" TIMESTAMP(3) NOT NULL,
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "WeeklyAnalysisLease_pkey" PRIMARY KEY ("date","user_id")
+);
@@ -0,0 +1,14 @@
+-- CreateTable
+CREATE TABLE "WeeklyAnalysisCheckpoint" (
+    "date" TEXT NOT NULL,
+    "user_id" INTEGER NOT NULL,
+    "stage" TEXT NOT NULL,
+    "conv_id" INTEGER,
+    "conv_uuid" TEXT,
+    "weekly_report" TEXT,
+    "team_result" TEXT,
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "WeeklyAnalysisCheckpoint_pkey" PRIMARY KEY ("date","user_id")
+);
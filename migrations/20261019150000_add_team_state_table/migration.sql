@@ -0,0 +1,12 @@
+-- CreateTable
+CREATE TABLE "TeamState" (
+    "team_name" TEXT NOT NULL,
+    "user_id" INTEGER NOT NULL,
+    "conv_id" INTEGER NOT NULL,
+    "version" INTEGER NOT NULL,
+    "state" TEXT NOT NULL,
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "TeamState_pkey" PRIMARY KEY ("team_name")
+);
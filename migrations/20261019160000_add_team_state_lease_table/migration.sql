@@ -0,0 +1,10 @@
+-- CreateTable
+CREATE TABLE "TeamStateLease" (
+    "team_name" TEXT NOT NULL,
+    "owner" TEXT NOT NULL,
+    "expires_at" TIMESTAMP(3) NOT NULL,
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "TeamStateLease_pkey" PRIMARY KEY ("team_name")
+);
@@ -7,11 +7,22 @@ fi
 
 echo NUM_WORKERS set to $NUM_WORKERS
 
+# With multiple workers the conversations are shared between them through the database
+if [[ "${NUM_WORKERS}" -gt 1 && -z "${TEAM_STATE_STORE}" ]]; then
+  export TEAM_STATE_STORE=postgres
+fi
+
 cat <<< "$CLIENT_SECRET" > client_secret.json
 
 prisma migrate deploy
 prisma generate
 
+# Indexes on the Wasp DB tables which are queried by this service (all statements are idempotent)
+WASP_DATABASE_URL="${DATABASE_URL%/*}/${WASP_DB_NAME:-waspdb}"
+for migration in wasp_migrations/*/migration.sql; do
+  prisma db execute --file "$migration" --url "$WASP_DATABASE_URL"
+done
+
 # python3 ws_application.py > ws.log 2>&1 &
 # tail -f ws.log &
 
@@ -17,6 +17,13 @@ import captn.captn_agents.backend.benchmarking.weekly_analysis_team
 from captn.captn_agents.backend.benchmarking.base import (
     app,
 )
+from captn.captn_agents.backend.benchmarking.team_construction import (
+    benchmark_team_construction,
+)
+from captn.captn_agents.backend.benchmarking.weekly_report_email import (
+    benchmark_weekly_report_email,
+    create_synthetic_weekly_report,
+)
 
 runner = CliRunner()
 
@@ -317,3 +324,36 @@ class TestWeeklyAnalysis:
             success=success,
             no_rows=10,
         )
+
+
+class TestWeeklyReportEmail:
+    def test_create_synthetic_weekly_report(self) -> None:
+        weekly_report = create_synthetic_weekly_report(
+            customers=50, campaigns_per_customer=2, ads_per_campaign=3
+        )
+
+        customer_reports = weekly_report["weekly_customer_reports"]
+        assert len(customer_reports) == 50
+        assert len({report["customer_id"] for report in customer_reports}) == 50
+        assert all(len(report["campaigns"]) == 2 for report in customer_reports)
+
+    def test_benchmark_weekly_report_email(self) -> None:
+        result = benchmark_weekly_report_email(customers=2, repeat=3)
+
+        assert result["customers"] == 2
+        assert result["repeat"] == 3
+        assert 0 < result["min"] <= result["mean"] <= result["max"]
+
+    def test_benchmark_team_construction(self) -> None:
+        results = benchmark_team_construction(
+            repeat=2, team_names=["default_team", "brief_creation_team"]
+        )
+
+        assert {result["team"] for result in results} == {
+            "default_team",
+            "brief_creation_team",
+        }
+        for result in results:
+            assert "error" not in result
+            assert result["repeat"] == 2
+            assert 0 < result["min"] <= result["mean"] <= result["max"]
@@ -20,14 +20,14 @@ class TestCampaignCreationTeam:
         )
 
         agent_number_of_functions_dict = {
-            "copywriter": 7,
-            "account_manager": 7,
+            "copywriter": 8,
+            "account_manager": 8,
             "user_proxy": 0,
         }
 
         helper_test_init(
             team=campaign_creation_team,
-            number_of_registered_executions=7,
+            number_of_registered_executions=8,
             agent_number_of_functions_dict=agent_number_of_functions_dict,
             team_class=CampaignCreationTeam,
         )
@@ -12,16 +12,16 @@ class TestGoogleAdsTeam:
         )
 
         agent_number_of_functions_dict = {
-            "google_ads_specialist": 21,
-            "copywriter": 21,
-            "digital_strategist": 21,
-            "account_manager": 21,
+            "google_ads_specialist": 22,
+            "copywriter": 22,
+            "digital_strategist": 22,
+            "account_manager": 22,
             "user_proxy": 0,
         }
 
         helper_test_init(
             team=google_ads_team,
-            number_of_registered_executions=21,
+            number_of_registered_executions=22,
             agent_number_of_functions_dict=agent_number_of_functions_dict,
             team_class=GoogleAdsTeam,
         )
@@ -0,0 +1,116 @@
+from typing import Any, Dict, List
+
+import autogen
+
+from captn.captn_agents.backend.teams import GoogleAdsTeam, Team
+from captn.captn_agents.backend.teams._history_compaction import HistoryCompaction
+from captn.captn_agents.backend.teams._token_counter import MessageTokenCounter
+
+
+class FakeEncoding:
+    def encode(self, text: str) -> List[int]:
+        return [len(word) for word in text.split()]
+
+
+def _create_compaction(**kwargs: Any) -> HistoryCompaction:
+    return HistoryCompaction(
+        token_counter=MessageTokenCounter(encode=FakeEncoding().encode),
+        min_message_tokens=100,
+        head_chars=20,
+        tail_chars=10,
+        **kwargs,
+    )
+
+
+def _tool_call(call_id: str, name: str) -> Dict[str, Any]:
+    return {
+        "content": None,
+        "role": "assistant",
+        "tool_calls": [
+            {
+                "id": call_id,
+                "type": "function",
+                "function": {"name": name, "arguments": "{}"},
+            }
+        ],
+    }
+
+
+def _tool_response(call_id: str, content: str) -> Dict[str, Any]:
+    return {
+        "content": content,
+        "role": "tool",
+        "tool_responses": [
+            {"tool_call_id": call_id, "role": "tool", "content": content}
+        ],
+    }
+
+
+LONG_CONTENT = " ".join(f"row{i}" for i in range(500))
+
+
+def _create_messages() -> List[Dict[str, Any]]:
+    return [
+        {"content": f"Optimize my campaigns {LONG_CONTENT}", "role": "user"},
+        _tool_call("call_1", "execute_query"),
+        _tool_response("call_1", LONG_CONTENT),
+        _tool_call("call_2", "ask_client_for_permission"),
+        _tool_response("call_2", LONG_CONTENT),
+        {"content": LONG_CONTENT, "role": "user", "name": "account_manager"},
+        {"content": LONG_CONTENT, "role": "user", "name": "copywriter"},
+    ]
+
+
+def test_short_history_is_not_compacted() -> None:
+    compaction = _create_compaction(max_tokens=100_000, keep_last_messages=1)
+    messages = _create_messages()
+
+    assert compaction.apply_transform(messages) is messages
+
+
+def test_old_messages_are_compacted() -> None:
+    compaction = _create_compaction(max_tokens=1000, keep_last_messages=1)
+    messages = _create_messages()
+    original = [message.copy() for message in messages]
+
+    compacted = compaction.apply_transform(messages)
+
+    # the history of the group chat is not changed
+    assert messages == original
+    assert len(compacted) == len(messages)
+    counter = compaction.token_counter
+    assert counter.count(compacted) < counter.count(messages)
+
+    # the initial task, the client approval and the last message are verbatim
+    for i in (0, 3, 4, 6):
+        assert compacted[i] == messages[i]
+
+    query_result = compacted[2]["tool_responses"][0]
+    assert query_result["tool_call_id"] == "call_1"
+    assert query_result["content"].startswith(LONG_CONTENT[:20])
+    assert query_result["content"].endswith(LONG_CONTENT[-10:])
+    assert "tokens of this message were removed" in query_result["content"]
+    assert compacted[5]["content"] != messages[5]["content"]
+
+
+def test_compaction_stops_below_the_limit() -> None:
+    compaction = _create_compaction(max_tokens=0, keep_last_messages=1)
+    messages = _create_messages()
+    compaction.max_tokens = compaction.token_counter.count(messages) - 1
+
+    compacted = compaction.apply_transform(messages)
+
+    # the oldest message is compacted first
+    assert compacted[2] != messages[2]
+    assert compacted[5] == messages[5]
+
+
+def test_team_compacts_the_history() -> None:
+    Team._teams.clear()
+    team = GoogleAdsTeam(user_id=1, conv_id=2, task="Optimize my campaigns")
+    member = team.members[0]
+    assert isinstance(member, autogen.ConversableAgent)
+
+    assert team.groupchat._speaker_selection_transforms is not None
+    assert len(member.hook_lists["process_all_messages_before_reply"]) == 2
+    Team._teams.clear()
@@ -0,0 +1,134 @@
+import unittest.mock
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import pytest
+from prometheus_client import REGISTRY
+
+from captn.captn_agents.backend.teams import GoogleAdsTeam, Team
+from captn.captn_agents.backend.teams._llm_cache import (
+    DiskLLMCache,
+    InMemoryLLMCache,
+    LLMCache,
+    SQLiteLLMCache,
+    create_llm_cache,
+)
+from captn.captn_agents.backend.teams._token_counter import current_team_name
+from tests.ci.conftest import FakeClock
+
+
+class FakeUsage:
+    total_tokens = 100
+
+
+class FakeResponse:
+    usage = FakeUsage()
+    cost = 0.5
+
+
+@pytest.fixture(params=["memory", "disk", "sqlite"])
+def cache_and_clock(request: Any, tmp_path: Path, clock: FakeClock) -> Iterator[Any]:
+    kwargs = {"max_entries": 2, "ttl": 60, "clock": clock}
+    cache: LLMCache
+    if request.param == "memory":
+        cache = InMemoryLLMCache(**kwargs)
+    elif request.param == "disk":
+        cache = DiskLLMCache(tmp_path / "disk", **kwargs)
+    else:
+        cache = SQLiteLLMCache(tmp_path / "llm_cache.sqlite", **kwargs)
+    yield cache, clock
+
+
+def _sample(name: str, **labels: str) -> float:
+    value: Optional[float] = REGISTRY.get_sample_value(name, labels)
+    return 0.0 if value is None else value
+
+
+def test_get_and_set(cache_and_clock: Any) -> None:
+    cache, _ = cache_and_clock
+
+    with cache as c:
+        assert c.get("key") is None
+        assert c.get("key", "default") == "default"
+        c.set("key", {"content": "response"})
+    # the cache is still open after the context of the request
+    with cache as c:
+        assert c.get("key") == {"content": "response"}
+
+
+def test_responses_expire(cache_and_clock: Any) -> None:
+    cache, clock = cache_and_clock
+
+    cache.set("key", "response")
+    clock.now += 30
+    assert cache.get("key") == "response"
+    clock.now += 31
+    assert cache.get("key") is None
+
+
+def test_number_of_responses_is_limited(cache_and_clock: Any) -> None:
+    cache, clock = cache_and_clock
+    before = _sample("llm_cache_evictions_total", reason="size")
+
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+        clock.now += 1
+
+    assert cache.get("a") is None
+    assert cache.get("b") == "b"
+    assert cache.get("c") == "c"
+    assert _sample("llm_cache_evictions_total", reason="size") == before + 1
+
+
+def test_least_recently_used_is_evicted(clock: FakeClock) -> None:
+    cache = InMemoryLLMCache(max_entries=2, clock=clock)
+
+    cache.set("a", "a")
+    cache.set("b", "b")
+    assert cache.get("a") == "a"
+    cache.set("c", "c")
+
+    assert cache.get("a") == "a"
+    assert cache.get("b") is None
+
+
+def test_hits_and_savings_are_counted() -> None:
+    cache = InMemoryLLMCache()
+    team = "TestLLMCacheTeam"
+    token = current_team_name.set(team)
+    try:
+        cache.get("key")
+        cache.set("key", FakeResponse())
+        cache.get("key")
+    finally:
+        current_team_name.reset(token)
+
+    assert _sample("llm_cache_requests_total", team=team, result="miss") == 1
+    assert _sample("llm_cache_requests_total", team=team, result="hit") == 1
+    assert _sample("llm_cache_saved_tokens_total", team=team) == 100
+    assert _sample("llm_cache_saved_cost_total", team=team) == 0.5
+
+
+def test_create_llm_cache(tmp_path: Path) -> None:
+    assert create_llm_cache("") is None
+    assert isinstance(create_llm_cache("memory"), InMemoryLLMCache)
+    assert isinstance(create_llm_cache("disk", str(tmp_path)), DiskLLMCache)
+    assert isinstance(create_llm_cache("sqlite", str(tmp_path)), SQLiteLLMCache)
+    with pytest.raises(ValueError):
+        create_llm_cache("redis")
+
+
+@pytest.mark.parametrize(
+    ("llm_cache_teams", "expected"), [((), False), (("default_team",), True)]
+)
+def test_teams_opt_in(llm_cache_teams: Any, expected: bool) -> None:
+    cache = InMemoryLLMCache()
+    Team._teams.clear()
+    with (
+        unittest.mock.patch.object(Team, "llm_cache", cache),
+        unittest.mock.patch.object(Team, "llm_cache_teams", llm_cache_teams),
+    ):
+        team = GoogleAdsTeam(user_id=1, conv_id=2, task="Optimize my campaigns")
+
+    assert (team.manager.client_cache is cache) == expected
+    Team._teams.clear()
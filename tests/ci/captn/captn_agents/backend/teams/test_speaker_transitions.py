@@ -0,0 +1,177 @@
+import unittest.mock
+from typing import Any, Dict, List, Optional, Tuple
+
+import autogen
+import pytest
+from prometheus_client import REGISTRY
+
+from captn.captn_agents.backend.teams import BriefCreationTeam, GoogleAdsTeam, Team
+from captn.captn_agents.backend.teams._speaker_transitions import SpeakerTransitions
+from captn.captn_agents.backend.teams._token_counter import current_team_name
+
+
+@pytest.fixture()
+def google_ads_team() -> Any:
+    Team._teams.clear()
+    yield GoogleAdsTeam(user_id=1, conv_id=2, task="Optimize my campaigns")
+    Team._teams.clear()
+
+
+@pytest.fixture()
+def brief_creation_team() -> Any:
+    Team._teams.clear()
+    yield BriefCreationTeam(user_id=1, conv_id=2, task="Create a brief")
+    Team._teams.clear()
+
+
+def _sample(name: str, **labels: str) -> float:
+    value: Optional[float] = REGISTRY.get_sample_value(name, labels)
+    return 0.0 if value is None else value
+
+
+def _message(name: str, content: str = "Hello") -> Dict[str, Any]:
+    return {"content": content, "role": "user", "name": name}
+
+
+def _tool_call(name: str, call_id: str, tool: str) -> Dict[str, Any]:
+    return {
+        "content": None,
+        "role": "assistant",
+        "name": name,
+        "tool_calls": [
+            {
+                "id": call_id,
+                "type": "function",
+                "function": {"name": tool, "arguments": "{}"},
+            }
+        ],
+    }
+
+
+def _tool_response(call_id: str) -> Dict[str, Any]:
+    return {
+        "content": "Result",
+        "role": "tool",
+        "name": "user_proxy",
+        "tool_responses": [
+            {"tool_call_id": call_id, "role": "tool", "content": "Result"}
+        ],
+    }
+
+
+def _select_speakers(
+    team: Team, messages: List[Dict[str, Any]]
+) -> Tuple[List[str], int]:
+    """Selects the speaker after every message, returns the speakers and the number of LLM selections.
+
+    The LLM selects the speaker of the following message.
+    """
+    groupchat = team.groupchat
+    speakers = []
+    llm_selections = 0
+    for i, message in enumerate(messages[:-1]):
+        groupchat.messages.append(message)
+        next_speaker = groupchat.agent_by_name(messages[i + 1]["name"])
+
+        with unittest.mock.patch.object(
+            groupchat, "_auto_select_speaker", return_value=next_speaker
+        ) as mock_auto_select_speaker:
+            speaker = groupchat.select_speaker(
+                groupchat.agent_by_name(message["name"]), team.manager
+            )
+        llm_selections += mock_auto_select_speaker.call_count
+        speakers.append(speaker.name)
+
+    return speakers, llm_selections
+
+
+def test_default_transitions_allow_repeating_except_user_proxy(
+    google_ads_team: GoogleAdsTeam,
+) -> None:
+    graph = google_ads_team.groupchat.allowed_speaker_transitions_dict
+
+    for agent, allowed in graph.items():
+        if isinstance(agent, autogen.UserProxyAgent):
+            assert agent not in allowed
+            assert len(allowed) == len(google_ads_team.members) - 1
+        else:
+            assert allowed == google_ads_team.members
+
+
+def test_unknown_member_in_transitions(google_ads_team: GoogleAdsTeam) -> None:
+    speaker_transitions = SpeakerTransitions({"Copywriter": ["Designer"]})
+
+    with pytest.raises(ValueError, match="Unknown member 'Designer'"):
+        speaker_transitions.allowed_transitions(google_ads_team.members)
+
+
+def test_tool_responses_go_back_to_the_caller(
+    google_ads_team: GoogleAdsTeam,
+) -> None:
+    messages = [
+        _message("account_manager", "Optimize my campaigns"),
+        _tool_call("google_ads_specialist", "call_1", "execute_query"),
+        _tool_response("call_1"),
+        _tool_call("google_ads_specialist", "call_2", "execute_query"),
+        _tool_response("call_2"),
+        _message("google_ads_specialist", "The campaigns are ..."),
+    ]
+
+    speakers, llm_selections = _select_speakers(google_ads_team, messages)
+
+    assert speakers == [message["name"] for message in messages[1:]]
+    # only the first speaker is ambiguous
+    assert llm_selections == 1
+
+
+def test_two_members_take_turns(brief_creation_team: BriefCreationTeam) -> None:
+    messages = [
+        _message("account_manager", "Create a brief"),
+        _message("digitial_marketing_strategist"),
+        _tool_call("account_manager", "call_1", "get_brief_template"),
+        _tool_response("call_1"),
+        _message("account_manager"),
+        _message("digitial_marketing_strategist"),
+    ]
+    team = "TestSpeakerTransitionsTeam"
+    rule_before = _sample(
+        "groupchat_speaker_selections_total", team=team, method="rule"
+    )
+
+    token = current_team_name.set(team)
+    try:
+        speakers, llm_selections = _select_speakers(brief_creation_team, messages)
+    finally:
+        current_team_name.reset(token)
+
+    assert speakers == [message["name"] for message in messages[1:]]
+    assert llm_selections == 0
+    assert (
+        _sample("groupchat_speaker_selections_total", team=team, method="rule")
+        == rule_before + 5
+    )
+
+
+def test_llm_selections_before_and_after(google_ads_team: GoogleAdsTeam) -> None:
+    messages = [
+        _message("account_manager", "Optimize my campaigns"),
+        _tool_call("google_ads_specialist", "call_1", "execute_query"),
+        _tool_response("call_1"),
+        _message("google_ads_specialist", "The campaigns are ..."),
+        _tool_call("account_manager", "call_2", "ask_client_for_permission"),
+        _tool_response("call_2"),
+        _message("account_manager", "The client approved the changes."),
+        _tool_call("google_ads_specialist", "call_3", "execute_query"),
+        _tool_response("call_3"),
+        _tool_call("account_manager", "call_4", "reply_to_client"),
+    ]
+
+    _, llm_selections = _select_speakers(google_ads_team, messages)
+
+    google_ads_team.groupchat.messages.clear()
+    google_ads_team.groupchat.speaker_selection_method = "auto"
+    _, llm_selections_without_rules = _select_speakers(google_ads_team, messages)
+
+    # the tool responses are not followed by an LLM selection anymore
+    assert llm_selections_without_rules == 6
+    assert llm_selections == 3
@@ -4,8 +4,10 @@ from unittest.mock import MagicMock
 
 import autogen
 import httpx
+import openai
 import pytest
 
+from captn.captn_agents.backend.retry_policy import RETRY_POLICY
 from captn.captn_agents.backend.teams._team import Team
 
 
@@ -168,6 +170,37 @@ Do NOT try to finish the task until other team members give their opinion.
             assert team.manager.send.call_count == number_of_exceptions + 1
             assert team.manager.initiate_chat.call_count == 2
 
+    def test_initiate_chat_stops_retrying_at_the_deadline(self) -> None:
+        team = Team(roles=TestTeam.roles, user_id=123, conv_id=456)
+        team.initial_message = "Initial message"
+        team.manager = MagicMock()
+        team.manager.initiate_chat.side_effect = httpx.ReadTimeout("Timeout")
+        team.groupchat = MagicMock()
+
+        with unittest.mock.patch.object(RETRY_POLICY, "timeout", 0):
+            with pytest.raises(TimeoutError):
+                team.initiate_chat(delay=0)
+
+        team.manager.send.assert_not_called()
+        team.manager.initiate_chat.assert_called_once()
+
+    def test_initiate_chat_does_not_retry_permanent_errors(self) -> None:
+        team = Team(roles=TestTeam.roles, user_id=123, conv_id=456)
+        team.initial_message = "Initial message"
+        team.manager = MagicMock()
+        team.manager.initiate_chat.side_effect = openai.AuthenticationError(
+            "Incorrect API key provided",
+            response=MagicMock(status_code=401, headers={}),
+            body=None,
+        )
+        team.groupchat = MagicMock()
+
+        with pytest.raises(openai.AuthenticationError):
+            team.initiate_chat(delay=0)
+
+        team.manager.send.assert_not_called()
+        team.manager.initiate_chat.assert_called_once()
+
     @pytest.mark.parametrize("num_of_messages", [2, 5, 10])
     def test_max_number_of_messages(self, num_of_messages) -> None:
         max_round = 5
@@ -0,0 +1,147 @@
+from typing import Any, List
+
+import autogen
+from autogen.io.base import IOStream
+
+from captn.captn_agents.backend.teams import GoogleAdsTeam, ProgressEvent, Team
+from captn.captn_agents.backend.teams._team_progress import (
+    ProgressHooks,
+    stream_progress,
+    stream_reply_tokens,
+)
+
+
+class FakeIOStream:
+    def __init__(self) -> None:
+        self.printed: List[Any] = []
+
+    def print(
+        self, *objects: Any, sep: str = " ", end: str = "\n", flush: bool = False
+    ) -> None:
+        self.printed.append(sep.join(map(str, objects)) + end)
+
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        return ""
+
+
+def _create_agents() -> List[autogen.ConversableAgent]:
+    agents = [
+        autogen.ConversableAgent(name=name, llm_config=False)
+        for name in ("account_manager", "user_proxy")
+    ]
+    ProgressHooks().register(agents)
+    return agents
+
+
+def _events(events: List[ProgressEvent]) -> List[Any]:
+    return [(e.event, e.agent, e.tool, e.content) for e in events]
+
+
+def test_turns_and_tool_calls_are_reported() -> None:
+    account_manager, user_proxy = _create_agents()
+    events: List[ProgressEvent] = []
+
+    with stream_progress(events.append):
+        account_manager.process_all_messages_before_reply([])
+        account_manager.send(
+            {
+                "content": None,
+                "role": "assistant",
+                "tool_calls": [
+                    {
+                        "id": "call_1",
+                        "type": "function",
+                        "function": {"name": "list_campaigns", "arguments": "{}"},
+                    }
+                ],
+            },
+            user_proxy,
+            request_reply=False,
+            silent=True,
+        )
+        account_manager.send(
+            {
+                "content": None,
+                "role": "assistant",
+                "tool_calls": [
+                    {
+                        "id": "call_2",
+                        "type": "function",
+                        "function": {"name": "list_campaigns", "arguments": "{}"},
+                    }
+                ],
+            },
+            user_proxy,
+            request_reply=False,
+        )
+        user_proxy.send(
+            {
+                "role": "tool",
+                "content": "Campaign A",
+                "tool_responses": [
+                    {"tool_call_id": "call_2", "role": "tool", "content": "Campaign A"}
+                ],
+            },
+            account_manager,
+            request_reply=False,
+        )
+
+    assert _events(events) == [
+        ("agent_turn_started", "account_manager", None, None),
+        ("tool_call_started", "account_manager", "list_campaigns", None),
+        ("tool_call_finished", "user_proxy", "list_campaigns", None),
+    ]
+    assert all(event.team == "unknown" for event in events)
+
+
+def test_nothing_is_reported_without_callback() -> None:
+    account_manager, _ = _create_agents()
+    events: List[ProgressEvent] = []
+
+    with stream_progress(events.append):
+        pass
+    account_manager.process_all_messages_before_reply([])
+
+    assert events == []
+
+
+def test_reply_tokens_are_reported_for_team_members() -> None:
+    account_manager, user_proxy = _create_agents()
+    events: List[ProgressEvent] = []
+    iostream = FakeIOStream()
+
+    with IOStream.set_default(iostream), stream_progress(events.append):
+        account_manager.process_all_messages_before_reply([])
+        with stream_reply_tokens():
+            IOStream.get_default().print("\033[32m", end="")
+            IOStream.get_default().print("Hello", end="", flush=True)
+            IOStream.get_default().print(" there", end="", flush=True)
+            IOStream.get_default().print("\033[0m\n")
+        account_manager.send("Hello there", user_proxy, request_reply=False)
+
+        # e.g. the speaker selection of the manager
+        with stream_reply_tokens():
+            IOStream.get_default().print("account_manager", end="", flush=True)
+
+    assert _events(events) == [
+        ("agent_turn_started", "account_manager", None, None),
+        ("reply_token", "account_manager", None, "Hello"),
+        ("reply_token", "account_manager", None, " there"),
+    ]
+    # the tokens are sent only once, as the progress events
+    assert iostream.printed[:2] == ["\033[32m", "\033[0m\n\n"]
+    assert "Hello" not in iostream.printed
+    assert "account_manager" in iostream.printed
+
+
+def test_team_members_report_progress() -> None:
+    Team._teams.clear()
+    team = GoogleAdsTeam(user_id=1, conv_id=2, task="Optimize my campaigns")
+    events: List[ProgressEvent] = []
+
+    with stream_progress(events.append):
+        for member in team.members:
+            member.process_all_messages_before_reply([])
+
+    assert [e.agent for e in events] == [member.name for member in team.members]
+    Team._teams.clear()
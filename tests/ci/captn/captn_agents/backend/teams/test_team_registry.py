@@ -0,0 +1,270 @@
+import os
+import threading
+import time
+import unittest.mock
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any, Iterator, List
+
+import pytest
+
+from captn.captn_agents.backend.teams import GoogleAdsTeam, Team
+from captn.captn_agents.backend.teams._team_registry import (
+    TEAM_HIBERNATION_TTL,
+    TEAM_MEMORY_OVERHEAD,
+    TeamRegistry,
+    estimate_team_memory,
+)
+from captn.captn_agents.backend.teams._team_state_store import FileTeamStateStore
+from tests.ci.conftest import FakeClock
+
+
+class FakeTeam:
+    def __init__(self, can_hibernate: bool = True) -> None:
+        self.can_hibernate = can_hibernate
+        self.hibernated = False
+
+    def hibernate(self) -> bool:
+        self.hibernated = self.can_hibernate
+        return self.can_hibernate
+
+
+@pytest.fixture()
+def registry(clock: FakeClock) -> TeamRegistry:
+    return TeamRegistry(
+        max_teams=3, idle_ttl=100, max_memory=10 * TEAM_MEMORY_OVERHEAD, clock=clock
+    )
+
+
+def _add_teams(
+    registry: TeamRegistry, clock: FakeClock, n: int, start: int = 0
+) -> List[Any]:
+    teams = []
+    for i in range(start, start + n):
+        team = FakeTeam()
+        registry[f"1_{i}"] = team  # type: ignore[assignment]
+        teams.append(team)
+        clock.now += 1
+    return teams
+
+
+class TestTeamRegistry:
+    def test_least_recently_used_teams_are_evicted(
+        self, clock: FakeClock, registry: TeamRegistry
+    ) -> None:
+        teams = _add_teams(registry, clock, 3)
+        assert registry["1_0"] is teams[0]
+
+        _add_teams(registry, clock, 1, start=3)
+
+        assert list(registry) == ["1_2", "1_0", "1_3"]
+        assert [team.hibernated for team in teams] == [False, True, False]
+
+    def test_idle_teams_are_evicted(
+        self, clock: FakeClock, registry: TeamRegistry
+    ) -> None:
+        _add_teams(registry, clock, 2)
+
+        clock.now += 99
+        assert registry.evict() == ["1_0"]
+        assert registry.evict() == []
+        clock.now += 1
+        assert registry.evict() == ["1_1"]
+        assert len(registry) == 0
+
+    def test_teams_are_evicted_above_memory_limit(
+        self, clock: FakeClock, registry: TeamRegistry
+    ) -> None:
+        registry.max_teams = 100
+        registry.max_memory = 2 * TEAM_MEMORY_OVERHEAD
+        _add_teams(registry, clock, 3)
+
+        assert list(registry) == ["1_1", "1_2"]
+        assert registry.memory == 2 * TEAM_MEMORY_OVERHEAD
+
+    def test_teams_in_use_are_not_evicted(
+        self, clock: FakeClock, registry: TeamRegistry
+    ) -> None:
+        with registry.in_use("1_0"):
+            _add_teams(registry, clock, 5)
+            assert list(registry) == ["1_0", "1_3", "1_4"]
+            clock.now += 1000
+            assert registry.evict() == ["1_3", "1_4"]
+
+        # the team was used until now
+        assert list(registry) == ["1_0"]
+        clock.now += 1000
+        assert registry.evict() == ["1_0"]
+
+    def test_teams_which_cannot_be_hibernated_are_not_evicted(
+        self, clock: FakeClock, registry: TeamRegistry
+    ) -> None:
+        registry.max_teams = 1
+        registry["1_0"] = FakeTeam(can_hibernate=False)  # type: ignore[assignment]
+        _add_teams(registry, clock, 2, start=1)
+
+        assert list(registry) == ["1_0", "1_2"]
+
+    def test_teams_are_hibernated_without_the_lock(
+        self, clock: FakeClock, registry: TeamRegistry
+    ) -> None:
+        locked_during_hibernation = []
+
+        class LockCheckingTeam(FakeTeam):
+            def hibernate(self) -> bool:
+                # the lock is free for the other threads
+                acquired: List[bool] = []
+
+                def _acquire() -> None:
+                    acquired.append(registry._lock.acquire(timeout=1))
+                    if acquired[0]:
+                        registry._lock.release()
+
+                thread = threading.Thread(target=_acquire)
+                thread.start()
+                thread.join()
+                locked_during_hibernation.append(not acquired[0])
+                return super().hibernate()
+
+        registry["1_0"] = LockCheckingTeam()  # type: ignore[assignment]
+        clock.now += 1000
+
+        assert registry.evict() == ["1_0"]
+        assert locked_during_hibernation == [False]
+
+    def test_clear(self, clock: FakeClock, registry: TeamRegistry) -> None:
+        teams = _add_teams(registry, clock, 2)
+
+        registry.clear()
+
+        assert len(registry) == 0
+        assert registry.memory == 0
+        assert not any(team.hibernated for team in teams)
+
+
+@pytest.fixture
+def hibernation_store() -> Iterator[FileTeamStateStore]:
+    with TemporaryDirectory() as d:
+        store = FileTeamStateStore(Path(d))
+        with (
+            unittest.mock.patch.object(Team, "hibernation_store", store),
+            unittest.mock.patch.object(Team, "state_store", None),
+        ):
+            Team._teams.clear()
+            yield store
+            Team._teams.clear()
+
+
+def test_estimate_team_memory(hibernation_store: FileTeamStateStore) -> None:
+    team = GoogleAdsTeam(user_id=1, conv_id=2, task="Optimize my campaigns")
+    memory = estimate_team_memory(team)
+    assert memory >= TEAM_MEMORY_OVERHEAD
+
+    team.groupchat.messages.append({"content": "Hi", "role": "user"})
+    assert estimate_team_memory(team) > memory
+
+
+def test_evicted_team_is_hibernated_and_restored(
+    hibernation_store: FileTeamStateStore,
+) -> None:
+    team = GoogleAdsTeam(user_id=1, conv_id=2, task="Optimize my campaigns")
+    team._restore_messages(
+        [{"content": "Initial task", "role": "user", "name": "chat_manager"}]
+    )
+
+    with unittest.mock.patch.object(Team._teams, "idle_ttl", -1):
+        Team._teams.evict()
+
+    assert Team.get_team(user_id=1, conv_id=2) is None
+    assert hibernation_store.load("1_2") is not None
+
+    restored_team = Team.get_or_load_team(user_id=1, conv_id=2)
+
+    assert isinstance(restored_team, GoogleAdsTeam)
+    assert restored_team is not team
+    assert Team.get_team(user_id=1, conv_id=2) is restored_team
+    assert restored_team.get_messages() == team.get_messages()
+    assert hibernation_store.load("1_2") is None
+
+
+def test_team_is_not_hibernated_with_state_store(
+    hibernation_store: FileTeamStateStore,
+) -> None:
+    team = GoogleAdsTeam(user_id=1, conv_id=2, task="Optimize my campaigns")
+    with unittest.mock.patch.object(Team, "state_store", unittest.mock.MagicMock()):
+        assert team.hibernate()
+    assert hibernation_store.load("1_2") is None
+
+
+def test_team_with_unsaved_state_is_saved_before_eviction() -> None:
+    Team._teams.clear()
+    team = GoogleAdsTeam(user_id=1, conv_id=2, task="Optimize my campaigns")
+    state_store = unittest.mock.MagicMock()
+    with unittest.mock.patch.object(Team, "state_store", state_store):
+        state_store.save.return_value = True
+        assert team.hibernate()
+        assert state_store.save.call_count == 1
+        assert team.state_saved
+
+        # the state is already stored
+        assert team.hibernate()
+        assert state_store.save.call_count == 1
+
+        team.state_saved = False
+        state_store.save.side_effect = ValueError("Database is down")
+        assert not team.hibernate()
+    Team._teams.clear()
+
+
+@pytest.mark.parametrize("method", ["initiate_chat", "continue_chat"])
+def test_team_is_not_evicted_while_it_is_chatting(
+    hibernation_store: FileTeamStateStore, method: str
+) -> None:
+    team = GoogleAdsTeam(user_id=1, conv_id=2, task="Optimize my campaigns")
+    evicted = []
+
+    def _chat(*args: Any, **kwargs: Any) -> None:
+        # e.g. the weekly analysis of another user creates its team
+        with unittest.mock.patch.object(Team._teams, "idle_ttl", -1):
+            evicted.extend(Team._teams.evict())
+
+    with (
+        unittest.mock.patch.object(team.manager, "initiate_chat", side_effect=_chat),
+        unittest.mock.patch.object(team.manager, "send", side_effect=_chat),
+    ):
+        if method == "initiate_chat":
+            team.initiate_chat()
+        else:
+            team.continue_chat(message="Yes, go ahead")
+
+    assert evicted == []
+    assert Team.get_team(user_id=1, conv_id=2) is team
+    assert hibernation_store.load("1_2") is None
+
+
+def test_evict_teams_deletes_expired_hibernated_teams(
+    hibernation_store: FileTeamStateStore,
+) -> None:
+    hibernation_store.save("1_2", {"version": 1})
+    hibernation_store.save("1_3", {"version": 1})
+    expired = time.time() - 2 * TEAM_HIBERNATION_TTL
+    os.utime(hibernation_store._path("1_2"), (expired, expired))
+
+    Team.evict_teams()
+
+    assert hibernation_store.load("1_2") is None
+    assert hibernation_store.load("1_3") is not None
+
+
+def test_pop_team_deletes_the_hibernated_team(
+    hibernation_store: FileTeamStateStore,
+) -> None:
+    GoogleAdsTeam(user_id=1, conv_id=2, task="Optimize my campaigns")
+    with unittest.mock.patch.object(Team._teams, "idle_ttl", -1):
+        Team._teams.evict()
+    assert hibernation_store.load("1_2") is not None
+
+    # the conversation is finished without waking up the team
+    Team.pop_team(user_id=1, conv_id=2)
+
+    assert hibernation_store.load("1_2") is None
@@ -0,0 +1,365 @@
+import threading
+import time
+import unittest.mock
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Iterator
+
+import pandas as pd
+import pytest
+
+from captn.captn_agents.backend.end_to_end import start_or_continue_conversation
+from captn.captn_agents.backend.teams import GoogleAdsTeam, Team
+from captn.captn_agents.backend.teams._team_state_store import (
+    FileTeamStateStore,
+    PostgresTeamStateStore,
+    create_team_state_store,
+    dump_context,
+    restore_context,
+)
+from captn.captn_agents.backend.tools._functions import Context
+from captn.captn_agents.backend.tools._gbb_page_feed_team_tools import (
+    PageFeedTeamContext,
+)
+from captn.captn_agents.backend.tools._query_results import QueryResultPages
+
+
+@pytest.fixture
+def file_store() -> Iterator[FileTeamStateStore]:
+    with TemporaryDirectory() as d:
+        store = FileTeamStateStore(Path(d))
+        with unittest.mock.patch.object(Team, "state_store", store):
+            Team._teams.clear()
+            yield store
+            Team._teams.clear()
+
+
+def test_create_team_state_store() -> None:
+    assert create_team_state_store("") is None
+    assert isinstance(create_team_state_store("file"), FileTeamStateStore)
+    assert isinstance(create_team_state_store("postgres"), PostgresTeamStateStore)
+    with pytest.raises(ValueError, match="Unknown team state store"):
+        create_team_state_store("redis")
+
+
+def test_file_team_state_store(file_store: FileTeamStateStore) -> None:
+    assert file_store.load("1_2") is None
+
+    file_store.save("1_2", {"version": 1})
+    file_store.save("1_2", {"version": 2})
+    assert file_store.load("1_2") == {"version": 2}
+    assert [path.name for path in file_store.root_dir.iterdir()] == ["1_2.json"]
+
+    file_store.delete("1_2")
+    file_store.delete("1_2")
+    assert file_store.load("1_2") is None
+
+
+def test_file_team_state_store_compare_and_set(
+    file_store: FileTeamStateStore,
+) -> None:
+    assert file_store.save("1_2", {"version": 1}, expected_version=0)
+    assert file_store.save("1_2", {"version": 2}, expected_version=1)
+
+    # another worker already stored the version 2
+    assert not file_store.save("1_2", {"version": 2, "x": 1}, expected_version=1)
+    assert file_store.load("1_2") == {"version": 2}
+
+
+def test_file_team_state_store_lock(file_store: FileTeamStateStore) -> None:
+    with file_store.lock("1_2"):
+        # another request of the same conversation waits, the other conversations don't
+        with pytest.raises(TimeoutError, match="still handled by another request"):
+            with file_store.lock("1_2", timeout=0):
+                pass
+        with file_store.lock("1_3", timeout=0):
+            pass
+
+    with file_store.lock("1_2", timeout=0):
+        pass
+    assert file_store.delete_expired(ttl=-1) == []
+
+
+def test_postgres_team_state_store_lock() -> None:
+    store = PostgresTeamStateStore()
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.db_queries.acquire_team_state_lease",
+            side_effect=[False, True],
+        ) as mock_acquire,
+        unittest.mock.patch(
+            "captn.captn_agents.db_queries.release_team_state_lease"
+        ) as mock_release,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._team_state_store.TEAM_STATE_LOCK_POLL_INTERVAL",
+            0,
+        ),
+    ):
+        with store.lock("1_2"):
+            assert mock_acquire.call_count == 2
+            mock_release.assert_not_called()
+
+    owner = mock_acquire.call_args.args[1]
+    mock_release.assert_called_once_with("1_2", owner)
+
+
+def test_dump_and_restore_context() -> None:
+    context = PageFeedTeamContext(
+        user_id=1,
+        conv_id=2,
+        recommended_modifications_and_answer_list=[],
+        toolbox=unittest.mock.MagicMock(),
+        google_sheets_api_url="https://sheets.airt.ai",
+    )
+    context.waiting_for_client_response = True
+    context.changes_made = "Created a campaign"
+    context.created_campaigns["123"].append("456")
+    context.query_results["abc"] = QueryResultPages(pages=["a", "b"], total_rows=2)
+    context.page_feeds_df = pd.DataFrame({"Page URL": ["https://airt.ai"]})
+
+    state = dump_context(context)
+    assert "toolbox" not in state
+    assert "user_id" not in state
+
+    new_context = PageFeedTeamContext(
+        user_id=1,
+        conv_id=2,
+        recommended_modifications_and_answer_list=[],
+        toolbox=unittest.mock.MagicMock(),
+        google_sheets_api_url="",
+    )
+    restore_context(new_context, state)
+
+    assert new_context.waiting_for_client_response is True
+    assert new_context.changes_made == "Created a campaign"
+    assert new_context.google_sheets_api_url == "https://sheets.airt.ai"
+    assert new_context.created_campaigns == {"123": ["456"]}
+    new_context.created_campaigns["789"].append("1")
+    assert new_context.query_results == {
+        "abc": QueryResultPages(pages=["a", "b"], total_rows=2)
+    }
+    assert new_context.accounts_templ_df is None
+    pd.testing.assert_frame_equal(new_context.page_feeds_df, context.page_feeds_df)
+
+
+def _add_messages(team: Team) -> None:
+    team._restore_messages(
+        [
+            {"content": "Initial task", "role": "user", "name": "chat_manager"},
+            {
+                "content": "Let's check the campaigns",
+                "role": "user",
+                "name": "google_ads_specialist",
+            },
+        ]
+    )
+
+
+@pytest.mark.usefixtures("file_store")
+def test_team_is_recreated_from_the_stored_state() -> None:
+    team = GoogleAdsTeam(user_id=1, conv_id=2, task="Optimize my campaigns")
+    _add_messages(team)
+    team.recommended_modifications_and_answer_list.append(
+        ({"function": "update_ad"}, None)
+    )
+    context: Context = team.toolbox.get_context()  # type: ignore[assignment]
+    context.changes_made = "Updated the ad"
+    Team.save_team_state(user_id=1, conv_id=2)
+    assert team.state_version == 1
+
+    # another worker, which doesn't have the team in memory
+    Team._teams.clear()
+    recreated_team = Team.get_or_load_team(user_id=1, conv_id=2)
+
+    assert isinstance(recreated_team, GoogleAdsTeam)
+    assert recreated_team is not team
+    assert Team.get_team(user_id=1, conv_id=2) is recreated_team
+    assert recreated_team.state_version == 1
+    assert recreated_team.task == "Optimize my campaigns"
+    assert recreated_team.initial_message == team.initial_message
+    assert recreated_team.get_messages() == team.get_messages()
+    specialist = recreated_team.groupchat.agent_by_name("google_ads_specialist")
+    assert specialist.chat_messages[recreated_team.manager] == [
+        {"content": "Initial task", "role": "user", "name": "chat_manager"},
+        {
+            "content": "Let's check the campaigns",
+            "role": "assistant",
+            "name": "google_ads_specialist",
+        },
+    ]
+
+    recreated_context: Context = recreated_team.toolbox.get_context()  # type: ignore[assignment]
+    assert recreated_context.changes_made == "Updated the ad"
+    assert recreated_context.toolbox is recreated_team.toolbox
+    # the list is shared between the team and the toolbox context
+    assert (
+        recreated_context.recommended_modifications_and_answer_list
+        is recreated_team.recommended_modifications_and_answer_list
+    )
+    assert recreated_team.recommended_modifications_and_answer_list == [
+        ({"function": "update_ad"}, None)
+    ]
+
+
+@pytest.mark.usefixtures("file_store")
+def test_team_in_memory_is_used_only_if_it_is_up_to_date() -> None:
+    team = GoogleAdsTeam(user_id=1, conv_id=2, task="Optimize my campaigns")
+    Team.save_team_state(user_id=1, conv_id=2)
+    assert Team.get_or_load_team(user_id=1, conv_id=2) is team
+
+    # the conversation was continued by another worker
+    Team._teams.clear()
+    other_worker_team = Team.get_or_load_team(user_id=1, conv_id=2)
+    assert other_worker_team is not None
+    _add_messages(other_worker_team)
+    Team.save_team_state(user_id=1, conv_id=2)
+    Team._teams.clear()
+    Team._store_team(user_id=1, conv_id=2, team=team)
+
+    updated_team = Team.get_or_load_team(user_id=1, conv_id=2)
+    assert updated_team is not team
+    assert updated_team is not None
+    assert updated_team.state_version == 2
+    assert len(updated_team.get_messages()) == 2
+
+
+def test_team_state_is_not_used_without_store() -> None:
+    Team._teams.clear()
+    team = GoogleAdsTeam(user_id=1, conv_id=2, task="Optimize my campaigns")
+    with unittest.mock.patch.object(Team, "state_store", None):
+        Team.save_team_state(user_id=1, conv_id=2)
+        assert Team.get_or_load_team(user_id=1, conv_id=2) is team
+    assert team.state_version == 0
+    Team._teams.clear()
+
+
+def test_start_or_continue_conversation_on_different_workers(
+    file_store: FileTeamStateStore,
+) -> None:
+    def _reply(self: Team, **kwargs: str) -> None:
+        message = kwargs.get("message", self.initial_message)
+        self.groupchat.messages.append(
+            {"content": f"Reply to: {message[:10]}", "role": "user", "name": "x"}
+        )
+
+    with (
+        TemporaryDirectory() as d,
+        unittest.mock.patch.object(
+            GoogleAdsTeam, "initiate_chat", autospec=True, side_effect=_reply
+        ),
+        unittest.mock.patch.object(
+            GoogleAdsTeam, "continue_chat", autospec=True, side_effect=_reply
+        ),
+    ):
+        start_or_continue_conversation(
+            user_id=1, conv_id=2, root_dir=Path(d), registred_team_name="default_team"
+        )
+        Team._teams.clear()
+
+        _, last_message = start_or_continue_conversation(
+            user_id=1,
+            conv_id=2,
+            root_dir=Path(d),
+            task="Yes, go ahead",
+            registred_team_name="default_team",
+        )
+
+    assert last_message == "Reply to: Yes, go ah"
+    state = file_store.load(Team.construct_team_name(1, 2))
+    assert state is not None
+    assert state["version"] == 2
+    assert len(state["messages"]) == 2
+    assert state["messages"][-1]["content"] == "Reply to: Yes, go ah"
+
+
+@pytest.mark.usefixtures("file_store")
+def test_save_team_state_reloads_the_team_on_conflict() -> None:
+    team = GoogleAdsTeam(user_id=1, conv_id=2, task="Optimize my campaigns")
+    Team.save_team_state(user_id=1, conv_id=2)
+
+    # another worker continues the conversation in the meantime
+    Team._teams.clear()
+    other_worker_team = Team.get_or_load_team(user_id=1, conv_id=2)
+    assert other_worker_team is not None
+    _add_messages(other_worker_team)
+    Team.save_team_state(user_id=1, conv_id=2)
+    Team._teams.clear()
+    Team._store_team(user_id=1, conv_id=2, team=team)
+
+    Team.save_team_state(user_id=1, conv_id=2)
+
+    reloaded_team = Team.get_team(user_id=1, conv_id=2)
+    assert reloaded_team is not None
+    assert reloaded_team is not team
+    assert reloaded_team.state_version == 2
+    assert len(reloaded_team.get_messages()) == 2
+
+
+def test_pop_team_deletes_the_stored_state(file_store: FileTeamStateStore) -> None:
+    GoogleAdsTeam(user_id=1, conv_id=2, task="Optimize my campaigns")
+    Team.save_team_state(user_id=1, conv_id=2)
+    team_name = Team.construct_team_name(1, 2)
+    assert file_store.load(team_name) is not None
+
+    assert Team.pop_team(user_id=1, conv_id=2) is not None
+
+    assert file_store.load(team_name) is None
+
+
+def test_start_or_continue_conversation_handles_the_requests_one_by_one(
+    file_store: FileTeamStateStore,
+) -> None:
+    chatting = threading.Event()
+
+    def _reply(self: Team, **kwargs: str) -> None:
+        message = kwargs.get("message", self.initial_message)
+        chatting.set()
+        # the other request arrives in the meantime
+        time.sleep(0.2)
+        self.groupchat.messages.append(
+            {"content": f"Reply to: {message[:10]}", "role": "user", "name": "x"}
+        )
+
+    last_messages = []
+
+    def _continue_conversation(root_dir: Path, task: str) -> None:
+        _, last_message = start_or_continue_conversation(
+            user_id=1,
+            conv_id=2,
+            root_dir=root_dir,
+            task=task,
+            registred_team_name="default_team",
+        )
+        last_messages.append(last_message)
+
+    with (
+        TemporaryDirectory() as d,
+        unittest.mock.patch.object(
+            GoogleAdsTeam, "initiate_chat", autospec=True, side_effect=_reply
+        ),
+        unittest.mock.patch.object(
+            GoogleAdsTeam, "continue_chat", autospec=True, side_effect=_reply
+        ),
+    ):
+        start_or_continue_conversation(
+            user_id=1, conv_id=2, root_dir=Path(d), registred_team_name="default_team"
+        )
+        chatting.clear()
+
+        thread = threading.Thread(
+            target=_continue_conversation, args=(Path(d), "Yes, go ahead")
+        )
+        thread.start()
+        chatting.wait()
+        _continue_conversation(Path(d), "No, stop it")
+        thread.join()
+
+    assert last_messages == ["Reply to: Yes, go ah", "Reply to: No, stop i"]
+    state = file_store.load(Team.construct_team_name(1, 2))
+    assert state is not None
+    assert state["version"] == 3
+    # the second request continued the state of the first one
+    assert [message["content"] for message in state["messages"]][1:] == [
+        "Reply to: Yes, go ah",
+        "Reply to: No, stop i",
+    ]
@@ -0,0 +1,175 @@
+import unittest.mock
+from typing import Any, Dict, Iterator, List
+
+import autogen
+import pytest
+import tiktoken
+from prometheus_client import REGISTRY
+
+from captn.captn_agents.backend.teams import Team
+from captn.captn_agents.backend.teams._token_counter import (
+    MessageTokenCounter,
+    count_token,
+    current_team_name,
+    get_token_counter,
+    observe_request_tokens,
+)
+
+
+class FakeEncoding:
+    def encode(self, text: str) -> List[int]:
+        return [len(word) for word in text.split()]
+
+
+class FakeO200kEncoding:
+    def encode(self, text: str) -> List[int]:
+        return [len(char) for char in text]
+
+
+FAKE_ENCODINGS = {"cl100k_base": FakeEncoding(), "o200k_base": FakeO200kEncoding()}
+
+
+@pytest.fixture
+def fake_encodings() -> Iterator[None]:
+    with (
+        unittest.mock.patch.dict(
+            "captn.captn_agents.backend.teams._token_counter._token_counters",
+            clear=True,
+        ),
+        unittest.mock.patch.object(
+            tiktoken, "get_encoding", side_effect=FAKE_ENCODINGS.__getitem__
+        ),
+    ):
+        yield
+
+
+MESSAGES: List[Dict[str, Any]] = [
+    {"content": "You are a Google Ads specialist", "role": "system"},
+    {"content": "Optimize my campaigns", "role": "user", "name": "client"},
+    {
+        "content": None,
+        "role": "assistant",
+        "tool_calls": [
+            {
+                "id": "call_1",
+                "type": "function",
+                "function": {"name": "list_campaigns", "arguments": "{}"},
+            }
+        ],
+    },
+    {"content": "Campaign A, Campaign B", "role": "tool", "tool_call_id": "call_1"},
+]
+
+
+def test_count_is_the_same_as_autogen_count_token() -> None:
+    counter = MessageTokenCounter(encode=FakeEncoding().encode)
+    with unittest.mock.patch.object(
+        autogen.token_count_utils.tiktoken,
+        "encoding_for_model",
+        return_value=FakeEncoding(),
+    ):
+        expected = autogen.token_count_utils.count_token(
+            MESSAGES, model="gpt-4-1106-preview"
+        )
+
+    assert counter.count(MESSAGES) == expected
+
+
+def test_only_new_messages_are_tokenised() -> None:
+    counter = MessageTokenCounter(encode=FakeEncoding().encode)
+    with unittest.mock.patch.object(
+        counter, "_count_message_tokens", wraps=counter._count_message_tokens
+    ) as mock_count_message_tokens:
+        first = counter.count(MESSAGES[:3])
+        assert mock_count_message_tokens.call_count == 3
+
+        second = counter.count(MESSAGES)
+        assert mock_count_message_tokens.call_count == 4
+        assert second > first
+
+        # a modified message is tokenised again
+        counter.count([{**MESSAGES[0], "content": "Something else"}])
+        assert mock_count_message_tokens.call_count == 5
+
+
+def test_cache_is_limited() -> None:
+    counter = MessageTokenCounter(max_cached_messages=2, encode=FakeEncoding().encode)
+    counter.count(MESSAGES)
+    assert len(counter._cache) == 2
+
+
+@pytest.mark.usefixtures("fake_encodings")
+def test_count_token_is_used_by_autogen() -> None:
+    assert autogen.oai.client.count_token is count_token
+    assert count_token(MESSAGES, model="gpt-4-1106-preview") == get_token_counter(
+        "gpt-4-1106-preview"
+    ).count(MESSAGES)
+
+
+@pytest.mark.usefixtures("fake_encodings")
+@pytest.mark.parametrize(
+    "model, encoding_name",
+    [("gpt-4o", "o200k_base"), ("gpt-4-1106-preview", "cl100k_base")],
+)
+def test_count_token_uses_the_encoding_of_the_model(
+    model: str, encoding_name: str
+) -> None:
+    # autogen uses the encoding of gpt-4 for all gpt-4 models, the encoding is set explicitly
+    with unittest.mock.patch.object(
+        autogen.token_count_utils.tiktoken,
+        "encoding_for_model",
+        return_value=FAKE_ENCODINGS[encoding_name],
+    ):
+        expected = autogen.token_count_utils.count_token(MESSAGES, model=model)
+
+    assert count_token(MESSAGES, model=model) == expected
+    assert get_token_counter(model).encoding_name == encoding_name
+
+
+@pytest.mark.usefixtures("fake_encodings")
+def test_get_token_counter_is_shared_by_the_models_with_the_same_encoding() -> None:
+    assert get_token_counter("gpt-4o") is get_token_counter("gpt-4o-2024-08-06")
+    assert get_token_counter("gpt-4o") is not get_token_counter("gpt-4")
+    # unknown models (e.g. the names of the Azure deployments) use cl100k_base
+    assert get_token_counter("airt-gpt4") is get_token_counter("gpt-4")
+
+
+@pytest.mark.usefixtures("fake_encodings")
+def test_observe_request_tokens_by_team() -> None:
+    def _get_sample(name: str) -> float:
+        value = REGISTRY.get_sample_value(name, {"team": "GoogleAdsTeam"})
+        return value or 0.0
+
+    count_before = _get_sample("llm_request_tokens_count")
+    sum_before = _get_sample("llm_request_tokens_sum")
+
+    token = current_team_name.set("GoogleAdsTeam")
+    try:
+        observe_request_tokens(MESSAGES, model="gpt-4o")
+    finally:
+        current_team_name.reset(token)
+
+    assert _get_sample("llm_request_tokens_count") == count_before + 1
+    assert _get_sample("llm_request_tokens_sum") == sum_before + get_token_counter(
+        "gpt-4o"
+    ).count(MESSAGES)
+
+
+def test_team_name_is_set_during_the_chat() -> None:
+    team_names = []
+
+    class FakeTeam:
+        @Team.handle_exceptions
+        def initiate_chat(self) -> None:
+            team_names.append(current_team_name.get())
+
+        def get_messages(self) -> List[Any]:
+            return []
+
+        max_round = 80
+        name = "1_2"
+
+    FakeTeam().initiate_chat()
+
+    assert team_names == ["FakeTeam"]
+    assert current_team_name.get() == "unknown"
@@ -1,9 +1,14 @@
+import copy
 import json
 import re
+import threading
+import time
 import unittest.mock
 from pathlib import Path
-from typing import Iterator
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+import httpx
+import pandas as pd
 import pytest
 from tenacity import RetryError
 
@@ -16,10 +21,9 @@ from captn.captn_agents.backend.teams import (
 )
 from captn.captn_agents.backend.teams._weekly_analysis_team import (
     REACT_APP_API_URL,
-    AdGroup,
-    AdGroupAd,
+    REDIRECT_DOMAIN,
+    WEEKLY_ANALYSIS_LEASE_TTL,
     Campaign,
-    Keyword,
     KeywordMetrics,
     Metrics,
     WeeklyAnalysisTeam,
@@ -27,22 +31,29 @@ from captn.captn_agents.backend.teams._weekly_analysis_team import (
     WeeklyReport,
     _add_metrics_message,
     _check_if_any_campaign_exists,
-    _create_date_query,
+    _create_final_html_message,
+    _create_task_message,
+    _execute_weekly_analysis_for_user,
+    _execute_weekly_analysis_for_user_with_lease,
+    _get_campaign_metrics,
     _get_day_of_week,
+    _order_user_ids_for_worker,
+    _prune_daily_metrics,
+    _renew_lease_periodically,
     _update_chat_message_and_send_email,
-    _update_message_and_campaigns_template,
     calculate_metrics_change,
-    compare_reports,
+    compare_weekly_metrics,
     construct_weekly_report_email_from_template,
+    create_compared_campaigns_report,
     execute_weekly_analysis,
-    get_campaigns_report,
+    find_weekly_report_anomalies,
+    get_two_weeks_daily_rows,
     get_web_status_code_report_for_campaign,
-    get_weekly_ad_group_ads_report,
-    get_weekly_keywords_report,
     get_weekly_report,
+    get_weekly_report_for_customer,
     google_ads_api_call,
 )
-from captn.google_ads.client import ALREADY_AUTHENTICATED
+from captn.captn_agents.backend.tools._url_health_checker import URLHealthChecker
 
 from .helpers import helper_test_init
 
@@ -74,6 +85,11 @@ def test_metrics() -> None:
         interactions_increase=-4.44,
         conversions_increase=0.0,
         cost_micros_increase=-15.69,
+        last_impressions=433,
+        last_clicks=100,
+        last_interactions=135,
+        last_conversions=0,
+        last_cost_micros=153000,
     )
     assert excepted == metrics_new
 
@@ -115,892 +131,15 @@ def test_keywords_metrics() -> None:
         conversions_increase=0.0,
         cost_micros_increase=-15.69,
         historical_quality_score_increase=-25.0,
+        last_impressions=433,
+        last_clicks=100,
+        last_interactions=135,
+        last_conversions=0,
+        last_cost_micros=153000,
     )
     assert excepted == metrics_new
 
 
-def test_get_weekly_ad_group_ads_report() -> None:
-    with unittest.mock.patch(
-        "captn.captn_agents.backend.teams._weekly_analysis_team.execute_query"
-    ) as mock_execute_query:
-        mock_execute_query.return_value = str(
-            {
-                "2324127278": [
-                    {
-                        "adGroup": {
-                            "resourceName": "customers/2324127278/adGroups/153796669090",
-                            "id": "153796669090",
-                        },
-                        "metrics": {
-                            "clicks": "0",
-                            "conversions": 0.0,
-                            "costMicros": "0",
-                            "impressions": "0",
-                            "interactions": "0",
-                        },
-                        "adGroupAd": {
-                            "resourceName": "customers/2324127278/adGroupAds/153796669090~690015466453",
-                            "ad": {
-                                "resourceName": "customers/2324127278/ads/690015466453",
-                                "id": "690015466453",
-                                "finalUrls": ["http://www.example.com"],
-                            },
-                        },
-                    },
-                    {
-                        "adGroup": {
-                            "resourceName": "customers/2324127278/adGroups/156261983518",
-                            "id": "156261983518",
-                        },
-                        "metrics": {
-                            "clicks": "0",
-                            "conversions": 0.0,
-                            "costMicros": "0",
-                            "impressions": "0",
-                            "interactions": "0",
-                        },
-                        "adGroupAd": {
-                            "resourceName": "customers/2324127278/adGroupAds/156261983518~688768033895",
-                            "ad": {
-                                "resourceName": "customers/2324127278/ads/688768033895",
-                                "id": "688768033895",
-                                "finalUrls": ["https://faststream.airt.ai/"],
-                            },
-                        },
-                    },
-                    {
-                        "adGroup": {
-                            "resourceName": "customers/2324127278/adGroups/161283342474",
-                            "id": "161283342474",
-                        },
-                        "metrics": {
-                            "clicks": "0",
-                            "conversions": 0.0,
-                            "costMicros": "0",
-                            "impressions": "0",
-                            "interactions": "0",
-                        },
-                        "adGroupAd": {
-                            "resourceName": "customers/2324127278/adGroupAds/161283342474~689256163801",
-                            "ad": {
-                                "resourceName": "customers/2324127278/ads/689256163801",
-                                "id": "689256163801",
-                                "finalUrls": [
-                                    "https://www.shopbookshop.com/collections/books"
-                                ],
-                            },
-                        },
-                    },
-                    {
-                        "adGroup": {
-                            "resourceName": "customers/2324127278/adGroups/161283342474",
-                            "id": "161283342474",
-                        },
-                        "metrics": {
-                            "clicks": "0",
-                            "conversions": 0.0,
-                            "costMicros": "0",
-                            "impressions": "0",
-                            "interactions": "0",
-                        },
-                        "adGroupAd": {
-                            "resourceName": "customers/2324127278/adGroupAds/161283342474~689694296577",
-                            "ad": {
-                                "resourceName": "customers/2324127278/ads/689694296577",
-                                "id": "689694296577",
-                                "finalUrls": [
-                                    "https://www.shopbookshop.com/collections/furnishings"
-                                ],
-                            },
-                        },
-                    },
-                ]
-            }
-        )
-        weekly_ad_group_ads_report = get_weekly_ad_group_ads_report(
-            user_id=1,
-            conv_id=1,
-            customer_id="2324127278",
-            date_query="2024-01-29",
-        )
-
-        expected = {
-            "153796669090": {
-                "690015466453": AdGroupAd(
-                    id="690015466453",
-                    final_urls=["http://www.example.com"],
-                    metrics=Metrics(
-                        impressions=0,
-                        clicks=0,
-                        interactions=0,
-                        conversions=0,
-                        cost_micros=0,
-                        impressions_increase=None,
-                        clicks_increase=None,
-                        interactions_increase=None,
-                        conversions_increase=None,
-                        cost_micros_increase=None,
-                    ),
-                )
-            },
-            "156261983518": {
-                "688768033895": AdGroupAd(
-                    id="688768033895",
-                    final_urls=["https://faststream.airt.ai/"],
-                    metrics=Metrics(
-                        impressions=0,
-                        clicks=0,
-                        interactions=0,
-                        conversions=0,
-                        cost_micros=0,
-                        impressions_increase=None,
-                        clicks_increase=None,
-                        interactions_increase=None,
-                        conversions_increase=None,
-                        cost_micros_increase=None,
-                    ),
-                )
-            },
-            "161283342474": {
-                "689256163801": AdGroupAd(
-                    id="689256163801",
-                    final_urls=["https://www.shopbookshop.com/collections/books"],
-                    metrics=Metrics(
-                        impressions=0,
-                        clicks=0,
-                        interactions=0,
-                        conversions=0,
-                        cost_micros=0,
-                        impressions_increase=None,
-                        clicks_increase=None,
-                        interactions_increase=None,
-                        conversions_increase=None,
-                        cost_micros_increase=None,
-                    ),
-                ),
-                "689694296577": AdGroupAd(
-                    id="689694296577",
-                    final_urls=["https://www.shopbookshop.com/collections/furnishings"],
-                    metrics=Metrics(
-                        impressions=0,
-                        clicks=0,
-                        interactions=0,
-                        conversions=0,
-                        cost_micros=0,
-                        impressions_increase=None,
-                        clicks_increase=None,
-                        interactions_increase=None,
-                        conversions_increase=None,
-                        cost_micros_increase=None,
-                    ),
-                ),
-            },
-        }
-        assert expected == weekly_ad_group_ads_report
-
-
-def test_get_weekly_keywords_report() -> None:
-    with unittest.mock.patch(
-        "captn.captn_agents.backend.teams._weekly_analysis_team.execute_query"
-    ) as mock_execute_query:
-        mock_execute_query.return_value = str(
-            {
-                "7119828439": [
-                    {
-                        "adGroup": {
-                            "resourceName": "customers/7119828439/adGroups/155431182157",
-                            "id": "155431182157",
-                        },
-                        "metrics": {
-                            "historicalCreativeQualityScore": "ABOVE_AVERAGE",
-                            "historicalLandingPageQualityScore": "BELOW_AVERAGE",
-                            "clicks": "1",
-                            "conversions": 0.0,
-                            "costMicros": "890000",
-                            "historicalQualityScore": "3",
-                            "impressions": "8",
-                            "interactions": "1",
-                        },
-                        "adGroupCriterion": {
-                            "resourceName": "customers/7119828439/adGroupCriteria/155431182157~51919090",
-                            "keyword": {"matchType": "BROAD", "text": "NATS"},
-                            "criterionId": "51919090",
-                        },
-                        "keywordView": {
-                            "resourceName": "customers/7119828439/keywordViews/155431182157~51919090"
-                        },
-                    },
-                    {
-                        "adGroup": {
-                            "resourceName": "customers/7119828439/adGroups/155431182157",
-                            "id": "155431182157",
-                        },
-                        "metrics": {
-                            "historicalCreativeQualityScore": "ABOVE_AVERAGE",
-                            "historicalLandingPageQualityScore": "BELOW_AVERAGE",
-                            "clicks": "0",
-                            "conversions": 0.0,
-                            "costMicros": "0",
-                            "historicalQualityScore": "3",
-                            "impressions": "34",
-                            "interactions": "0",
-                        },
-                        "adGroupCriterion": {
-                            "resourceName": "customers/7119828439/adGroupCriteria/155431182157~302418213753",
-                            "keyword": {"matchType": "BROAD", "text": "RabbitMQ"},
-                            "criterionId": "302418213753",
-                        },
-                        "keywordView": {
-                            "resourceName": "customers/7119828439/keywordViews/155431182157~302418213753"
-                        },
-                    },
-                    {
-                        "adGroup": {
-                            "resourceName": "customers/7119828439/adGroups/155431182157",
-                            "id": "155431182157",
-                        },
-                        "metrics": {
-                            "historicalCreativeQualityScore": "ABOVE_AVERAGE",
-                            "historicalLandingPageQualityScore": "BELOW_AVERAGE",
-                            "clicks": "9",
-                            "conversions": 0.0,
-                            "costMicros": "1940000",
-                            "historicalQualityScore": "3",
-                            "impressions": "106",
-                            "interactions": "9",
-                        },
-                        "adGroupCriterion": {
-                            "resourceName": "customers/7119828439/adGroupCriteria/155431182157~340537812163",
-                            "keyword": {"matchType": "BROAD", "text": "Apache Kafka"},
-                            "criterionId": "340537812163",
-                        },
-                        "keywordView": {
-                            "resourceName": "customers/7119828439/keywordViews/155431182157~340537812163"
-                        },
-                    },
-                ]
-            }
-        )
-        weekly_keywords_report = get_weekly_keywords_report(
-            user_id=1, conv_id=1, customer_id="7119828439", date_query="2024-01-29"
-        )
-
-        expected = {
-            "155431182157": {
-                "51919090": Keyword(
-                    id="51919090",
-                    metrics=KeywordMetrics(
-                        impressions=8,
-                        clicks=1,
-                        interactions=1,
-                        conversions=0,
-                        cost_micros=890000,
-                        impressions_increase=None,
-                        clicks_increase=None,
-                        interactions_increase=None,
-                        conversions_increase=None,
-                        cost_micros_increase=None,
-                        historical_quality_score=3,
-                        historical_landing_page_quality_score="BELOW_AVERAGE",
-                        historical_creative_quality_score="ABOVE_AVERAGE",
-                    ),
-                    text="NATS",
-                    match_type="BROAD",
-                ),
-                "302418213753": Keyword(
-                    id="302418213753",
-                    metrics=KeywordMetrics(
-                        impressions=34,
-                        clicks=0,
-                        interactions=0,
-                        conversions=0,
-                        cost_micros=0,
-                        impressions_increase=None,
-                        clicks_increase=None,
-                        interactions_increase=None,
-                        conversions_increase=None,
-                        cost_micros_increase=None,
-                        historical_quality_score=3,
-                        historical_landing_page_quality_score="BELOW_AVERAGE",
-                        historical_creative_quality_score="ABOVE_AVERAGE",
-                    ),
-                    text="RabbitMQ",
-                    match_type="BROAD",
-                ),
-                "340537812163": Keyword(
-                    id="340537812163",
-                    metrics=KeywordMetrics(
-                        impressions=106,
-                        clicks=9,
-                        interactions=9,
-                        conversions=0,
-                        cost_micros=1940000,
-                        impressions_increase=None,
-                        clicks_increase=None,
-                        interactions_increase=None,
-                        conversions_increase=None,
-                        cost_micros_increase=None,
-                        historical_quality_score=3,
-                        historical_landing_page_quality_score="BELOW_AVERAGE",
-                        historical_creative_quality_score="ABOVE_AVERAGE",
-                    ),
-                    text="Apache Kafka",
-                    match_type="BROAD",
-                ),
-            }
-        }
-        assert expected == weekly_keywords_report
-
-
-def test_compare_reports() -> None:
-    first_report = {
-        "20750580900": Campaign(
-            id="20750580900",
-            name="faststream-web-search",
-            ad_groups={
-                "155431182157": AdGroup(
-                    id="155431182157",
-                    name="Ad group 1",
-                    metrics=Metrics(
-                        impressions=148,
-                        clicks=10,
-                        interactions=10,
-                        conversions=0,
-                        cost_micros=2830000,
-                        impressions_increase=None,
-                        clicks_increase=None,
-                        interactions_increase=None,
-                        conversions_increase=None,
-                        cost_micros_increase=None,
-                    ),
-                    keywords={
-                        "51919090": Keyword(
-                            id="51919090",
-                            text="NATS",
-                            match_type="BROAD",
-                            metrics=KeywordMetrics(
-                                impressions=8,
-                                clicks=1,
-                                interactions=1,
-                                conversions=0,
-                                cost_micros=890000,
-                                impressions_increase=None,
-                                clicks_increase=None,
-                                interactions_increase=None,
-                                conversions_increase=None,
-                                cost_micros_increase=None,
-                            ),
-                        ),
-                        "302418213753": Keyword(
-                            id="302418213753",
-                            text="RabbitMQ",
-                            match_type="BROAD",
-                            metrics=KeywordMetrics(
-                                impressions=34,
-                                clicks=0,
-                                interactions=0,
-                                conversions=0,
-                                cost_micros=0,
-                                impressions_increase=None,
-                                clicks_increase=None,
-                                interactions_increase=None,
-                                conversions_increase=None,
-                                cost_micros_increase=None,
-                            ),
-                        ),
-                        "340537812163": Keyword(
-                            id="340537812163",
-                            text="Apache Kafka",
-                            match_type="BROAD",
-                            metrics=KeywordMetrics(
-                                impressions=106,
-                                clicks=9,
-                                interactions=9,
-                                conversions=0,
-                                cost_micros=1940000,
-                                impressions_increase=None,
-                                clicks_increase=None,
-                                interactions_increase=None,
-                                conversions_increase=None,
-                                cost_micros_increase=None,
-                            ),
-                        ),
-                    },
-                    ad_group_ads={
-                        "680002685922": AdGroupAd(
-                            id="680002685922",
-                            final_urls=["https://github.com/airtai/faststream"],
-                            metrics=Metrics(
-                                impressions=148,
-                                clicks=10,
-                                interactions=10,
-                                conversions=0,
-                                cost_micros=2830000,
-                                impressions_increase=None,
-                                clicks_increase=None,
-                                interactions_increase=None,
-                                conversions_increase=None,
-                                cost_micros_increase=None,
-                            ),
-                        )
-                    },
-                )
-            },
-            metrics=Metrics(
-                impressions=148,
-                clicks=10,
-                interactions=10,
-                conversions=0,
-                cost_micros=2830000,
-                impressions_increase=None,
-                clicks_increase=None,
-                interactions_increase=None,
-                conversions_increase=None,
-                cost_micros_increase=None,
-            ),
-        )
-    }
-    second_report = {
-        "20750580900": Campaign(
-            id="20750580900",
-            name="faststream-web-search",
-            ad_groups={
-                "155431182157": AdGroup(
-                    id="155431182157",
-                    name="Ad group 1",
-                    metrics=Metrics(
-                        impressions=114,
-                        clicks=7,
-                        interactions=7,
-                        conversions=0,
-                        cost_micros=4220000,
-                        impressions_increase=None,
-                        clicks_increase=None,
-                        interactions_increase=None,
-                        conversions_increase=None,
-                        cost_micros_increase=None,
-                    ),
-                    keywords={
-                        "51919090": Keyword(
-                            id="51919090",
-                            text="NATS",
-                            match_type="BROAD",
-                            metrics=KeywordMetrics(
-                                impressions=3,
-                                clicks=0,
-                                interactions=0,
-                                conversions=0,
-                                cost_micros=0,
-                                impressions_increase=None,
-                                clicks_increase=None,
-                                interactions_increase=None,
-                                conversions_increase=None,
-                                cost_micros_increase=None,
-                            ),
-                        ),
-                        "302418213753": Keyword(
-                            id="302418213753",
-                            text="RabbitMQ",
-                            match_type="BROAD",
-                            metrics=KeywordMetrics(
-                                impressions=13,
-                                clicks=2,
-                                interactions=2,
-                                conversions=0,
-                                cost_micros=70000,
-                                impressions_increase=None,
-                                clicks_increase=None,
-                                interactions_increase=None,
-                                conversions_increase=None,
-                                cost_micros_increase=None,
-                            ),
-                        ),
-                        "340537812163": Keyword(
-                            id="340537812163",
-                            text="Apache Kafka",
-                            match_type="BROAD",
-                            metrics=KeywordMetrics(
-                                impressions=98,
-                                clicks=5,
-                                interactions=5,
-                                conversions=0,
-                                cost_micros=4150000,
-                                impressions_increase=None,
-                                clicks_increase=None,
-                                interactions_increase=None,
-                                conversions_increase=None,
-                                cost_micros_increase=None,
-                            ),
-                        ),
-                    },
-                    ad_group_ads={
-                        "680002685922": AdGroupAd(
-                            id="680002685922",
-                            final_urls=["https://github.com/airtai/faststream"],
-                            metrics=Metrics(
-                                impressions=114,
-                                clicks=7,
-                                interactions=7,
-                                conversions=0,
-                                cost_micros=4220000,
-                                impressions_increase=None,
-                                clicks_increase=None,
-                                interactions_increase=None,
-                                conversions_increase=None,
-                                cost_micros_increase=None,
-                            ),
-                        )
-                    },
-                )
-            },
-            metrics=Metrics(
-                impressions=114,
-                clicks=7,
-                interactions=7,
-                conversions=0,
-                cost_micros=4220000,
-                impressions_increase=None,
-                clicks_increase=None,
-                interactions_increase=None,
-                conversions_increase=None,
-                cost_micros_increase=None,
-            ),
-        )
-    }
-
-    compared_campaigns_report = compare_reports(first_report, second_report)
-    expected = {
-        "20750580900": Campaign(
-            id="20750580900",
-            name="faststream-web-search",
-            ad_groups={
-                "155431182157": AdGroup(
-                    id="155431182157",
-                    name="Ad group 1",
-                    metrics=Metrics(
-                        impressions=148,
-                        clicks=10,
-                        interactions=10,
-                        conversions=0,
-                        cost_micros=2830000,
-                        impressions_increase=29.82,
-                        clicks_increase=42.86,
-                        interactions_increase=42.86,
-                        conversions_increase=0.0,
-                        cost_micros_increase=-32.94,
-                    ),
-                    keywords={
-                        "51919090": Keyword(
-                            id="51919090",
-                            text="NATS",
-                            match_type="BROAD",
-                            metrics=KeywordMetrics(
-                                impressions=8,
-                                clicks=1,
-                                interactions=1,
-                                conversions=0,
-                                cost_micros=890000,
-                                impressions_increase=166.67,
-                                clicks_increase=None,
-                                interactions_increase=None,
-                                conversions_increase=0.0,
-                                cost_micros_increase=None,
-                            ),
-                        ),
-                        "302418213753": Keyword(
-                            id="302418213753",
-                            text="RabbitMQ",
-                            match_type="BROAD",
-                            metrics=KeywordMetrics(
-                                impressions=34,
-                                clicks=0,
-                                interactions=0,
-                                conversions=0,
-                                cost_micros=0,
-                                impressions_increase=161.54,
-                                clicks_increase=None,
-                                interactions_increase=None,
-                                conversions_increase=0.0,
-                                cost_micros_increase=None,
-                            ),
-                        ),
-                        "340537812163": Keyword(
-                            id="340537812163",
-                            text="Apache Kafka",
-                            match_type="BROAD",
-                            metrics=KeywordMetrics(
-                                impressions=106,
-                                clicks=9,
-                                interactions=9,
-                                conversions=0,
-                                cost_micros=1940000,
-                                impressions_increase=8.16,
-                                clicks_increase=80.0,
-                                interactions_increase=80.0,
-                                conversions_increase=0.0,
-                                cost_micros_increase=-53.25,
-                            ),
-                        ),
-                    },
-                    ad_group_ads={
-                        "680002685922": AdGroupAd(
-                            id="680002685922",
-                            final_urls=["https://github.com/airtai/faststream"],
-                            metrics=Metrics(
-                                impressions=148,
-                                clicks=10,
-                                interactions=10,
-                                conversions=0,
-                                cost_micros=2830000,
-                                impressions_increase=29.82,
-                                clicks_increase=42.86,
-                                interactions_increase=42.86,
-                                conversions_increase=0.0,
-                                cost_micros_increase=-32.94,
-                            ),
-                        )
-                    },
-                )
-            },
-            metrics=Metrics(
-                impressions=148,
-                clicks=10,
-                interactions=10,
-                conversions=0,
-                cost_micros=2830000,
-                impressions_increase=29.82,
-                clicks_increase=42.86,
-                interactions_increase=42.86,
-                conversions_increase=0.0,
-                cost_micros_increase=-32.94,
-            ),
-        )
-    }
-    assert expected == compared_campaigns_report
-
-
-def test_get_campaigns_report() -> None:
-    with unittest.mock.patch(
-        "captn.captn_agents.backend.teams._weekly_analysis_team.execute_query"
-    ) as mock_execute_query:
-        # mock get_ad_groups_report
-        with unittest.mock.patch(
-            "captn.captn_agents.backend.teams._weekly_analysis_team.get_ad_groups_report"
-        ) as mock_get_ad_groups_report:
-            mock_execute_query.return_value = str(
-                {
-                    "2324127278": [
-                        {
-                            "campaign": {
-                                "resourceName": "customers/2324127278/campaigns/20750935821",
-                                "name": "Search-1",
-                                "id": "20750935821",
-                            },
-                            "metrics": {
-                                "clicks": "0",
-                                "conversions": 0.0,
-                                "costMicros": "0",
-                                "impressions": "0",
-                                "interactions": "0",
-                            },
-                        },
-                        {
-                            "campaign": {
-                                "resourceName": "customers/2324127278/campaigns/20761810762",
-                                "name": "Website traffic-Search-3-updated-up",
-                                "id": "20761810762",
-                            },
-                            "metrics": {
-                                "clicks": "0",
-                                "conversions": 0.0,
-                                "costMicros": "0",
-                                "impressions": "0",
-                                "interactions": "0",
-                            },
-                        },
-                        {
-                            "campaign": {
-                                "resourceName": "customers/2324127278/campaigns/20978334367",
-                                "name": "Book-Shop1",
-                                "id": "20978334367",
-                            },
-                            "metrics": {
-                                "clicks": "0",
-                                "conversions": 0.0,
-                                "costMicros": "0",
-                                "impressions": "0",
-                                "interactions": "0",
-                            },
-                        },
-                        {
-                            "campaign": {
-                                "resourceName": "customers/2324127278/campaigns/20979579987",
-                                "name": "Empty",
-                                "id": "20979579987",
-                            },
-                            "metrics": {
-                                "clicks": "0",
-                                "conversions": 0.0,
-                                "costMicros": "0",
-                                "impressions": "0",
-                                "interactions": "0",
-                            },
-                        },
-                    ]
-                }
-            )
-            mock_get_ad_groups_report.return_value = {
-                "153796669090": {
-                    "690015466453": AdGroupAd(
-                        id="690015466453",
-                        final_urls=["http://www.example.com"],
-                        metrics=Metrics(
-                            impressions=0,
-                            clicks=0,
-                            interactions=0,
-                            conversions=0,
-                            cost_micros=0,
-                            impressions_increase=None,
-                            clicks_increase=None,
-                            interactions_increase=None,
-                            conversions_increase=None,
-                            cost_micros_increase=None,
-                        ),
-                    )
-                },
-                "156261983518": {
-                    "688768033895": AdGroupAd(
-                        id="688768033895",
-                        final_urls=["https://faststream.airt.ai/"],
-                        metrics=Metrics(
-                            impressions=0,
-                            clicks=0,
-                            interactions=0,
-                            conversions=0,
-                            cost_micros=0,
-                            impressions_increase=None,
-                            clicks_increase=None,
-                            interactions_increase=None,
-                            conversions_increase=None,
-                            cost_micros_increase=None,
-                        ),
-                    )
-                },
-                "161283342474": {
-                    "689256163801": AdGroupAd(
-                        id="689256163801",
-                        final_urls=["https://www.shopbookshop.com/collections/books"],
-                        metrics=Metrics(
-                            impressions=0,
-                            clicks=0,
-                            interactions=0,
-                            conversions=0,
-                            cost_micros=0,
-                            impressions_increase=None,
-                            clicks_increase=None,
-                            interactions_increase=None,
-                            conversions_increase=None,
-                            cost_micros_increase=None,
-                        ),
-                    ),
-                    "689694296577": AdGroupAd(
-                        id="689694296577",
-                        final_urls=[
-                            "https://www.shopbookshop.com/collections/furnishings"
-                        ],
-                        metrics=Metrics(
-                            impressions=0,
-                            clicks=0,
-                            interactions=0,
-                            conversions=0,
-                            cost_micros=0,
-                            impressions_increase=None,
-                            clicks_increase=None,
-                            interactions_increase=None,
-                            conversions_increase=None,
-                            cost_micros_increase=None,
-                        ),
-                    ),
-                },
-            }
-
-            campaigns_report = get_campaigns_report(
-                user_id=1, conv_id=1, customer_id="2324127278", date_query="2024-01-29"
-            )
-
-            expected = {
-                "20750935821": Campaign(
-                    id="20750935821",
-                    name="Search-1",
-                    ad_groups={},
-                    metrics=Metrics(
-                        impressions=0,
-                        clicks=0,
-                        interactions=0,
-                        conversions=0,
-                        cost_micros=0,
-                        impressions_increase=None,
-                        clicks_increase=None,
-                        interactions_increase=None,
-                        conversions_increase=None,
-                        cost_micros_increase=None,
-                    ),
-                ),
-                "20761810762": Campaign(
-                    id="20761810762",
-                    name="Website traffic-Search-3-updated-up",
-                    ad_groups={},
-                    metrics=Metrics(
-                        impressions=0,
-                        clicks=0,
-                        interactions=0,
-                        conversions=0,
-                        cost_micros=0,
-                        impressions_increase=None,
-                        clicks_increase=None,
-                        interactions_increase=None,
-                        conversions_increase=None,
-                        cost_micros_increase=None,
-                    ),
-                ),
-                "20978334367": Campaign(
-                    id="20978334367",
-                    name="Book-Shop1",
-                    ad_groups={},
-                    metrics=Metrics(
-                        impressions=0,
-                        clicks=0,
-                        interactions=0,
-                        conversions=0,
-                        cost_micros=0,
-                        impressions_increase=None,
-                        clicks_increase=None,
-                        interactions_increase=None,
-                        conversions_increase=None,
-                        cost_micros_increase=None,
-                    ),
-                ),
-                "20979579987": Campaign(
-                    id="20979579987",
-                    name="Empty",
-                    ad_groups={},
-                    metrics=Metrics(
-                        impressions=0,
-                        clicks=0,
-                        interactions=0,
-                        conversions=0,
-                        cost_micros=0,
-                        impressions_increase=None,
-                        clicks_increase=None,
-                        interactions_increase=None,
-                        conversions_increase=None,
-                        cost_micros_increase=None,
-                    ),
-                ),
-            }
-            assert expected == campaigns_report
-
-
 def test_get_web_status_code_report_for_campaign() -> None:
     campaign = {
         "id": "20761810762",
@@ -1090,19 +229,30 @@ def test_add_metrics_message_when_increase_is_none() -> None:
     assert excepted == result
 
 
-def test_update_message_and_campaigns_template() -> None:
-    campaigns_template = "{conversions} - {conversions_change_rate}"
-
-    message, updated_template = _update_message_and_campaigns_template(
-        metrics={"conversions": 5, "conversions_increase": 10.5},
-        title="Conversions",
-        field="conversions",
-        currency="",
-        message="Initial",
-        campaigns_template=campaigns_template,
+def test_get_campaign_metrics() -> None:
+    message, values = _get_campaign_metrics(
+        metrics={
+            "clicks": 5,
+            "clicks_increase": None,
+            "conversions": 5,
+            "conversions_increase": 10.5,
+            "cost_micros": 2000000,
+            "cost_micros_increase": -20.0,
+        },
+        currency="EUR",
     )
-    assert "Initial<li>Conversions: 5 (+10.5%)</li>" == message
-    assert "5 - +10.5%" == updated_template
+    assert (
+        "<li>Clicks: 5</li><li>Conversions: 5 (+10.5%)</li><li>Cost: 2.0 EUR (-20.0%)</li>"
+        == message
+    )
+    assert values == {
+        "clicks": "5",
+        "clicks_change_rate": "-",
+        "conversions": "5",
+        "conversions_change_rate": "+10.5%",
+        "cost_micros": "2.0 EUR",
+        "cost_micros_change_rate": "-20.0%",
+    }
 
 
 def test_construct_weekly_report_email_from_template() -> None:
@@ -1169,7 +319,7 @@ def test_send_email() -> None:
 
 def test_execute_weekly_analysis_with_incorrect_emails() -> None:
     with unittest.mock.patch(
-        "captn.captn_agents.backend.teams._weekly_analysis_team.get_user_ids_and_emails"
+        "captn.captn_agents.backend.teams._weekly_analysis_team.get_authenticated_user_ids_and_emails"
     ) as mock_get_user_ids_and_emails:
         with unittest.mock.patch(
             "captn.captn_agents.backend.teams._weekly_analysis_team._get_conv_id_and_uuid"
@@ -1187,6 +337,1171 @@ def test_execute_weekly_analysis_with_incorrect_emails() -> None:
             mock_get_conv_id_and_uuid.assert_not_called()
 
 
+def test_execute_weekly_analysis_processes_users_in_parallel(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    def _execute_for_user(
+        user_id: str, email: str, date: str, resume: bool = False, force: bool = False
+    ) -> str:
+        if user_id == "3":
+            raise ValueError("Unexpected error")
+        return "completed" if user_id == "1" else "skipped"
+
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.get_authenticated_user_ids_and_emails",
+            return_value=json.dumps(
+                {1: "name1@mail.com", 2: "name2@mail.com", 3: "name3@mail.com"}
+            ),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._execute_weekly_analysis_for_user",
+            side_effect=_execute_for_user,
+        ) as mock_execute_for_user,
+    ):
+        execute_weekly_analysis(date="2024-04-14", max_workers=2)
+
+    assert mock_execute_for_user.call_count == 3
+    out = capsys.readouterr().out
+    assert "3 users processed" in out
+    assert "1 completed, 1 skipped, 1 failed" in out
+
+
+def test_order_user_ids_for_worker() -> None:
+    user_ids = [str(user_id) for user_id in range(10, 0, -1)]
+
+    orders = [
+        _order_user_ids_for_worker(user_ids, worker_index=i, num_workers=3)
+        for i in range(3)
+    ]
+
+    for order in orders:
+        assert sorted(order, key=int) == sorted(user_ids, key=int)
+    # every worker starts with its own users
+    assert orders[0][:3] == ["3", "6", "9"]
+    assert orders[1][:4] == ["1", "4", "7", "10"]
+    assert orders[2][:3] == ["2", "5", "8"]
+    assert _order_user_ids_for_worker([], worker_index=0, num_workers=3) == []
+
+
+def test_renew_lease_periodically() -> None:
+    renewed = threading.Event()
+    calls: List[Dict[str, Any]] = []
+
+    async def renew_lease(**kwargs: Any) -> bool:
+        calls.append(kwargs)
+        renewed.set()
+        return True
+
+    with unittest.mock.patch(
+        "captn.captn_agents.backend.teams._weekly_analysis_team.renew_weekly_analysis_lease",
+        side_effect=renew_lease,
+    ):
+        with _renew_lease_periodically(
+            "2024-04-14", user_id=1, worker_id="host:1", interval=0.01
+        ) as lease_lost:
+            assert renewed.wait(5)
+        calls_after_exit = len(calls)
+        assert not lease_lost.is_set()
+        time.sleep(0.05)
+
+    assert calls[0] == {
+        "date": "2024-04-14",
+        "user_id": 1,
+        "owner": "host:1",
+        "ttl": WEEKLY_ANALYSIS_LEASE_TTL,
+    }
+    # the renewing stops with the block
+    assert len(calls) == calls_after_exit
+
+
+def test_renew_lease_periodically_sets_lease_lost() -> None:
+    with unittest.mock.patch(
+        "captn.captn_agents.backend.teams._weekly_analysis_team.renew_weekly_analysis_lease",
+        return_value=False,
+    ) as mock_renew_lease:
+        with _renew_lease_periodically(
+            "2024-04-14", user_id=1, worker_id="host:1", interval=0.01
+        ) as lease_lost:
+            assert lease_lost.wait(5)
+            time.sleep(0.05)
+
+    # the lease is not renewed after it was lost
+    assert mock_renew_lease.call_count == 1
+
+
+def test_renew_lease_periodically_sets_lease_lost_when_not_renewed_within_ttl() -> None:
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.renew_weekly_analysis_lease",
+            side_effect=ConnectionError("Database is down"),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.WEEKLY_ANALYSIS_LEASE_TTL",
+            0.05,
+        ),
+    ):
+        with _renew_lease_periodically(
+            "2024-04-14", user_id=1, worker_id="host:1", interval=0.01
+        ) as lease_lost:
+            assert lease_lost.wait(5)
+
+
+@pytest.mark.parametrize("lost_during_the_team", [False, True])
+def test_execute_weekly_analysis_for_user_aborts_when_lease_is_lost(
+    lost_during_the_team: bool,
+) -> None:
+    lease_lost = threading.Event()
+    if not lost_during_the_team:
+        lease_lost.set()
+
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._load_checkpoint",
+            return_value=None,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.WEEKLY_ANALYSIS_SKIP_QUIET_ACCOUNTS",
+            False,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._save_checkpoint",
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._get_conv_id_and_uuid",
+            return_value=(12, "uuid"),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.get_weekly_report",
+            return_value=json.dumps({"weekly_customer_reports": []}),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.WeeklyAnalysisTeam",
+        ) as mock_team,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._get_team_result",
+            return_value={"messages": "[]", "proposed_user_action": []},
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._send_weekly_analysis_email",
+        ) as mock_send_weekly_analysis_email,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._delete_chat_webhook",
+        ) as mock_delete_chat_webhook,
+    ):
+        # another worker takes over the user while the team is running
+        mock_team.return_value.initiate_chat.side_effect = lease_lost.set
+        status = _execute_weekly_analysis_for_user(
+            user_id=1, email="name@mail.com", date="2024-04-14", lease_lost=lease_lost
+        )
+
+    assert status == "skipped"
+    assert mock_team.return_value.initiate_chat.called == lost_during_the_team
+    mock_send_weekly_analysis_email.assert_not_called()
+    # the chat is used by the worker which owns the user now
+    mock_delete_chat_webhook.assert_not_called()
+
+
+def test_execute_weekly_analysis_with_leases_processes_every_user_once() -> None:
+    leases: Dict[Any, str] = {}
+    lock = threading.Lock()
+
+    async def acquire_lease(
+        date: str, user_id: int, owner: str, ttl: int
+    ) -> Tuple[bool, bool]:
+        with lock:
+            if (date, user_id) in leases:
+                return False, False
+            leases[(date, user_id)] = owner
+            return True, False
+
+    processed: List[str] = []
+
+    def _execute_for_user(
+        user_id: str,
+        email: str,
+        date: str,
+        resume: bool = False,
+        lease_lost: Optional[threading.Event] = None,
+        force: bool = False,
+    ) -> str:
+        assert lease_lost is not None
+        processed.append(user_id)
+        return "completed"
+
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.get_authenticated_user_ids_and_emails",
+            return_value=json.dumps({i: f"name{i}@mail.com" for i in range(1, 7)}),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._execute_weekly_analysis_for_user",
+            side_effect=_execute_for_user,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.acquire_weekly_analysis_lease",
+            side_effect=acquire_lease,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.release_weekly_analysis_lease",
+        ) as mock_release_lease,
+    ):
+        workers = [
+            threading.Thread(
+                target=execute_weekly_analysis,
+                kwargs={"date": "2024-04-14", "max_workers": 2, "use_leases": True},
+            )
+            for _ in range(3)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    assert sorted(processed, key=int) == [str(i) for i in range(1, 7)]
+    assert mock_release_lease.call_count == 6
+    assert mock_release_lease.call_args.kwargs["status"] == "completed"
+
+
+def test_execute_weekly_analysis_for_user_with_lease_taken_over_after_the_email() -> (
+    None
+):
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.acquire_weekly_analysis_lease",
+            return_value=(True, True),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.release_weekly_analysis_lease",
+        ) as mock_release_lease,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._load_checkpoint",
+            return_value=unittest.mock.MagicMock(stage="email_sent"),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._save_checkpoint",
+        ) as mock_save_checkpoint,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.get_weekly_report",
+        ) as mock_get_weekly_report,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._send_weekly_analysis_email",
+        ) as mock_send_weekly_analysis_email,
+    ):
+        # the previous owner was killed after sending the email, before releasing the lease
+        status = _execute_weekly_analysis_for_user_with_lease(
+            user_id=1, email="name@mail.com", date="2024-04-14", worker_id="host:2"
+        )
+
+    assert status == "skipped"
+    mock_get_weekly_report.assert_not_called()
+    mock_send_weekly_analysis_email.assert_not_called()
+    mock_save_checkpoint.assert_not_called()
+    assert mock_release_lease.call_args.kwargs["status"] == "skipped"
+
+
+@pytest.mark.parametrize("taken_over", [False, True])
+def test_execute_weekly_analysis_for_user_with_lease_resumes_when_taken_over(
+    taken_over: bool,
+) -> None:
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.acquire_weekly_analysis_lease",
+            return_value=(True, taken_over),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.release_weekly_analysis_lease",
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._execute_weekly_analysis_for_user",
+            return_value="completed",
+        ) as mock_execute_for_user,
+    ):
+        status = _execute_weekly_analysis_for_user_with_lease(
+            user_id=1, email="name@mail.com", date="2024-04-14", worker_id="host:2"
+        )
+
+    assert status == "completed"
+    assert mock_execute_for_user.call_args.kwargs["resume"] == taken_over
+
+
+def test_execute_weekly_analysis_for_user_resumes_after_team_done() -> None:
+    weekly_reports: Dict[str, Any] = {"weekly_customer_reports": []}
+    team_result = {"messages": "[]", "proposed_user_action": ["Pause the ad"]}
+    checkpoint = unittest.mock.MagicMock(
+        stage="team_done",
+        conv_id=12,
+        conv_uuid="uuid",
+        weekly_report=json.dumps(weekly_reports),
+        team_result=json.dumps(team_result),
+    )
+
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._load_checkpoint",
+            return_value=checkpoint,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._save_checkpoint",
+        ) as mock_save_checkpoint,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._get_conv_id_and_uuid",
+        ) as mock_get_conv_id_and_uuid,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.get_weekly_report",
+        ) as mock_get_weekly_report,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.WeeklyAnalysisTeam",
+        ) as mock_team,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._update_chat_message_and_send_email",
+        ) as mock_update_chat_message_and_send_email,
+    ):
+        status = _execute_weekly_analysis_for_user(
+            user_id=1, email="name@mail.com", date="2024-04-14", resume=True
+        )
+
+    assert status == "completed"
+    mock_get_conv_id_and_uuid.assert_not_called()
+    mock_get_weekly_report.assert_not_called()
+    mock_team.assert_not_called()
+    kwargs = mock_update_chat_message_and_send_email.call_args.kwargs
+    assert kwargs["conv_id"] == 12
+    assert kwargs["proposed_user_action"] == ["Pause the ad"]
+    assert mock_save_checkpoint.call_args.kwargs == {"stage": "email_sent"}
+
+
+@pytest.mark.parametrize("resume", [False, True])
+def test_execute_weekly_analysis_for_user_skips_finished_users(resume: bool) -> None:
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._load_checkpoint",
+            return_value=unittest.mock.MagicMock(stage="email_sent"),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._save_checkpoint",
+        ) as mock_save_checkpoint,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._get_conv_id_and_uuid",
+        ) as mock_get_conv_id_and_uuid,
+    ):
+        status = _execute_weekly_analysis_for_user(
+            user_id=1, email="name@mail.com", date="2024-04-14", resume=resume
+        )
+
+    assert status == "skipped"
+    mock_get_conv_id_and_uuid.assert_not_called()
+    mock_save_checkpoint.assert_not_called()
+
+
+def test_execute_weekly_analysis_for_user_sends_the_email_again_if_forced() -> None:
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.WEEKLY_ANALYSIS_SKIP_QUIET_ACCOUNTS",
+            False,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._load_checkpoint",
+            return_value=unittest.mock.MagicMock(stage="email_sent"),
+        ) as mock_load_checkpoint,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._save_checkpoint",
+        ) as mock_save_checkpoint,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._get_conv_id_and_uuid",
+            return_value=(12, "uuid"),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.get_weekly_report",
+            return_value=json.dumps({"weekly_customer_reports": []}),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.WeeklyAnalysisTeam",
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._get_team_result",
+            return_value={"messages": "[]", "proposed_user_action": []},
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._send_weekly_analysis_email",
+        ) as mock_send_weekly_analysis_email,
+    ):
+        status = _execute_weekly_analysis_for_user(
+            user_id=1, email="name@mail.com", date="2024-04-14", force=True
+        )
+
+    assert status == "completed"
+    mock_load_checkpoint.assert_not_called()
+    mock_send_weekly_analysis_email.assert_called_once()
+    saved = [call.kwargs.get("stage") for call in mock_save_checkpoint.call_args_list]
+    assert saved == ["pending", "report_built", "team_done", "email_sent"]
+
+
+def test_execute_weekly_analysis_for_user_never_moves_the_stage_back() -> None:
+    checkpoint = unittest.mock.MagicMock(
+        stage="team_done",
+        conv_id=12,
+        conv_uuid="uuid",
+        weekly_report=json.dumps({"weekly_customer_reports": []}),
+        team_result=json.dumps({"messages": "[]", "proposed_user_action": []}),
+    )
+    new_weekly_reports = json.dumps(
+        _anomalies_test_report(_anomalies_test_metrics(100, 10.0))
+    )
+
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.WEEKLY_ANALYSIS_SKIP_QUIET_ACCOUNTS",
+            False,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._load_checkpoint",
+            return_value=checkpoint,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._save_checkpoint",
+        ) as mock_save_checkpoint,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._get_conv_id_and_uuid",
+        ) as mock_get_conv_id_and_uuid,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.construct_weekly_report_email_from_template",
+            return_value=("<h2>Report</h2>", "<html></html>"),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.get_weekly_report",
+            return_value=new_weekly_reports,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.WeeklyAnalysisTeam",
+        ) as mock_team,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._get_team_result",
+            side_effect=ValueError("Send email function is not called"),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._delete_chat_webhook",
+        ),
+    ):
+        # the stages are repeated without 'resume', but the team fails again
+        status = _execute_weekly_analysis_for_user(
+            user_id=1, email="name@mail.com", date="2024-04-14"
+        )
+
+    assert status == "failed"
+    # the chat of the previous run is reused
+    mock_get_conv_id_and_uuid.assert_not_called()
+    assert mock_team.call_args.kwargs["conv_id"] == 12
+    saved = [call.kwargs for call in mock_save_checkpoint.call_args_list]
+    assert [data.get("stage") for data in saved] == ["team_done", "team_done", None]
+    assert saved[1]["weekly_report"] == new_weekly_reports
+
+
+def test_execute_weekly_analysis_for_user_saves_checkpoints() -> None:
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._load_checkpoint",
+            return_value=None,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.WEEKLY_ANALYSIS_SKIP_QUIET_ACCOUNTS",
+            False,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._save_checkpoint",
+        ) as mock_save_checkpoint,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._get_conv_id_and_uuid",
+            return_value=(12, "uuid"),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.get_weekly_report",
+            return_value=json.dumps({"weekly_customer_reports": []}),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.WeeklyAnalysisTeam",
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._get_team_result",
+            side_effect=ValueError("Send email function is not called"),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._delete_chat_webhook",
+        ) as mock_delete_chat_webhook,
+    ):
+        status = _execute_weekly_analysis_for_user(
+            user_id=1, email="name@mail.com", date="2024-04-14"
+        )
+
+    assert status == "failed"
+    mock_delete_chat_webhook.assert_called_once()
+    saved = [call.kwargs for call in mock_save_checkpoint.call_args_list]
+    assert [data.get("stage") for data in saved] == ["pending", "report_built", None]
+    # the deleted chat is not reused when the analysis is resumed
+    assert saved[-1] == {"conv_id": None, "conv_uuid": None}
+
+
+def _anomalies_test_metrics(
+    clicks: int, clicks_increase: Optional[float], last_clicks: Optional[int] = None
+) -> Dict[str, Any]:
+    return {
+        "last_clicks": last_clicks,
+        "last_interactions": last_clicks,
+        "impressions": 1000,
+        "clicks": clicks,
+        "interactions": clicks,
+        "conversions": 0,
+        "cost_micros": 500000,
+        "impressions_increase": 5.0,
+        "clicks_increase": clicks_increase,
+        "interactions_increase": clicks_increase,
+        "conversions_increase": 0,
+        "cost_micros_increase": 50.0,
+    }
+
+
+def _anomalies_test_report(
+    metrics: Dict[str, Any], final_url: str = "https://airt.ai/"
+) -> Dict[str, Any]:
+    campaign = {
+        "id": "1",
+        "name": "Campaign",
+        "metrics": metrics,
+        "ad_groups": {
+            "2": {
+                "id": "2",
+                "name": "Ad group",
+                "metrics": metrics,
+                "keywords": {},
+                "ad_group_ads": {
+                    "3": {"id": "3", "metrics": metrics, "final_urls": [final_url]}
+                },
+            }
+        },
+    }
+    return {
+        "weekly_customer_reports": [
+            {"customer_id": "123", "currency": "EUR", "campaigns": {"1": campaign}}
+        ]
+    }
+
+
+@pytest.fixture
+def final_urls_health_checker() -> Iterator[URLHealthChecker]:
+    checker = URLHealthChecker(
+        transport=httpx.MockTransport(
+            lambda request: httpx.Response(
+                404 if request.url.host == "broken.airt.ai" else 200
+            )
+        )
+    )
+    with unittest.mock.patch(
+        "captn.captn_agents.backend.teams._weekly_analysis_team.FINAL_URLS_HEALTH_CHECKER",
+        checker,
+    ):
+        yield checker
+
+
+@pytest.mark.parametrize(
+    ("metrics", "final_url", "expected"),
+    [
+        # small changes
+        (_anomalies_test_metrics(100, 10.0), "https://airt.ai/", []),
+        # big change of a metric with too low values
+        (_anomalies_test_metrics(3, 50.0), "https://airt.ai/", []),
+        (_anomalies_test_metrics(3, None), "https://airt.ai/", []),
+        (
+            _anomalies_test_metrics(100, -40.0),
+            "https://airt.ai/",
+            [
+                "Customer 123, campaign 'Campaign': clicks changed by -40.0% to 100",
+                "Customer 123, campaign 'Campaign': interactions changed by -40.0% to 100",
+            ],
+        ),
+        (
+            _anomalies_test_metrics(0, None, last_clicks=50),
+            "https://airt.ai/",
+            [
+                "Customer 123, campaign 'Campaign': clicks dropped from 50 to 0",
+                "Customer 123, campaign 'Campaign': interactions dropped from 50 to 0",
+            ],
+        ),
+        # drop to 0 from a too low value
+        (_anomalies_test_metrics(0, None, last_clicks=3), "https://airt.ai/", []),
+        (_anomalies_test_metrics(0, None), "https://airt.ai/", []),
+        (
+            _anomalies_test_metrics(100, 10.0),
+            "https://broken.airt.ai/",
+            [
+                "Customer 123, campaign 'Campaign': final url https://broken.airt.ai/ is not reachable"
+            ],
+        ),
+    ],
+)
+@pytest.mark.usefixtures("final_urls_health_checker")
+def test_find_weekly_report_anomalies(
+    metrics: Dict[str, Any], final_url: str, expected: List[str]
+) -> None:
+    anomalies = find_weekly_report_anomalies(_anomalies_test_report(metrics, final_url))
+
+    # only the campaign anomalies are checked, the same metrics are used for all resources
+    assert [anomaly for anomaly in anomalies if "ad group" not in anomaly] == expected
+
+
+@pytest.mark.usefixtures("final_urls_health_checker")
+def test_find_weekly_report_anomalies_for_keyword_quality_score() -> None:
+    weekly_reports = _anomalies_test_report(_anomalies_test_metrics(100, 10.0))
+    keyword_metrics = {
+        **_anomalies_test_metrics(100, 10.0),
+        "historical_quality_score": 4,
+        "historical_quality_score_increase": -50.0,
+    }
+    ad_group = weekly_reports["weekly_customer_reports"][0]["campaigns"]["1"][
+        "ad_groups"
+    ]["2"]
+    ad_group["keywords"]["4"] = {
+        "id": "4",
+        "text": "keyword",
+        "match_type": "EXACT",
+        "metrics": keyword_metrics,
+    }
+
+    assert find_weekly_report_anomalies(weekly_reports) == [
+        "Customer 123, campaign 'Campaign', ad group 'Ad group', keyword 'keyword': historical_quality_score changed by -50.0%"
+    ]
+
+
+@pytest.mark.usefixtures("final_urls_health_checker")
+def test_execute_weekly_analysis_for_user_skips_team_for_quiet_accounts() -> None:
+    weekly_reports = _anomalies_test_report(_anomalies_test_metrics(100, 10.0))
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._load_checkpoint",
+            return_value=None,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._save_checkpoint",
+        ) as mock_save_checkpoint,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._get_conv_id_and_uuid",
+            return_value=(12, "uuid"),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.get_weekly_report",
+            return_value=json.dumps(weekly_reports),
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.WeeklyAnalysisTeam",
+        ) as mock_team,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._update_chat_message_and_send_email",
+        ) as mock_update_chat_message_and_send_email,
+    ):
+        status = _execute_weekly_analysis_for_user(
+            user_id=1, email="name@mail.com", date="2024-04-14"
+        )
+
+    assert status == "completed"
+    mock_team.assert_not_called()
+    kwargs = mock_update_chat_message_and_send_email.call_args.kwargs
+    assert kwargs["proposed_user_action"] == []
+    assert kwargs["messages"] == "[]"
+    saved = [call.kwargs for call in mock_save_checkpoint.call_args_list]
+    assert [data.get("stage") for data in saved] == [
+        "pending",
+        "report_built",
+        "team_done",
+        "email_sent",
+    ]
+
+
+def test_create_final_html_message_without_proposed_user_actions() -> None:
+    main_email_template = "<html>{proposed_action}</html>"
+
+    html_message = _create_final_html_message(main_email_template, [], "uuid")
+
+    assert "No Significant Changes" in html_message
+    assert "Proposed User Actions" not in html_message
+    assert f"{REDIRECT_DOMAIN}/chat/uuid" in html_message
+
+    html_message = _create_final_html_message(
+        main_email_template, ["Pause the ad"], "uuid"
+    )
+    assert "Proposed User Actions" in html_message
+    assert "selected_user_action=1" in html_message
+
+
+def _two_weeks_test_row(
+    resource: str, metrics: Dict[str, Any], day: Optional[str] = None
+) -> Dict[str, Any]:
+    resources: Dict[str, Dict[str, Any]] = {
+        "campaign": {"campaign": {"id": "1", "name": "Campaign"}},
+        "ad_group": {
+            "campaign": {"id": "1"},
+            "adGroup": {"id": "2", "name": "Ad group"},
+        },
+        "keyword_view": {
+            "adGroup": {"id": "2"},
+            "adGroupCriterion": {
+                "criterionId": "3",
+                "keyword": {"text": "keyword", "matchType": "EXACT"},
+            },
+        },
+        "ad_group_ad": {
+            "adGroup": {"id": "2"},
+            "adGroupAd": {"ad": {"id": "4", "finalUrls": ["https://airt.ai"]}},
+        },
+    }
+    row = {**resources[resource], "metrics": metrics}
+    if day is not None:
+        row["segments"] = {"date": day}
+    return row
+
+
+def _two_weeks_test_metrics(
+    impressions: int, clicks: int, conversions: float, cost_micros: int, score: int
+) -> Dict[str, Any]:
+    return {
+        "impressions": str(impressions),
+        "clicks": str(clicks),
+        "interactions": str(clicks),
+        "conversions": conversions,
+        "costMicros": str(cost_micros),
+        "historicalQualityScore": score,
+    }
+
+
+# Returned by the attributes queries, the campaign "5", the ad group "6", the keyword "7" and
+# the ad "8" have no activity
+_AD_GROUP_ATTRIBUTES_TEST_ROWS: List[Dict[str, Any]] = [
+    {
+        "customer": {"currencyCode": "EUR"},
+        "campaign": {"id": "1", "name": "Campaign"},
+        "adGroup": {"id": "2", "name": "Ad group"},
+    },
+    {
+        "customer": {"currencyCode": "EUR"},
+        "campaign": {"id": "1", "name": "Campaign"},
+        "adGroup": {"id": "6", "name": "Paused ad group"},
+    },
+    {
+        "customer": {"currencyCode": "EUR"},
+        "campaign": {"id": "5", "name": "Paused campaign"},
+        "adGroup": {"id": "9", "name": "Paused campaign ad group"},
+    },
+]
+_ATTRIBUTES_TEST_ROWS: Dict[str, List[Dict[str, Any]]] = {
+    "ad_group": _AD_GROUP_ATTRIBUTES_TEST_ROWS,
+    "ad_group_criterion": [
+        {
+            "adGroup": {"id": "2"},
+            "adGroupCriterion": {
+                "criterionId": "3",
+                "keyword": {"text": "keyword", "matchType": "EXACT"},
+                "status": "ENABLED",
+            },
+        },
+        {
+            "adGroup": {"id": "2"},
+            "adGroupCriterion": {
+                "criterionId": "7",
+                "keyword": {"text": "inactive keyword", "matchType": "BROAD"},
+                "status": "ENABLED",
+            },
+        },
+    ],
+    "ad_group_ad": [
+        {
+            "adGroup": {"id": "2"},
+            "adGroupAd": {
+                "ad": {"id": "4", "finalUrls": ["https://airt.ai"]},
+                "status": "ENABLED",
+            },
+        },
+        {
+            "adGroup": {"id": "2"},
+            "adGroupAd": {
+                "ad": {"id": "8", "finalUrls": ["https://broken.airt.ai/"]},
+                "status": "ENABLED",
+            },
+        },
+    ],
+}
+
+
+def _execute_query_for_both_weeks_test(
+    user_id: int, conv_id: int, customer_ids: List[str], query: str
+) -> str:
+    resource = query.split(" FROM ")[1].split(" ")[0]
+    if "segments.date," not in query:
+        return str({customer_ids[0]: _ATTRIBUTES_TEST_ROWS[resource]})
+
+    rows = [
+        _two_weeks_test_row(
+            resource, _two_weeks_test_metrics(10, 1, 1.0, 100, 4), "2024-04-02"
+        ),
+        _two_weeks_test_row(
+            resource, _two_weeks_test_metrics(5, 0, 0.0, 0, 5), "2024-04-10"
+        ),
+        _two_weeks_test_row(
+            resource, _two_weeks_test_metrics(20, 2, 1.0, 300, 6), "2024-04-12"
+        ),
+    ]
+    if resource != "keyword_view":
+        for row in rows:
+            row["metrics"].pop("historicalQualityScore")
+    return str({customer_ids[0]: rows})
+
+
+def test_get_weekly_report_for_customer_compares_both_weeks() -> None:
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.execute_query",
+            side_effect=_execute_query_for_both_weeks_test,
+        ) as mock_execute_query,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._load_daily_metrics",
+            return_value={},
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._save_daily_metrics",
+        ),
+    ):
+        report = get_weekly_report_for_customer(-1, -1, "1111", "2024-04-14")
+
+    # the daily rows and the attributes of every resource level
+    assert mock_execute_query.call_count == 7
+    assert report.currency == "EUR"
+    assert list(report.campaigns) == ["1", "5"]
+    campaign = report.campaigns["1"]
+    assert campaign.name == "Campaign"
+    assert campaign.metrics == Metrics(
+        impressions=25,
+        clicks=2,
+        interactions=2,
+        conversions=1,
+        cost_micros=300,
+        impressions_increase=150.0,
+        clicks_increase=100.0,
+        interactions_increase=100.0,
+        conversions_increase=0.0,
+        cost_micros_increase=200.0,
+        last_impressions=10,
+        last_clicks=1,
+        last_interactions=1,
+        last_conversions=1,
+        last_cost_micros=100,
+    )
+    assert list(campaign.ad_groups) == ["2", "6"]
+    paused_ad_group = campaign.ad_groups["6"]
+    assert paused_ad_group.metrics.impressions == 0
+    assert paused_ad_group.metrics.impressions_increase == 0.0
+    assert report.campaigns["5"].metrics.clicks == 0
+    assert list(report.campaigns["5"].ad_groups) == ["9"]
+
+    ad_group = campaign.ad_groups["2"]
+    assert ad_group.name == "Ad group"
+    keyword = ad_group.keywords["3"]
+    assert keyword.text == "keyword"
+    assert keyword.match_type == "EXACT"
+    assert keyword.metrics.historical_quality_score == 6
+    assert keyword.metrics.historical_quality_score_increase == 50.0
+    assert ad_group.ad_group_ads["4"].final_urls == ["https://airt.ai"]
+    assert ad_group.ad_group_ads["4"].metrics.impressions_increase == 150.0
+    # the keywords and ads without activity have zero metrics
+    assert list(ad_group.keywords) == ["3", "7"]
+    assert ad_group.keywords["7"].text == "inactive keyword"
+    assert ad_group.keywords["7"].metrics.impressions == 0
+    assert ad_group.keywords["7"].metrics.historical_quality_score is None
+    assert list(ad_group.ad_group_ads) == ["4", "8"]
+    assert ad_group.ad_group_ads["8"].metrics.impressions == 0
+
+
+def test_create_task_message_excludes_last_week_metrics() -> None:
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.execute_query",
+            side_effect=_execute_query_for_both_weeks_test,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._load_daily_metrics",
+            return_value={},
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._save_daily_metrics",
+        ),
+    ):
+        report = get_weekly_report_for_customer(-1, -1, "1111", "2024-04-14")
+    weekly_reports = WeeklyReport(weekly_customer_reports=[report]).model_dump_json()
+    # the anomalies are found with the LAST week values
+    assert '"last_impressions":10' in weekly_reports
+
+    task = _create_task_message("2024-04-14", weekly_reports, "<h2>Report</h2>")
+
+    assert "last_" not in task
+    assert '"impressions_increase": 150.0' in task
+    assert '"historical_quality_score_increase": 50.0' in task
+    assert '"final_urls": [' in task
+
+
+def test_get_weekly_report_for_customer_uses_live_and_latest_attributes() -> None:
+    stored: Dict[str, Dict[str, List[Dict[str, Any]]]] = {
+        resource: {f"2024-04-{day:02d}": [] for day in range(1, 15)}
+        for resource in ["campaign", "ad_group", "keyword_view", "ad_group_ad"]
+    }
+    # stored before the campaign was renamed
+    old_campaign_row = _two_weeks_test_row(
+        "campaign", _two_weeks_test_metrics(10, 1, 1.0, 100, 4), "2024-04-12"
+    )
+    old_campaign_row["campaign"]["name"] = "Old name"
+    stored["campaign"]["2024-04-12"] = [old_campaign_row]
+    # the keyword was changed during the two weeks
+    old_keyword_row = _two_weeks_test_row(
+        "keyword_view", _two_weeks_test_metrics(10, 1, 1.0, 100, 4), "2024-04-02"
+    )
+    old_keyword_row["adGroupCriterion"]["keyword"]["text"] = "old keyword"
+    stored["keyword_view"]["2024-04-02"] = [old_keyword_row]
+    stored["keyword_view"]["2024-04-12"] = [
+        _two_weeks_test_row(
+            "keyword_view", _two_weeks_test_metrics(20, 2, 1.0, 300, 6), "2024-04-12"
+        )
+    ]
+
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.execute_query",
+            side_effect=_execute_query_for_both_weeks_test,
+        ) as mock_execute_query,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._load_daily_metrics",
+            return_value=stored,
+        ),
+    ):
+        report = get_weekly_report_for_customer(-1, -1, "1111", "2024-04-14")
+
+    # only the attributes are queried
+    assert mock_execute_query.call_count == 3
+    assert report.campaigns["1"].name == "Campaign"
+    assert report.campaigns["1"].metrics.impressions == 10
+    keyword = report.campaigns["1"].ad_groups["2"].keywords["3"]
+    assert keyword.text == "keyword"
+    assert keyword.metrics.impressions == 20
+    assert keyword.metrics.last_impressions == 10
+
+
+@pytest.mark.usefixtures("final_urls_health_checker")
+def test_get_weekly_report_for_customer_uses_current_attributes_of_keywords_and_ads() -> (
+    None
+):
+    def execute_query(
+        user_id: int, conv_id: int, customer_ids: List[str], query: str
+    ) -> str:
+        if " FROM ad_group_criterion " in query:
+            # the keyword was changed and the other one removed since the daily rows were stored
+            rows = copy.deepcopy(_ATTRIBUTES_TEST_ROWS["ad_group_criterion"][:1])
+            rows[0]["adGroupCriterion"]["keyword"]["text"] = "changed keyword"
+            return str({customer_ids[0]: rows})
+        return _execute_query_for_both_weeks_test(user_id, conv_id, customer_ids, query)
+
+    stored: Dict[str, Dict[str, List[Dict[str, Any]]]] = {
+        resource: {f"2024-04-{day:02d}": [] for day in range(1, 15)}
+        for resource in ["campaign", "ad_group", "keyword_view", "ad_group_ad"]
+    }
+    removed_keyword_row = _two_weeks_test_row(
+        "keyword_view", _two_weeks_test_metrics(10, 1, 1.0, 100, 4), "2024-04-12"
+    )
+    removed_keyword_row["adGroupCriterion"]["criterionId"] = "10"
+    stored["keyword_view"]["2024-04-12"] = [
+        _two_weeks_test_row(
+            "keyword_view", _two_weeks_test_metrics(20, 2, 1.0, 300, 6), "2024-04-12"
+        ),
+        removed_keyword_row,
+    ]
+
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.execute_query",
+            side_effect=execute_query,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._load_daily_metrics",
+            return_value=stored,
+        ),
+    ):
+        report = get_weekly_report_for_customer(-1, -1, "1111", "2024-04-14")
+
+    ad_group = report.campaigns["1"].ad_groups["2"]
+    assert list(ad_group.keywords) == ["3"]
+    assert ad_group.keywords["3"].text == "changed keyword"
+    assert ad_group.keywords["3"].metrics.impressions == 20
+    # the final url of the ad without activity is still checked
+    assert ad_group.ad_group_ads["8"].final_urls == ["https://broken.airt.ai/"]
+    anomalies = find_weekly_report_anomalies(
+        WeeklyReport(weekly_customer_reports=[report]).model_dump()
+    )
+    assert (
+        "Customer 1111, campaign 'Campaign': final url https://broken.airt.ai/ is not reachable"
+        in anomalies
+    )
+
+
+def test_get_weekly_report_for_customer_without_ad_groups_queries_currency() -> None:
+    def execute_query(
+        user_id: int, conv_id: int, customer_ids: List[str], query: str
+    ) -> str:
+        if query == "SELECT customer.currency_code FROM customer":
+            return str({customer_ids[0]: [{"customer": {"currencyCode": "USD"}}]})
+        return str({customer_ids[0]: []})
+
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.execute_query",
+            side_effect=execute_query,
+        ) as mock_execute_query,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._load_daily_metrics",
+            return_value={},
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._save_daily_metrics",
+        ),
+    ):
+        report = get_weekly_report_for_customer(-1, -1, "1111", "2024-04-14")
+
+    assert mock_execute_query.call_count == 8
+    assert report.currency == "USD"
+    assert report.campaigns == {}
+
+
+def test_create_compared_campaigns_report_keeps_campaigns_without_ad_groups() -> None:
+    rows: Dict[str, List[Dict[str, Any]]] = {
+        "campaign": [
+            _two_weeks_test_row(
+                "campaign", _two_weeks_test_metrics(20, 2, 1.0, 300, 6), "2024-04-12"
+            )
+        ],
+        "ad_group": [],
+        "keyword_view": [],
+        "ad_group_ad": [],
+    }
+
+    report = create_compared_campaigns_report(rows, {}, "2024-04-14")
+
+    assert list(report) == ["1"]
+    assert report["1"].name == "Campaign"
+    assert report["1"].ad_groups == {}
+    assert report["1"].metrics.last_impressions == 0
+
+
+def test_prune_daily_metrics(capsys: pytest.CaptureFixture[str]) -> None:
+    with unittest.mock.patch(
+        "captn.captn_agents.backend.teams._weekly_analysis_team.delete_daily_metrics",
+        return_value=3,
+    ) as mock_delete_daily_metrics:
+        _prune_daily_metrics("2024-04-28")
+
+    # the last 28 days are kept
+    mock_delete_daily_metrics.assert_called_once_with("2024-04-01")
+    assert "Deleted 3 daily metrics rows" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize(
+    "this_week, last_week",
+    [
+        ((10, 5, 0, 3, 100), (5, 5, 0, 0, 300)),
+        ((0, 7, 2, 1, 1), (4, 3, 2, 4, 3)),
+    ],
+)
+def test_compare_weekly_metrics_matches_calculate_metrics_change(
+    this_week: Tuple[int, ...], last_week: Tuple[int, ...]
+) -> None:
+    columns = ["impressions", "clicks", "interactions", "conversions", "cost_micros"]
+    frame = pd.DataFrame(
+        [
+            {
+                **dict(zip(columns, this_week, strict=False)),
+                **{f"last_{c}": v for c, v in zip(columns, last_week, strict=False)},
+            }
+        ]
+    )
+
+    increase = compare_weekly_metrics(frame, columns).iloc[0]
+
+    expected = calculate_metrics_change(
+        Metrics(**dict(zip(columns, this_week, strict=False))),
+        Metrics(**dict(zip(columns, last_week, strict=False))),
+    )
+    for column in columns:
+        expected_increase = getattr(expected, f"{column}_increase")
+        actual_increase = increase[f"{column}_increase"]
+        if expected_increase is None:
+            assert pd.isna(actual_increase), column
+        else:
+            assert round(actual_increase, 2) == expected_increase, column
+
+
+def test_get_two_weeks_daily_rows_fetches_only_missing_days() -> None:
+    resources = ["campaign", "ad_group", "keyword_view", "ad_group_ad"]
+    stored_row = _two_weeks_test_row(
+        "campaign", _two_weeks_test_metrics(1, 1, 0.0, 1, 4), "2024-04-03"
+    )
+    stored: Dict[str, Dict[str, List[Dict[str, Any]]]] = {
+        resource: {f"2024-04-{day:02d}": [] for day in range(1, 12)}
+        for resource in resources
+    }
+    stored["campaign"]["2024-04-03"] = [stored_row]
+    # the day was not stored for one resource level
+    del stored["ad_group"]["2024-04-11"]
+
+    def execute_query(
+        user_id: int, conv_id: int, customer_ids: List[str], query: str
+    ) -> str:
+        resource = query.split(" FROM ")[1].split(" ")[0]
+        row = _two_weeks_test_row(
+            resource, _two_weeks_test_metrics(20, 2, 1.0, 300, 6), "2024-04-12"
+        )
+        return str({customer_ids[0]: [row]})
+
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.execute_query",
+            side_effect=execute_query,
+        ) as mock_execute_query,
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._load_daily_metrics",
+            return_value=stored,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team._save_daily_metrics",
+        ) as mock_save_daily_metrics,
+    ):
+        rows = get_two_weeks_daily_rows(-1, -1, "1111", "2024-04-14")
+
+    assert mock_execute_query.call_count == 4
+    for call in mock_execute_query.call_args_list:
+        assert (
+            "segments.date BETWEEN '2024-04-11' AND '2024-04-14'"
+            in call.kwargs["query"]
+        )
+
+    customer_id, saved_rows = mock_save_daily_metrics.call_args.args
+    assert customer_id == "1111"
+    assert sorted(saved_rows) == sorted(resources)
+    assert list(saved_rows["campaign"]) == [
+        "2024-04-11",
+        "2024-04-12",
+        "2024-04-13",
+        "2024-04-14",
+    ]
+    assert len(saved_rows["campaign"]["2024-04-12"]) == 1
+    assert saved_rows["campaign"]["2024-04-13"] == []
+
+    assert [row["segments"]["date"] for row in rows["campaign"]] == [
+        "2024-04-03",
+        "2024-04-12",
+    ]
+
+
 def test_google_ads_api_call_reties_three_times() -> None:
     with unittest.mock.patch(
         "captn.captn_agents.backend.teams._weekly_analysis_team.list_accessible_customers"
@@ -1270,21 +1585,15 @@ def test_calculate_metrics_change() -> None:
         historical_landing_page_quality_score="BELOW_AVERAGE",
         historical_creative_quality_score="AVERAGE",
         historical_quality_score_increase=None,
+        last_impressions=9,
+        last_clicks=1,
+        last_interactions=1,
+        last_conversions=0,
+        last_cost_micros=170000,
     )
     assert excepted_result == result
 
 
-def test_create_date_query() -> None:
-    date = "2024-05-15"
-    this_week_query = _create_date_query(date, week="THIS")
-    excepted = "segments.date BETWEEN '2024-05-09' AND '2024-05-15'"
-    assert this_week_query == excepted
-
-    last_week_query = _create_date_query(date, week="LAST")
-    excepted = "segments.date BETWEEN '2024-05-02' AND '2024-05-08'"
-    assert last_week_query == excepted
-
-
 def test_check_if_any_campaign_exists_returns_true() -> None:
     campaign = Campaign(
         id="1212",
@@ -1344,6 +1653,50 @@ def test_get_weekly_report_when_there_are_no_campaigns() -> None:
         )
 
 
+def test_get_weekly_report_processes_customers_in_parallel_and_keeps_order() -> None:
+    customer_ids = ["111", "222", "333"]
+    barrier = threading.Barrier(len(customer_ids), timeout=10)
+
+    def _get_weekly_report_for_customer(
+        user_id: int, conv_id: int, customer_id: str, date: str
+    ) -> WeeklyCustomerReports:
+        # fails with BrokenBarrierError if the customers are not processed concurrently
+        barrier.wait()
+        campaign = Campaign(
+            id="1",
+            name="Campaign",
+            metrics=Metrics(
+                impressions=1, clicks=0, interactions=0, conversions=0, cost_micros=0
+            ),
+            ad_groups={},
+        )
+        return WeeklyCustomerReports(
+            customer_id=customer_id, currency="USD", campaigns={"1": campaign}
+        )
+
+    with (
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.google_ads_api_call",
+            return_value=customer_ids,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.get_weekly_report_for_customer",
+            side_effect=_get_weekly_report_for_customer,
+        ),
+        unittest.mock.patch(
+            "captn.captn_agents.backend.teams._weekly_analysis_team.WEEKLY_ANALYSIS_MAX_CONCURRENT_CUSTOMERS",
+            len(customer_ids),
+        ),
+    ):
+        weekly_report = get_weekly_report(date="2024-05-15", user_id=13, conv_id=12)
+
+    assert weekly_report is not None
+    assert [
+        customer_report["customer_id"]
+        for customer_report in json.loads(weekly_report)["weekly_customer_reports"]
+    ] == customer_ids
+
+
 def test_get_day_of_week() -> None:
     assert _get_day_of_week("2024-06-09") == "Sunday"
     assert _get_day_of_week("2024-06-10") == "Monday"
@@ -1369,16 +1722,16 @@ class TestWeeklyAnalysisTeam:
         )
 
         agent_number_of_functions_dict = {
-            "google_ads_specialist": 4,
-            "copywriter": 4,
-            "digital_strategist": 4,
-            "account_manager": 4,
+            "google_ads_specialist": 5,
+            "copywriter": 5,
+            "digital_strategist": 5,
+            "account_manager": 5,
             "user_proxy": 0,
         }
 
         helper_test_init(
             team=weekly_analysis_team,
-            number_of_registered_executions=4,
+            number_of_registered_executions=5,
             agent_number_of_functions_dict=agent_number_of_functions_dict,
             team_class=WeeklyAnalysisTeam,
         )
@@ -1386,7 +1739,7 @@ class TestWeeklyAnalysisTeam:
     def test_execute_weekly_analysis_workflow(self) -> None:
         with (
             unittest.mock.patch(
-                "captn.captn_agents.backend.teams._weekly_analysis_team.get_user_ids_and_emails",
+                "captn.captn_agents.backend.teams._weekly_analysis_team.get_authenticated_user_ids_and_emails",
                 return_value="""{"1": "robert@airt.ai"}""",
             ),
             unittest.mock.patch(
@@ -1396,10 +1749,6 @@ class TestWeeklyAnalysisTeam:
                     "f0d2e864-9fe2-4fa0-b9a7-e8381ed14ef9",
                 ),
             ),
-            unittest.mock.patch(
-                "captn.captn_agents.backend.teams._weekly_analysis_team.get_login_url",
-                return_value={"login_url": ALREADY_AUTHENTICATED},
-            ),
             unittest.mock.patch(
                 "captn.captn_agents.backend.teams._weekly_analysis_team.get_weekly_report"
             ) as mock_get_weekly_report,
@@ -0,0 +1,105 @@
+from unittest.mock import MagicMock
+
+import httpx
+import openai
+import pytest
+
+from captn.captn_agents.backend.retry_policy import (
+    RetryPolicy,
+    is_permanent_error,
+    is_transient_error,
+)
+from tests.ci.conftest import FakeClock
+
+
+def _response(status_code: int) -> MagicMock:
+    return MagicMock(status_code=status_code, headers={})
+
+
+@pytest.fixture()
+def policy(clock: FakeClock) -> RetryPolicy:
+    return RetryPolicy(timeout=10, max_delay=4, clock=clock, sleep=clock.sleep)
+
+
+@pytest.mark.parametrize(
+    ("e", "permanent", "transient"),
+    [
+        (httpx.ReadTimeout("Timeout"), False, True),
+        (TimeoutError(), False, True),
+        (
+            openai.RateLimitError("Rate limit", response=_response(429), body=None),
+            False,
+            True,
+        ),
+        (
+            openai.AuthenticationError(
+                "Invalid key", response=_response(401), body=None
+            ),
+            True,
+            False,
+        ),
+        (
+            openai.BadRequestError(
+                "Too many tokens",
+                response=_response(400),
+                body={"code": "context_length_exceeded"},
+            ),
+            True,
+            False,
+        ),
+        (ValueError("Invalid value"), False, False),
+    ],
+)
+def test_error_classification(e: Exception, permanent: bool, transient: bool) -> None:
+    assert is_permanent_error(e) == permanent
+    assert is_transient_error(e) == transient
+
+
+def test_backoff_is_jittered_and_capped(policy: RetryPolicy) -> None:
+    for attempt in range(10):
+        delays = {policy.backoff(attempt, base_delay=1) for _ in range(20)}
+        assert len(delays) > 1
+        assert all(0 <= d <= min(4, 2**attempt) for d in delays)
+
+
+def test_wait_without_deadline(clock: FakeClock, policy: RetryPolicy) -> None:
+    policy.timeout = 0
+
+    assert policy.wait(attempt=0, base_delay=1, caller="test")
+    assert len(clock.sleeps) == 1
+
+
+def test_wait_stops_at_the_deadline(clock: FakeClock, policy: RetryPolicy) -> None:
+    with policy.deadline():
+        attempts = 0
+        while policy.wait(attempt=attempts, base_delay=1, caller="test"):
+            attempts += 1
+
+    assert attempts > 0
+    # nothing sleeps past the deadline
+    assert clock.now < 10
+
+
+def test_deadline_starts_at_the_first_retry(
+    clock: FakeClock, policy: RetryPolicy
+) -> None:
+    with policy.deadline():
+        # the long conversation before the first error doesn't use the budget
+        clock.now = 100
+        assert policy.remaining() == 10
+
+        assert policy.wait(attempt=0, base_delay=1, caller="test")
+        assert policy.remaining() == 110 - clock.now
+    assert policy.remaining() == float("inf")
+
+
+def test_nested_deadline_is_shared(clock: FakeClock, policy: RetryPolicy) -> None:
+    with policy.deadline():
+        assert policy.wait(attempt=0, base_delay=1, caller="test")
+        clock.now = 8
+        with policy.deadline():
+            assert policy.remaining() == 2
+            policy.wait(attempt=0, base_delay=1, caller="test")
+        clock.now = 8
+        assert policy.remaining() == 2
+    assert policy.remaining() == float("inf")
@@ -7,13 +7,16 @@ from unittest.mock import MagicMock
 
 import pytest
 from autogen.agentchat import AssistantAgent, UserProxyAgent
+from autogen.function_utils import get_function_schema
 from typing_extensions import Annotated
 
 from captn.captn_agents.backend.toolboxes.base import (
     FunctionInfo,
     Toolbox,
     _args_kwargs_to_kwargs,
+    _tool_schemas,
 )
+from captn.captn_agents.backend.tools import get_get_info_from_the_web_page
 
 
 def test_args_kwargs_to_kwargs() -> None:
@@ -190,22 +193,12 @@ class TestToolbox:
         )
 
     @pytest.fixture
-    def agent_mocks(self) -> Dict[str, MagicMock]:
+    def agent_mocks(self) -> Iterator[Dict[str, MagicMock]]:
         # agent
 
         agent = MagicMock()
-        agent.register_for_llm = MagicMock()
-
-        register_for_llm = MagicMock()
-
-        def agent_side_effect(*args: Any, **kwargs: Any) -> Callable[..., Any]:
-            def _inner(f: Callable[..., Any]) -> Callable[..., Any]:
-                register_for_llm(*args, **kwargs, function=f)
-                return f
-
-            return _inner
-
-        agent.register_for_llm.side_effect = agent_side_effect
+        agent.name = "agent"
+        agent.llm_config = {"model": "gpt-4", "tools": None}
 
         # user proxy
 
@@ -223,19 +216,22 @@ class TestToolbox:
 
         user_proxy.register_for_execution.side_effect = user_proxy_side_effect
 
-        return dict(  # noqa: C408 unnecessary dict call
-            agent=agent,
-            register_for_llm=register_for_llm,
-            user_proxy=user_proxy,
-            register_for_execution=register_for_execution,
-        )
+        with unittest.mock.patch(
+            "captn.captn_agents.backend.toolboxes.base.OpenAIWrapper"
+        ) as openai_wrapper:
+            yield dict(  # noqa: C408 unnecessary dict call
+                agent=agent,
+                openai_wrapper=openai_wrapper,
+                user_proxy=user_proxy,
+                register_for_execution=register_for_execution,
+            )
 
     def test_add_functions_to_agent_with_mock(
         self, agent_mocks: Dict[str, MagicMock]
     ) -> None:
         # create a mock agent and user_proxy
         agent = agent_mocks["agent"]
-        register_for_llm = agent_mocks["register_for_llm"]
+        openai_wrapper = agent_mocks["openai_wrapper"]
         user_proxy = agent_mocks["user_proxy"]
         register_for_execution = agent_mocks["register_for_execution"]
 
@@ -256,27 +252,70 @@ class TestToolbox:
             == registered_functions["f"]
         )
 
-        agent.register_for_llm.assert_any_call(
-            name="f", description="this is description of the function f"
-        )
-        register_for_llm.assert_any_call(
-            name="f",
-            description="this is description of the function f",
-            function=wrapped_f,
+        # the tools are registered at once and the client of the agent is created only once
+        tools = agent.llm_config["tools"]
+        assert [tool["function"]["name"] for tool in tools] == ["f", "g"]
+        assert (
+            tools[0]["function"]["description"]
+            == "this is description of the function f"
         )
+        # context is not a parameter of the tool
+        assert list(tools[1]["function"]["parameters"]["properties"]) == ["i", "s"]
+        openai_wrapper.assert_called_once_with(**agent.llm_config)
+        assert agent.client == openai_wrapper.return_value
 
         user_proxy.register_for_execution.assert_any_call(name="f")
         register_for_execution.assert_any_call(name="f", function=wrapped_f)
-
-        agent.register_for_llm.assert_any_call(
-            name="g", description="this is description of the function g"
+        register_for_execution.assert_any_call(
+            name="g", function=registered_functions["g"].function
         )
-        register_for_llm.assert_any_call(
-            name="g",
-            description="this is description of the function g",
-            function=registered_functions["g"].function,
+
+    def test_add_functions_to_multiple_agents(
+        self, agent_mocks: Dict[str, MagicMock]
+    ) -> None:
+        user_proxy = agent_mocks["user_proxy"]
+        agents = [MagicMock(llm_config={"model": "gpt-4"}) for _ in range(3)]
+
+        toolbox = Toolbox()
+        toolbox.add_function("this is description of the function g")(self.g)
+
+        with unittest.mock.patch(
+            "captn.captn_agents.backend.toolboxes.base.get_function_schema",
+            wraps=get_function_schema,
+        ) as mock_get_function_schema:
+            for agent in agents:
+                toolbox.add_to_agent(agent, user_proxy)
+            # the schemas are shared by the toolboxes of the same functions
+            another_toolbox = Toolbox()
+            another_toolbox.add_function("this is description of the function g")(
+                self.g
+            )
+            another_toolbox.add_to_agent(agents[0], user_proxy)
+
+        assert mock_get_function_schema.call_count <= 1
+        # the functions are registered for execution only once per toolbox and user proxy
+        assert user_proxy.register_for_execution.call_count == 2
+        assert all(
+            [tool["function"]["name"] for tool in agent.llm_config["tools"]] == ["g"]
+            for agent in agents
         )
 
+    def test_schemas_of_functions_created_per_toolbox_are_shared(
+        self, agent_mocks: Dict[str, MagicMock]
+    ) -> None:
+        user_proxy = agent_mocks["user_proxy"]
+        schemas_before = len(_tool_schemas)
+
+        for _ in range(3):
+            toolbox = Toolbox()
+            # a new function wrapped in lru_cache for every toolbox
+            toolbox.add_function("Retrieve info from the web page")(
+                get_get_info_from_the_web_page()
+            )
+            toolbox.add_to_agent(MagicMock(llm_config={"model": "gpt-4"}), user_proxy)
+
+        assert len(_tool_schemas) <= schemas_before + 1
+
     def test_add_functions_to_agent_with_openai(self) -> None:
         agent = AssistantAgent(
             name="agent",
@@ -45,7 +45,7 @@ class TestTools:
         self.toolbox.add_to_agent(agent, user_proxy)
         llm_config = agent.llm_config
 
-        check_llm_config_total_tools(llm_config, 7)
+        check_llm_config_total_tools(llm_config, 8)
         check_llm_config_descriptions(
             llm_config,
             {
@@ -55,6 +55,7 @@ class TestTools:
                 "change_google_account": "This method should be used only when the client explicitly asks for the change of the Google account",
                 "list_accessible_customers": "List all the customers accessible to the user",
                 "execute_query": "Query the Google Ads API.",
+                "get_query_result_page": "Retrieve another page of the 'execute_query' result.",
                 "create_campaign": "Creates Google Ads Campaign. VERY IMPORTANT:",
             },
         )
@@ -49,7 +49,7 @@ class TestGoogleAdsTeamTools:
     def test_llm_config(self) -> None:
         llm_config = self.agent.llm_config
 
-        check_llm_config_total_tools(llm_config, 21)
+        check_llm_config_total_tools(llm_config, 22)
 
         name_desc_dict = {
             "get_info_from_the_web_page": "Retrieve wanted information from the web page.",
@@ -58,6 +58,7 @@ class TestGoogleAdsTeamTools:
             "change_google_account": "This method should be used only when the client explicitly asks for the change of the Google account",
             "list_accessible_customers": "List all the customers accessible to the user",
             "execute_query": "Query the Google Ads API.",
+            "get_query_result_page": "Retrieve another page of the 'execute_query' result.",
             "create_campaign": "Creates Google Ads Campaign. VERY IMPORTANT:",
             "create_keyword_for_ad_group": r"Creates \(regular and negative\) keywords for Ad Group",
             "update_ad_group_ad": "Update Google Ad.",
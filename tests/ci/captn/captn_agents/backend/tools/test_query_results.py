@@ -0,0 +1,101 @@
+from typing import Any, Dict
+
+import pytest
+
+from captn.captn_agents.backend.tools._query_results import (
+    QueryResultPages,
+    get_query_result_page,
+    shape_query_result,
+)
+
+CAMPAIGN_ROW = {
+    "campaign": {
+        "resourceName": "customers/2324127278/campaigns/20761810762",
+        "id": "20761810762",
+        "name": "Website traffic, Search",
+    },
+    "metrics": {"clicks": "5", "costMicros": "22222"},
+}
+
+
+def _create_response(number_of_rows: int) -> Dict[str, Any]:
+    return {"2324127278": [CAMPAIGN_ROW] * number_of_rows, "7119828439": []}
+
+
+def test_shape_query_result_returns_compact_table() -> None:
+    query_results: Dict[str, QueryResultPages] = {}
+    result = shape_query_result(
+        str(_create_response(2)),
+        query="SELECT campaign.id, campaign.name, metrics.clicks, metrics.cost_micros FROM campaign",
+        query_results=query_results,
+    )
+
+    expected = """customer_id,campaign.id,campaign.name,metrics.clicks,metrics.costMicros
+2324127278,20761810762,"Website traffic, Search",5,22222
+2324127278,20761810762,"Website traffic, Search",5,22222
+No rows returned for customer(s): 7119828439"""
+    assert result == expected
+    assert query_results == {}
+
+
+def test_shape_query_result_keeps_explicitly_selected_resource_names() -> None:
+    result = shape_query_result(
+        str({"2324127278": [CAMPAIGN_ROW]}),
+        query="SELECT campaign.resource_name, campaign.id FROM campaign",
+        query_results={},
+    )
+
+    assert "campaign.resourceName" in result.splitlines()[0]
+    assert "customers/2324127278/campaigns/20761810762" in result
+
+
+@pytest.mark.parametrize(
+    "query_result",
+    [
+        "The query resulted with an empty response.",
+        "['1111', '2222']",
+    ],
+)
+def test_shape_query_result_returns_unknown_results_unchanged(
+    query_result: str,
+) -> None:
+    assert (
+        shape_query_result(query_result, query=None, query_results={}) == query_result
+    )
+
+
+def test_shape_query_result_splits_large_results_into_pages() -> None:
+    query_results: Dict[str, QueryResultPages] = {}
+    result = shape_query_result(
+        str(_create_response(100)),
+        query=None,
+        query_results=query_results,
+        max_tokens=200,
+    )
+
+    assert list(query_results.keys()) == ["query_result_1"]
+    pages = query_results["query_result_1"].pages
+    assert len(pages) > 1
+    assert query_results["query_result_1"].total_rows == 100
+    assert (
+        sum(len(page.splitlines()) - 1 for page in pages) == 100
+    ), "every row must be in exactly one page"
+    assert result.startswith(pages[0])
+    assert "get_query_result_page" in result
+    assert "result_id='query_result_1' and page=2" in result
+
+    last_page = get_query_result_page(
+        query_results, result_id="query_result_1", page=len(pages)
+    )
+    assert last_page.startswith(pages[-1])
+    assert "get_query_result_page" not in last_page
+
+
+def test_get_query_result_page_raises_error_for_unknown_result_or_page() -> None:
+    query_results = {"query_result_1": QueryResultPages(pages=["a", "b"], total_rows=2)}
+
+    with pytest.raises(ValueError, match="Unknown result_id"):
+        get_query_result_page(query_results, result_id="query_result_2", page=1)
+
+    with pytest.raises(ValueError, match="Page 3 does not exist"):
+        get_query_result_page(query_results, result_id="query_result_1", page=3)
@@ -0,0 +1,120 @@
+import asyncio
+import unittest.mock
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+import httpx
+import pytest
+
+from captn.captn_agents.backend.tools._url_health_checker import (
+    URLHealthChecker,
+    normalize_url,
+)
+
+
+class FakeServer:
+    def __init__(self) -> None:
+        self.requests: List[str] = []
+        self.in_flight: Dict[str, int] = defaultdict(int)
+        self.max_in_flight: Dict[str, int] = defaultdict(int)
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        self.requests.append(f"{request.method} {request.url}")
+        self.in_flight[host] += 1
+        self.max_in_flight[host] = max(self.max_in_flight[host], self.in_flight[host])
+        try:
+            await asyncio.sleep(0.01)
+            if host == "not-reachable.com":
+                raise httpx.ConnectError("Name or service not known")
+            if host == "no-head.com" and request.method == "HEAD":
+                return httpx.Response(405)
+            if request.url.path == "/missing":
+                return httpx.Response(404)
+            return httpx.Response(200)
+        finally:
+            self.in_flight[host] -= 1
+
+
+@pytest.fixture
+def server() -> FakeServer:
+    return FakeServer()
+
+
+@pytest.fixture
+def checker(server: FakeServer) -> URLHealthChecker:
+    return URLHealthChecker(
+        max_requests_per_host=2, transport=httpx.MockTransport(server)
+    )
+
+
+def test_normalize_url() -> None:
+    assert normalize_url("airt.ai") == "https://airt.ai"
+    assert normalize_url(" http://airt.ai/ ") == "http://airt.ai/"
+
+
+def test_get_status_codes(server: FakeServer, checker: URLHealthChecker) -> None:
+    status_codes = checker.get_status_codes(
+        [
+            "https://example.com/",
+            "https://example.com/missing",
+            "https://no-head.com/",
+            "https://not-reachable.com/",
+        ]
+    )
+
+    assert status_codes == {
+        "https://example.com/": 200,
+        "https://example.com/missing": 404,
+        "https://no-head.com/": 200,
+        "https://not-reachable.com/": None,
+    }
+    assert "GET https://no-head.com/" in server.requests
+    assert "GET https://example.com/missing" not in server.requests
+
+
+def test_get_status_codes_checks_every_url_once(
+    server: FakeServer, checker: URLHealthChecker
+) -> None:
+    urls = ["https://example.com/", "example.com/"] * 100
+
+    assert set(checker.get_status_codes(urls).values()) == {200}
+    assert checker.get_status_code("https://example.com/") == 200
+    assert server.requests == ["HEAD https://example.com/"]
+
+    checker.clear()
+    checker.get_status_code("https://example.com/")
+    assert len(server.requests) == 2
+
+
+def test_get_status_codes_limits_requests_per_host(
+    server: FakeServer, checker: URLHealthChecker
+) -> None:
+    urls = [f"https://example.com/{i}" for i in range(10)] + [
+        f"https://other.com/{i}" for i in range(10)
+    ]
+
+    checker.get_status_codes(urls)
+
+    assert server.max_in_flight == {"example.com": 2, "other.com": 2}
+    assert Counter(request.split()[0] for request in server.requests) == {"HEAD": 20}
+
+
+@pytest.mark.asyncio
+async def test_get_status_codes_from_running_event_loop(
+    checker: URLHealthChecker,
+) -> None:
+    assert checker.get_status_code("https://example.com/") == 200
+
+
+def test_get_status_codes_from_cache_does_not_start_event_loop(
+    checker: URLHealthChecker,
+) -> None:
+    checker.get_status_codes(["https://example.com/", "https://other.com/"])
+
+    with unittest.mock.patch("asyncio.run") as mock_run:
+        assert checker.get_status_codes(["example.com/", "https://other.com/"]) == {
+            "example.com/": 200,
+            "https://other.com/": 200,
+        }
+        mock_run.assert_not_called()
@@ -1,8 +1,9 @@
+import json
 import unittest
 from datetime import datetime
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import autogen
 import pandas as pd
@@ -22,6 +23,7 @@ from captn.captn_agents.application import (
     router,
 )
 from captn.captn_agents.backend.config import Config
+from captn.captn_agents.backend.teams._team_progress import _report_progress
 from captn.captn_agents.backend.tools._functions import TeamResponse
 
 
@@ -254,6 +256,48 @@ class TestConsoleIOWithWebsockets:
         assert success_dict["success"]
         print("Test passed.", flush=True)
 
+    def test_progress_is_sent_before_the_last_message(
+        self, setup: Callable[[None], None]
+    ) -> None:
+        def _start_or_continue_conversation(**kwargs: Any) -> Tuple[str, str]:
+            _report_progress(event="agent_turn_started", agent="account_manager")
+            return "default_team", "TERMINATE"
+
+        messages = []
+        with IOWebsockets.run_server_in_thread(on_connect=on_connect, port=8765) as uri:
+            with ws_connect(uri) as websocket:
+                with unittest.mock.patch(
+                    "captn.captn_agents.application.start_or_continue_conversation",
+                    side_effect=_start_or_continue_conversation,
+                ):
+                    # the progress is sent only if it is requested
+                    request = self.request.model_copy(update={"stream_progress": True})
+                    websocket.send(request.model_dump_json())
+
+                    while True:
+                        message = websocket.recv()
+                        message = (
+                            message.decode("utf-8")
+                            if isinstance(message, bytes)
+                            else message
+                        )
+                        messages.append(message)
+                        if "TERMINATE" in message:
+                            break
+
+        progress = [
+            json.loads(message) for message in messages if '"progress"' in message
+        ]
+        assert progress == [
+            {
+                "type": "progress",
+                "event": "agent_turn_started",
+                "team": "unknown",
+                "agent": "account_manager",
+            }
+        ]
+        assert messages[-1].strip() == "TERMINATE"
+
     def test_on_connect_prometheus_error_logging(
         self, setup: Callable[[None], None]
     ) -> None:
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import threading
+import unittest.mock
+from typing import Any, List
+
+import pytest
+import websockets
+
+from captn.captn_agents.application import CaptnAgentRequest
+from captn.captn_agents.websocket_server import (
+    BUSY_MESSAGE,
+    ConversationQueueFullError,
+    ConversationScheduler,
+    serve_websockets,
+)
+
+
+async def _start(
+    scheduler: ConversationScheduler,
+    user_id: int,
+    started: List[int],
+    finished: asyncio.Event,
+    positions: List[Any],
+) -> None:
+    async def _on_position(position: int) -> None:
+        positions.append((user_id, position))
+
+    async with scheduler.slot(user_id, on_position=_on_position):
+        started.append(user_id)
+        await finished.wait()
+
+
+class TestConversationScheduler:
+    @pytest.mark.asyncio
+    async def test_conversations_above_the_limit_are_queued(self) -> None:
+        scheduler = ConversationScheduler(
+            max_conversations=2, max_conversations_per_user=1
+        )
+        started: List[int] = []
+        positions: List[Any] = []
+        finished = [asyncio.Event() for _ in range(4)]
+
+        tasks = [
+            asyncio.create_task(_start(scheduler, user_id, started, f, positions))
+            for user_id, f in zip([1, 1, 2, 3], finished, strict=True)
+        ]
+        await asyncio.sleep(0.01)
+
+        # the second conversation of the user 1 doesn't block the user 2
+        assert started == [1, 2]
+        assert scheduler.running == 2
+        assert scheduler.queued == 2
+        assert positions == [(1, 1), (3, 2)]
+
+        finished[2].set()
+        await asyncio.sleep(0.01)
+        assert started == [1, 2, 3]
+        # the position of the second conversation of the user 1 didn't change
+        assert positions == [(1, 1), (3, 2)]
+
+        finished[0].set()
+        await asyncio.sleep(0.01)
+        assert started == [1, 2, 3, 1]
+        assert scheduler.queued == 0
+
+        finished[1].set()
+        finished[3].set()
+        await asyncio.gather(*tasks)
+        assert scheduler.running == 0
+        scheduler.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_queue_is_limited(self) -> None:
+        scheduler = ConversationScheduler(
+            max_conversations=1, max_queued_conversations=1
+        )
+        started: List[int] = []
+        finished = asyncio.Event()
+        tasks = [
+            asyncio.create_task(_start(scheduler, user_id, started, finished, []))
+            for user_id in (1, 2)
+        ]
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(ConversationQueueFullError):
+            async with scheduler.slot(3):
+                pass
+
+        finished.set()
+        await asyncio.gather(*tasks)
+        assert started == [1, 2]
+        scheduler.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_cancelled_conversation_leaves_the_queue(self) -> None:
+        scheduler = ConversationScheduler(max_conversations=1)
+        started: List[int] = []
+        finished = asyncio.Event()
+        first = asyncio.create_task(_start(scheduler, 1, started, finished, []))
+        second = asyncio.create_task(_start(scheduler, 2, started, finished, []))
+        await asyncio.sleep(0.01)
+        assert scheduler.queued == 1
+
+        second.cancel()
+        await asyncio.sleep(0.01)
+        assert scheduler.queued == 0
+
+        finished.set()
+        await first
+        assert started == [1]
+        assert scheduler.running == 0
+        scheduler.shutdown()
+
+
+def _create_request(user_id: int, stream_progress: bool = False) -> str:
+    return CaptnAgentRequest(
+        message="Hi",
+        user_id=user_id,
+        conv_id=1,
+        all_messages=[],
+        agent_chat_history=None,
+        is_continue_daily_analysis=False,
+        stream_progress=stream_progress,
+    ).model_dump_json()
+
+
+class TestServeWebsockets:
+    @pytest.mark.asyncio
+    async def test_conversations_are_queued(self) -> None:
+        release = threading.Event()
+
+        def _run_conversation(
+            iostream: Any, request: CaptnAgentRequest, **kwargs: Any
+        ) -> None:
+            iostream.print(f"started {request.user_id}")
+            release.wait(timeout=10)
+            iostream.print(f"finished {request.user_id}")
+
+        scheduler = ConversationScheduler(max_conversations=1)
+        with unittest.mock.patch(
+            "captn.captn_agents.websocket_server.run_conversation",
+            side_effect=_run_conversation,
+        ):
+            async with serve_websockets("127.0.0.1", 8766, scheduler) as uri:
+                async with (
+                    websockets.connect(uri) as first,
+                    websockets.connect(uri) as second,
+                ):
+                    await first.send(_create_request(user_id=1))
+                    assert await first.recv() == "started 1\n"
+
+                    # the position in the queue is sent with the progress
+                    await second.send(_create_request(user_id=2, stream_progress=True))
+                    assert json.loads(await second.recv()) == {
+                        "type": "queue",
+                        "position": 1,
+                    }
+
+                    release.set()
+                    assert await first.recv() == "finished 1\n"
+                    assert await second.recv() == "started 2\n"
+                    assert await second.recv() == "finished 2\n"
+
+    @pytest.mark.asyncio
+    async def test_ping_and_full_queue(self) -> None:
+        scheduler = ConversationScheduler(
+            max_conversations=1, max_queued_conversations=0
+        )
+        # a conversation of another user is running
+        scheduler._running[2] = 1
+        async with serve_websockets("127.0.0.1", 8766, scheduler) as uri:
+            async with websockets.connect(uri) as websocket:
+                await websocket.send("ping")
+                assert await websocket.recv() == "pong\n"
+
+            async with websockets.connect(uri) as websocket:
+                await websocket.send(_create_request(user_id=1))
+                assert await websocket.recv() == BUSY_MESSAGE + "\n"
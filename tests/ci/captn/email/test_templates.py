@@ -0,0 +1,45 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from captn.email.templates import CompiledTemplate, load_template
+
+
+def test_render() -> None:
+    template = CompiledTemplate(
+        "<style>p {color: red;}</style><p>{name}: {value} {value}</p>"
+    )
+
+    assert template.placeholders == ["name", "value", "value"]
+    assert (
+        template.render(name="Clicks", value="5")
+        == "<style>p {color: red;}</style><p>Clicks: 5 5</p>"
+    )
+
+
+def test_render_keeps_unknown_placeholders() -> None:
+    template = CompiledTemplate("{todays_date} {proposed_action}")
+
+    rendered = template.render(todays_date="2024-02-05")
+
+    assert rendered == "2024-02-05 {proposed_action}"
+    assert CompiledTemplate(rendered).render(proposed_action="<ul></ul>") == (
+        "2024-02-05 <ul></ul>"
+    )
+
+
+def test_render_does_not_replace_placeholders_in_values() -> None:
+    template = CompiledTemplate("{campaign_name} {clicks}")
+
+    assert template.render(campaign_name="{clicks}", clicks="5") == "{clicks} 5"
+
+
+def test_load_template_reads_file_once() -> None:
+    with TemporaryDirectory() as d:
+        path = Path(d) / "template.html"
+        path.write_text("<p>{customer_id}</p>")
+
+        template = load_template(path)
+        path.write_text("changed")
+
+        assert load_template(path) is template
+        assert template.render(customer_id="123") == "<p>123</p>"
@@ -0,0 +1,140 @@
+import unittest.mock
+from typing import List
+
+import pytest
+import requests
+
+from captn.captn_agents.backend.teams._weekly_analysis_team import (
+    google_ads_api_call,
+)
+from captn.google_ads.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    GoogleAdsAPIError,
+    RetryBudget,
+    get_circuit_key,
+    is_transient_google_ads_error,
+)
+from tests.ci.conftest import FakeClock
+
+
+def _fail(breaker: CircuitBreaker, key: str, e: Exception) -> None:
+    with pytest.raises(type(e)), breaker.guard(key):
+        raise e
+
+
+def test_circuit_breaker_opens_after_threshold_and_probes_after_recovery_timeout(
+    clock: FakeClock,
+) -> None:
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30, clock=clock)
+
+    _fail(breaker, "key", ValueError("Error1"))
+    assert breaker.get_state("key") == "closed"
+    _fail(breaker, "key", ValueError("Error2"))
+    assert breaker.get_state("key") == "open"
+
+    with pytest.raises(CircuitOpenError), breaker.guard("key"):
+        pass
+    # other keys are not affected
+    with breaker.guard("other_key"):
+        pass
+
+    clock.now = 31
+    assert breaker.get_state("key") == "half_open"
+    # failed probe opens the circuit again
+    _fail(breaker, "key", ValueError("Error3"))
+    assert breaker.get_state("key") == "open"
+
+    clock.now = 62
+    with breaker.guard("key"):
+        pass
+    assert breaker.get_state("key") == "closed"
+
+
+def test_circuit_breaker_ignores_non_transient_errors() -> None:
+    breaker = CircuitBreaker(
+        failure_threshold=1, is_failure=is_transient_google_ads_error
+    )
+
+    _fail(breaker, "key", ValueError("Invalid query"))
+    assert breaker.get_state("key") == "closed"
+
+    _fail(breaker, "key", GoogleAdsAPIError("Bad gateway", status_code=502))
+    assert breaker.get_state("key") == "open"
+
+
+@pytest.mark.parametrize(
+    "e, expected",
+    [
+        (requests.ConnectionError(), True),
+        (requests.Timeout(), True),
+        (GoogleAdsAPIError("error", status_code=503), True),
+        (GoogleAdsAPIError("error", status_code=400), False),
+        (ValueError("status = StatusCode.UNAVAILABLE"), True),
+        (ValueError("Unrecognized field in the query"), False),
+    ],
+)
+def test_is_transient_google_ads_error(e: Exception, expected: bool) -> None:
+    assert is_transient_google_ads_error(e) == expected
+
+
+def test_retry_budget(clock: FakeClock) -> None:
+    budget = RetryBudget(budget=10, window=100, clock=clock)
+
+    budget.consume(conv_id=1, seconds=7)
+    budget.consume(conv_id=1, seconds=4)
+    assert budget.remaining(conv_id=1) == -1
+    assert budget.remaining(conv_id=2) == 10
+
+    clock.now = 101
+    assert budget.remaining(conv_id=1) == 10
+
+
+def test_retry_budget_removes_expired_windows(clock: FakeClock) -> None:
+    budget = RetryBudget(budget=10, window=100, clock=clock)
+
+    for conv_id in range(3):
+        budget.consume(conv_id=conv_id, seconds=1)
+    clock.now = 101
+    budget.consume(conv_id=3, seconds=1)
+
+    assert list(budget._spent) == [3]
+
+
+def test_get_circuit_key() -> None:
+    model = unittest.mock.MagicMock(customer_id="1111")
+    assert (
+        get_circuit_key(
+            unittest.mock.MagicMock(),
+            user_id=1,
+            model=model,
+            endpoint="/add-items-to-page-feed",
+        )
+        == "/add-items-to-page-feed:1111"
+    )
+
+    def execute_query() -> None:
+        pass
+
+    customer_ids: List[str] = ["2222", "1111"]
+    assert (
+        get_circuit_key(execute_query, user_id=1, customer_ids=customer_ids)
+        == "execute_query:1111,2222"
+    )
+    assert get_circuit_key(execute_query, user_id=1) == "execute_query:user:1"
+
+
+def test_google_ads_api_call_fails_fast_when_circuit_is_open() -> None:
+    breaker = CircuitBreaker(
+        failure_threshold=1, is_failure=is_transient_google_ads_error
+    )
+    function = unittest.mock.MagicMock(
+        side_effect=GoogleAdsAPIError("Service unavailable", status_code=503)
+    )
+    with unittest.mock.patch(
+        "captn.google_ads.circuit_breaker.GOOGLE_ADS_CIRCUIT_BREAKER", breaker
+    ):
+        with pytest.raises(CircuitOpenError):
+            google_ads_api_call(function=function, user_id=-1, conv_id=-1)
+
+    assert function.call_count == 1
@@ -30,6 +30,26 @@ def llm_config() -> Dict[str, List[Dict[str, str]]]:
     }
 
 
+class FakeClock:
+    """The clock of the caches, registries and retries moved forward by the tests."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: List[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture()
+def clock() -> FakeClock:
+    return FakeClock()
+
+
 def create_weather_fastapi_app(host: str, port: int) -> FastAPI:
     app = FastAPI(
         title="Weather",
@@ -1,11 +1,13 @@
+import json
 import unittest
-from typing import Any, Dict, List, Union
-from unittest.mock import MagicMock
+from typing import Any, Dict, List, Optional, Tuple, Union
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 from fastapi import HTTPException, status
 
 from google_ads.application import (
+    GET_USERS_CREATED_ON_DAY_OF_WEEK_QUERY,
     MAX_HEADLINES_OR_DESCRIPTIONS_ERROR_MSG,
     _check_if_customer_id_is_manager_or_exception_is_raised,
     _get_callout_resource_names,
@@ -17,7 +19,10 @@ from google_ads.application import (
     _set_fields_ad_copy,
     _set_headline_or_description,
     create_geo_targeting_for_campaign,
+    get_authenticated_user_ids_and_emails,
     get_languages,
+    get_user_id_chat_uuid_from_chat_id,
+    get_users,
 )
 from google_ads.model import (
     AdCopy,
@@ -653,3 +658,104 @@ def test_prepare_headlines(
 def test_remove_disallowed_characters_from_path() -> None:
     result = _remove_disallowed_characters_from_path(path="A.B,C{:D,]")
     assert result == "ABCD", result
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "day_of_week_created, expected_args",
+    [
+        ("Monday", (GET_USERS_CREATED_ON_DAY_OF_WEEK_QUERY, 1)),
+        ("sunday", (GET_USERS_CREATED_ON_DAY_OF_WEEK_QUERY, 7)),
+        (None, ('SELECT * from "User"',)),
+    ],
+)
+async def test_get_users_uses_bind_parameters(
+    day_of_week_created: Optional[str], expected_args: Tuple[Any, ...]
+) -> None:
+    db = MagicMock()
+    db.query_raw = AsyncMock(return_value=[{"id": 1, "email": "a@b.com"}])
+    with (
+        unittest.mock.patch(
+            "google_ads.application.get_wasp_db_url",
+            return_value="wasp_db_url",
+        ),
+        unittest.mock.patch(
+            "google_ads.application.get_db_connection",
+        ) as mock_get_db_connection,
+    ):
+        mock_get_db_connection.return_value.__aenter__.return_value = db
+        users = await get_users(day_of_week_created=day_of_week_created)
+
+    assert users == [{"id": 1, "email": "a@b.com"}]
+    db.query_raw.assert_awaited_once_with(*expected_args)
+
+
+@pytest.mark.asyncio
+async def test_get_users_raises_exception_for_invalid_day() -> None:
+    with (
+        unittest.mock.patch(
+            "google_ads.application.get_wasp_db_url",
+            return_value="wasp_db_url",
+        ),
+        unittest.mock.patch("google_ads.application.get_db_connection"),
+        pytest.raises(HTTPException) as exc,
+    ):
+        await get_users(day_of_week_created='Someday\'; DROP TABLE "User"; --')
+
+    assert exc.value.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.asyncio
+async def test_get_authenticated_user_ids_and_emails() -> None:
+    users = [
+        {"id": 1, "email": "a@mail.com"},
+        {"id": 2, "email": "b@mail.com"},
+        {"id": 3, "email": "c@mail.com"},
+    ]
+    db = MagicMock()
+    db.gauth.find_many = AsyncMock(
+        return_value=[MagicMock(user_id=1), MagicMock(user_id=3)]
+    )
+    with (
+        unittest.mock.patch(
+            "google_ads.application.get_users", return_value=users
+        ) as mock_get_users,
+        unittest.mock.patch(
+            "google_ads.application.get_db_connection",
+        ) as mock_get_db_connection,
+    ):
+        mock_get_db_connection.return_value.__aenter__.return_value = db
+        result = await get_authenticated_user_ids_and_emails(
+            day_of_week_created="Monday"
+        )
+
+    mock_get_users.assert_awaited_once_with(day_of_week_created="Monday")
+    db.gauth.find_many.assert_awaited_once_with(where={"user_id": {"in": [1, 2, 3]}})
+    assert json.loads(result) == {"1": "a@mail.com", "3": "c@mail.com"}
+
+
+@pytest.mark.asyncio
+async def test_get_user_id_chat_uuid_from_chat_id_is_cached() -> None:
+    db = MagicMock()
+    db.query_first = AsyncMock(return_value={"userId": 1, "uuid": "chat-uuid"})
+    get_user_id_chat_uuid_from_chat_id.cache.clear()  # type: ignore[attr-defined]
+    with (
+        unittest.mock.patch(
+            "google_ads.application.get_wasp_db_url",
+            return_value="wasp_db_url",
+        ),
+        unittest.mock.patch(
+            "google_ads.application.get_db_connection",
+        ) as mock_get_db_connection,
+    ):
+        mock_get_db_connection.return_value.__aenter__.return_value = db
+        for chat_id in [123, "123"]:
+            assert await get_user_id_chat_uuid_from_chat_id(chat_id) == (
+                1,
+                "chat-uuid",
+            )
+
+    db.query_first.assert_awaited_once_with(
+        'SELECT "userId", uuid FROM "Chat" WHERE id = $1', 123
+    )
+    get_user_id_chat_uuid_from_chat_id.cache.clear()  # type: ignore[attr-defined]
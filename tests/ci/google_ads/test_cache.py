@@ -0,0 +1,63 @@
+import pytest
+
+from google_ads.cache import TTLCache, async_ttl_cache
+from tests.ci.conftest import FakeClock
+
+
+def test_ttl_cache_expires_entries(clock: FakeClock) -> None:
+    cache: TTLCache[int, str] = TTLCache(maxsize=10, ttl=5, clock=clock)
+    cache.set(1, "a")
+    assert cache.get(1) == "a"
+
+    clock.now = 5
+    assert cache.get(1) is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used_entries() -> None:
+    cache: TTLCache[int, str] = TTLCache(maxsize=2, ttl=60)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    cache.get(1)
+    cache.set(3, "c")
+
+    assert cache.get(1) == "a"
+    assert cache.get(2) is None
+    assert cache.get(3) == "c"
+
+
+def test_ttl_cache_refresh_on_get(clock: FakeClock) -> None:
+    cache: TTLCache[int, str] = TTLCache(
+        maxsize=2, ttl=5, clock=clock, refresh_on_get=True
+    )
+    cache.set(1, "a")
+
+    clock.now = 4
+    assert cache.get(1) == "a"
+    clock.now = 8
+    assert cache.peek(1) == "a"
+    assert cache.age(1) == 4
+    assert cache.get(1) == "a"
+
+    assert cache.set(2, "b") == []
+    assert cache.set(3, "c") == [1]
+    assert list(cache) == [2, 3]
+
+
+@pytest.mark.asyncio
+async def test_async_ttl_cache_does_not_cache_exceptions() -> None:
+    calls = []
+
+    @async_ttl_cache(maxsize=10, ttl=60, key=lambda user_id: int(user_id))
+    async def get_user(user_id: str) -> str:
+        calls.append(user_id)
+        if len(calls) == 1:
+            raise ValueError("Not found")
+        return f"user {user_id}"
+
+    with pytest.raises(ValueError):
+        await get_user("1")
+
+    assert await get_user("1") == "user 1"
+    assert await get_user(user_id=1) == "user 1"
+    assert calls == ["1", "1"]
@@ -0,0 +1,4 @@
+-- The "User" table is owned by the Wasp application database, so this migration is
+-- applied with 'prisma db execute' (see scripts/start_webservice.sh) instead of 'prisma migrate deploy'.
+-- CreateIndex
+CREATE INDEX IF NOT EXISTS "User_createdAt_isodow_idx" ON "User" ((EXTRACT(ISODOW FROM "createdAt")));
@@ -1,9 +1,7 @@
 import asyncio
 import signal
 
-from autogen.io.websockets import IOWebsockets
-
-from captn.captn_agents.application import on_connect
+from captn.captn_agents.websocket_server import serve_websockets
 
 
 async def main():
@@ -11,8 +9,7 @@ async def main():
     stop = loop.create_future()
     loop.add_signal_handler(signal.SIGTERM, stop.set_result, None)
 
-    with IOWebsockets.run_server_in_thread(
-        on_connect=on_connect,
+    async with serve_websockets(
         host="0.0.0.0",  # nosec [B104]
         port=8080,
     ) as uri: